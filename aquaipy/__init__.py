@@ -16,6 +16,9 @@
 
 """*AquaiPy* provides an API for the AquaIllumination range of lights."""
 
-from .aquaipy import AquaIPy, Response  # noqa: F401
+from .aquaipy import AquaIPy, ConnectionConfig, Response  # noqa: F401
+from .fleet import AquaIPyFleet  # noqa: F401
+from .power import PowerScaling  # noqa: F401
+from .threaded import ThreadedAquaIPy  # noqa: F401
 
 _VERSION_ = "2.0.1"
@@ -19,15 +19,50 @@ import asyncio
 # pylint: disable=no-name-in-module,import-error
 from distutils.version import StrictVersion
 from enum import Enum
-import json
+import logging
+import random
+import time
 
 import aiohttp
 
-from aquaipy.error import ConnError, FirmwareError, MustBeParentError
+from aquaipy.codec import JsonCodec, get_codec
+from aquaipy.coalesce import LatestWriteChannel, SingleFlight
+from aquaipy.error import ConnError, Error, FirmwareError, \
+    MustBeParentError, RequestTimeoutError
+from aquaipy.power import PowerBudget
+from aquaipy.ramp import DEFAULT_RAMP_RATE, RampPlan
+from aquaipy.schedule import ScheduleEvaluator, parse_schedule_points
+from aquaipy.tracing import RequestTiming, create_trace_config
+from aquaipy.watcher import StateWatcher
 
 MIN_SUPPORTED_AI_FIRMWARE_VERSION = "2.0.0"
 MAX_SUPPORTED_AI_FIRMWARE_VERSION = "2.5.1"
 
+MAX_INTENSITY = 2000
+
+DEFAULT_LIMIT_PER_HOST = 2
+DEFAULT_KEEPALIVE_TIMEOUT = 10
+DEFAULT_DNS_CACHE_TTL = 300
+DEFAULT_REQUEST_TIMEOUT = 10
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.1
+DEFAULT_RETRY_BACKOFF_MAX = 2
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _import_numpy():
+    """Import NumPy, which is only required for the array conversions."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("NumPy is required for array conversions, install "
+                          "it with 'pip install aquaipy[numpy]'")
+
+    return numpy
+
 
 class Response(Enum):
     """Response codes, for the AquaIPy methods."""
@@ -39,18 +74,137 @@ class Response(Enum):
     PowerLimitExceeded = 4
     AllColorsMustBeSpecified = 5
     InvalidData = 6
+    Coalesced = 7
+
+
+class ConnectionConfig:
+    """A class for configuring the HTTP connections made to the AI lights.
+
+    The AI lights have very small embedded HTTP servers, so by default only a
+    couple of connections are opened to each light and they are kept alive
+    between requests, to avoid the cost of setting up a new TCP connection
+    for every call.
+
+    Every request is limited to *request_timeout* seconds. GET requests that
+    fail with a connection error or timeout are retried, up to *retries*
+    times, after a jittered exponential backoff. If *request_deadline* is
+    set, the total time spent on a request, including all retries, will not
+    exceed it.
+
+    ..  note:: *aiohttp* does not support HTTP pipelining, requests are only
+        ever sent over idle connections. Setting *reuse_connections=False*
+        closes the connection after every request instead.
+    """
+
+    def __init__(self, limit_per_host=DEFAULT_LIMIT_PER_HOST,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 dns_cache_ttl=DEFAULT_DNS_CACHE_TTL, reuse_connections=True,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT,
+                 retries=DEFAULT_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+                 retry_backoff_max=DEFAULT_RETRY_BACKOFF_MAX,
+                 request_deadline=None, json_codec=None):
+        """Initialise the connection configuration.
+
+        :param limit_per_host: Max number of simultaneous connections to a
+            single light, 0 for no limit.
+        :type limit_per_host: int
+        :param keepalive_timeout: Seconds to keep an idle connection open.
+        :type keepalive_timeout: float
+        :param dns_cache_ttl: Seconds to cache DNS lookups for, *None* to
+            disable the DNS cache.
+        :type dns_cache_ttl: int
+        :param reuse_connections: Set to False to close the connection after
+            every request.
+        :type reuse_connections: bool
+        :param request_timeout: Seconds to wait for a single request, *None*
+            to wait indefinitely.
+        :type request_timeout: float
+        :param retries: Max number of times to retry a failed GET request.
+        :type retries: int
+        :param retry_backoff: Seconds to wait before the first retry, this is
+            doubled for each following retry.
+        :type retry_backoff: float
+        :param retry_backoff_max: Max seconds to wait between retries.
+        :type retry_backoff_max: float
+        :param request_deadline: Max total seconds for a request, including
+            all retries, *None* for no limit.
+        :type request_deadline: float
+        :param json_codec: The JSON library to encode and decode bodies with,
+            ``orjson``, ``ujson`` or ``json``, or a ``JsonCodec``. Defaults
+            to the fastest that is installed.
+        :type json_codec: str or JsonCodec
+        """
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.reuse_connections = reuse_connections
+        self.request_timeout = request_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.request_deadline = request_deadline
+
+        if not isinstance(json_codec, JsonCodec):
+            json_codec = get_codec(json_codec)
+
+        self.json_codec = json_codec
+
+    def get_retry_delay(self, retry):
+        """Get the jittered delay before the given retry.
+
+        :param retry: the retry number, starting from 0
+        :type retry: int
+        :returns: seconds to wait
+        :rtype: float
+        """
+        delay = min(self.retry_backoff_max, self.retry_backoff * (2 ** retry))
+
+        return random.uniform(delay / 2, delay)
+
+    def create_connector(self):
+        """Create a connector using this configuration.
+
+        :returns: a new connector
+        :rtype: aiohttp.TCPConnector
+        """
+        keepalive_timeout = self.keepalive_timeout
+
+        if not self.reuse_connections:
+            keepalive_timeout = None
+
+        return aiohttp.TCPConnector(
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            force_close=not self.reuse_connections,
+            use_dns_cache=self.dns_cache_ttl is not None,
+            ttl_dns_cache=self.dns_cache_ttl)
+
+    def create_session(self, trace_configs=None):
+        """Create a client session using this configuration.
+
+        :param trace_configs: Optional trace configs to add to the session.
+        :type trace_configs: list(aiohttp.TraceConfig)
+        :returns: a new session, which owns its connector
+        :rtype: aiohttp.ClientSession
+        """
+        return aiohttp.ClientSession(connector=self.create_connector(),
+                                     trace_configs=trace_configs)
 
 
 class HDDevice:
     """A class for handling the conversion of data for a device."""
 
-    def __init__(self, raw_data, primary_mac_address=None):
+    def __init__(self, raw_data, primary_mac_address=None,
+                 lookup_tables=False):
         """Initialise a class from the given input raw device data.
 
         :param raw_data: Raw device data, as returned by the AI API.
         :param primary_mac_address: The primary device MAC address.
+        :param lookup_tables: Precompute the mWatt and percentage values for
+            every integer intensity (0-2000), for faster repeated conversions.
         :type raw_data: json
         :type primary_mac_address: str
+        :type lookup_tables: bool
         """
         self._primary_mac_address = primary_mac_address
         self._mac_address = raw_data['serial_number']
@@ -68,6 +222,61 @@ class HDDevice:
 
         self._max_mw = raw_data["max_power"]
 
+        # Precompute the per color coefficients used by the conversions
+        self._max_percentage = {}
+        self._hd_percentage_range = {}
+        self._max_hd_percentage = {}
+        self._hd_mw_range = {}
+
+        for color, hd_value in self._mw_hd.items():
+            norm_value = self._mw_norm[color]
+            self._hd_mw_range[color] = hd_value - norm_value
+
+            if not norm_value:
+                # A channel without any mW has no HD range, so it's treated
+                # like one where HD is the same as 100%
+                self._max_percentage[color] = 100
+                self._hd_percentage_range[color] = 0
+                self._max_hd_percentage[color] = 0
+                continue
+
+            self._max_percentage[color] = (hd_value / norm_value) * 100
+            self._hd_percentage_range[color] = \
+                self._max_percentage[color] - 100
+            self._max_hd_percentage[color] = \
+                (hd_value - norm_value) / norm_value
+
+        self._mw_table = None
+        self._percentage_table = None
+
+        if lookup_tables:
+            self._build_lookup_tables()
+
+    def _build_lookup_tables(self):
+        """Precompute mWatt and percentage values for each valid intensity."""
+        mw_table = {}
+        percentage_table = {}
+
+        for color in self._hd_mw_range:
+            mw_table[color] = [
+                self._calculate_mw(color, intensity)
+                for intensity in range(MAX_INTENSITY + 1)]
+            percentage_table[color] = [
+                self._calculate_percentage(color, intensity)
+                for intensity in range(MAX_INTENSITY + 1)]
+
+        self._mw_table = mw_table
+        self._percentage_table = percentage_table
+
+    @property
+    def colors(self):
+        """Get the color channels supported by the device.
+
+        :returns: list of colors
+        :rtype: list( color_1..color_n )
+        """
+        return list(self._mw_norm)
+
     @property
     def is_primary(self):
         """Check is HDDevice object represents a parent light.
@@ -95,6 +304,23 @@ class HDDevice:
         """
         return self._max_mw
 
+    @property
+    def mw_coefficients(self):
+        """Get the mWatt coefficients for each HD color channel.
+
+        The first value is the mWatts used at 100% and the second is the
+        additional mWatts used between 100% and the max HD percentage.
+
+        :returns: dictionary of color and coefficients
+        :rtype: dict( color_1=(normal_mw_1, hd_range_mw_1)..color_n=(..) )
+        """
+        coefficients = {}
+
+        for color, hd_mw_range in self._hd_mw_range.items():
+            coefficients[color] = (self._mw_norm[color], hd_mw_range)
+
+        return coefficients
+
     def convert_to_intensity(self, color, percentage):
         """Convert a percentage to the native AI API intensity value.
 
@@ -120,8 +346,7 @@ class HDDevice:
             #  HD_Brightness_Value =    --------------  * 1000
             #                           Max_HD_Percent
 
-            max_percentage = ((self._mw_hd[color])
-                              / self._mw_norm[color]) * 100
+            max_percentage = self._max_percentage[color]
 
             if percentage > max_percentage:
                 raise ValueError("Percentage for {} must be between 0 and {}"
@@ -130,7 +355,7 @@ class HDDevice:
             hd_percentage = percentage - 100
 
             hd_brightness_value = (hd_percentage
-                                   / (max_percentage - 100)) * 1000
+                                   / self._hd_percentage_range[color]) * 1000
 
             return round(hd_brightness_value + 1000)
 
@@ -148,26 +373,34 @@ class HDDevice:
         :returns: the resulting percentage
         :rtype: float
         """
-        if intensity < 0 or intensity > 2000:
+        if intensity < 0 or intensity > MAX_INTENSITY:
             raise ValueError("intensity must be between 0 and 2000")
-        elif intensity <= 1000:
+
+        if self._percentage_table is not None and \
+                isinstance(intensity, int) and \
+                color in self._percentage_table:
+            return self._percentage_table[color][intensity]
+
+        return self._calculate_percentage(color, intensity)
+
+    def _calculate_percentage(self, color, intensity):
+        """Calculate the percentage for an already validated intensity."""
+        if intensity <= 1000:
             return intensity/10
-        else:
 
-            #                  Brightness - 1000   HD_Max - Normal_Max
-            #  HD_Percentage = ----------------- * ------------------- * 100
-            #                         1000            Normal_Max_mW
+        #                  Brightness - 1000   HD_Max - Normal_Max
+        #  HD_Percentage = ----------------- * ------------------- * 100
+        #                         1000            Normal_Max_mW
 
-            # Calculate max HD percentage available
-            max_hd_percentage = (self._mw_hd[color]
-                                 - self._mw_norm[color])/self._mw_norm[color]
+        # Max HD percentage available
+        max_hd_percentage = self._max_hd_percentage[color]
 
-            # Response from /color: First 1000 is for 0 -> 100%,
-            # Second 1000 is for 100% -> Max HD%
-            hd_in_use = (intensity - 1000) / 1000
+        # Response from /color: First 1000 is for 0 -> 100%,
+        # Second 1000 is for 100% -> Max HD%
+        hd_in_use = (intensity - 1000) / 1000
 
-            # Calculate total current percentage
-            return 100 + (max_hd_percentage * hd_in_use * 100)
+        # Calculate total current percentage
+        return 100 + (max_hd_percentage * hd_in_use * 100)
 
     def convert_to_mw(self, color, intensity):
         """Convert a given AI API native intensity value to the mWatt value.
@@ -184,21 +417,146 @@ class HDDevice:
         :returns: the resulting mWatt value, for the given intensity
         :rtype: float
         """
-        if intensity < 0 or intensity > 2000:
+        if intensity < 0 or intensity > MAX_INTENSITY:
             raise ValueError("intensity must be between 0 and 2000")
-        elif intensity <= 1000:
+
+        if self._mw_table is not None and isinstance(intensity, int) and \
+                color in self._mw_table:
+            return self._mw_table[color][intensity]
+
+        return self._calculate_mw(color, intensity)
+
+    def _calculate_mw(self, color, intensity):
+        """Calculate the mWatt value for an already validated intensity."""
+        if intensity <= 1000:
             return self._mw_norm[color] * (intensity/1000)
-        else:
 
-            #                                               intensity - 1000
-            # HD mW in use = (HD Max mW - Norm Max mW)  *   ----------------
-            #                                                     1000
+        #                                               intensity - 1000
+        # HD mW in use = (HD Max mW - Norm Max mW)  *   ----------------
+        #                                                     1000
+
+        hd_in_use = (intensity - 1000)/1000
+        hd_mw_in_use = hd_in_use * self._hd_mw_range[color]
+
+        return self._mw_norm[color] + hd_mw_in_use
+
+    def _coefficients(self, numpy, colors, coefficients, ndim):
+        """Get the per color coefficients, shaped to broadcast over values."""
+        values = numpy.array([coefficients[color] for color in colors],
+                             dtype=float)
+
+        return values.reshape((-1,) + (1,) * (ndim - 1))
+
+    def convert_to_intensity_array(self, colors, percentages):
+        """Convert an array of percentages to native AI API intensity values.
+
+        This is the vectorised equivalent of *convert_to_intensity()* and
+        requires NumPy. The first axis of *percentages* must match *colors*,
+        so a whole schedule can be converted with a (colors x steps) array.
+
+        :param colors: the color for each row of percentages
+        :type colors: list( color_1..color_n )
+        :param percentages: the percentages to convert
+        :type percentages: array_like
+        :returns: intensity values (0-2000)
+        :rtype: numpy.ndarray
+        """
+        numpy = _import_numpy()
+        percentages = numpy.asarray(percentages, dtype=float)
+
+        if len(colors) != len(percentages):
+            raise ValueError("A color must be specified for each row")
+
+        if (percentages < 0).any():
+            raise ValueError("Percentage must be greater than 0")
+
+        max_percentage = self._coefficients(
+            numpy, colors, self._max_percentage, percentages.ndim)
+        hd_percentage_range = self._coefficients(
+            numpy, colors, self._hd_percentage_range, percentages.ndim)
+
+        exceeded = percentages > max_percentage
 
-            hd_in_use = (intensity - 1000)/1000
-            hd_mw_in_use = hd_in_use * (self._mw_hd[color]
-                                        - self._mw_norm[color])
+        if exceeded.any():
+            row = numpy.nonzero(exceeded)[0][0]
+            raise ValueError("Percentage for {} must be between 0 and {}"
+                             .format(colors[row], max_percentage.flat[row]))
 
-            return self._mw_norm[color] + hd_mw_in_use
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            hd_brightness_value = ((percentages - 100)
+                                   / hd_percentage_range) * 1000
+
+        return numpy.where(
+            percentages <= 100,
+            numpy.round(percentages * 10),
+            numpy.round(hd_brightness_value + 1000)).astype(int)
+
+    def convert_to_percentage_array(self, colors, intensities):
+        """Convert an array of native AI API intensity values to percentages.
+
+        This is the vectorised equivalent of *convert_to_percentage()* and
+        requires NumPy. The first axis of *intensities* must match *colors*.
+
+        :param colors: the color for each row of intensities
+        :type colors: list( color_1..color_n )
+        :param intensities: the color intensities (0-2000)
+        :type intensities: array_like
+        :returns: the resulting percentages
+        :rtype: numpy.ndarray
+        """
+        numpy = _import_numpy()
+        intensities = self._validate_intensity_array(
+            numpy, colors, intensities)
+
+        max_hd_percentage = self._coefficients(
+            numpy, colors, self._max_hd_percentage, intensities.ndim)
+        hd_in_use = (intensities - 1000) / 1000
+
+        return numpy.where(
+            intensities <= 1000,
+            intensities / 10,
+            100 + (max_hd_percentage * hd_in_use * 100))
+
+    def convert_to_mw_array(self, colors, intensities):
+        """Convert an array of native AI API intensity values to mWatts.
+
+        This is the vectorised equivalent of *convert_to_mw()* and requires
+        NumPy. The first axis of *intensities* must match *colors*.
+
+        :param colors: the color for each row of intensities
+        :type colors: list( color_1..color_n )
+        :param intensities: the color intensities (0-2000)
+        :type intensities: array_like
+        :returns: the resulting mWatt values
+        :rtype: numpy.ndarray
+        """
+        numpy = _import_numpy()
+        intensities = self._validate_intensity_array(
+            numpy, colors, intensities)
+
+        mw_norm = self._coefficients(
+            numpy, colors, self._mw_norm, intensities.ndim)
+        hd_mw_range = self._coefficients(
+            numpy, colors, self._hd_mw_range, intensities.ndim)
+        hd_in_use = (intensities - 1000) / 1000
+
+        return numpy.where(
+            intensities <= 1000,
+            mw_norm * (intensities / 1000),
+            mw_norm + hd_in_use * hd_mw_range)
+
+    @staticmethod
+    def _validate_intensity_array(numpy, colors, intensities):
+        """Check an array of intensities has valid values, for each color."""
+        intensities = numpy.asarray(intensities, dtype=float)
+
+        if len(colors) != len(intensities):
+            raise ValueError("A color must be specified for each row")
+
+        if (intensities < 0).any() or (intensities > MAX_INTENSITY).any():
+            raise ValueError("intensity must be between 0 and 2000")
+
+        return intensities
 
 
 class AquaIPy:
@@ -208,11 +566,50 @@ class AquaIPy:
     # All attributes are required, in this case.
     # pylint: disable=too-many-public-methods
 
-    def __init__(self, name=None, session=None, loop=None):
+    def __init__(self, name=None, session=None, loop=None, state_ttl=None,
+                 connection_config=None, instrumentation=None,
+                 profile_cache=None, power_scaling=None,
+                 coalesce_writes=False, read_cache_ttl=None):
         """Initialise class, with an optional instance name.
 
         :param name: Instance name, not currently used for anything.
         :type name: str
+        :param instrumentation: Receives an event for every request, result
+            and power limit rejection, e.g. a ``MetricsCollector``. The
+            phases of each request are also timed, if a *session* is
+            specified it must include the trace config from
+            ``create_trace_config()`` for the connection phases to be timed.
+        :type instrumentation: Instrumentation
+        :param connection_config: Configuration for the connections to the
+            light. The timeouts and retries are always used, the connection
+            settings are only used if a *session* isn't specified.
+        :type connection_config: ConnectionConfig
+        :param state_ttl: Enable state tracking, by specifying how long (in
+            seconds) the last known color intensities can be reused by
+            *async_patch_colors_brightness()* and
+            *async_update_color_brightness()*, instead of reading them from
+            the device. Disabled by default.
+        :type state_ttl: float
+        :param profile_cache: Optional cache of device profiles. If the
+            profile for a host is cached, *async_connect()* uses it without
+            sending any requests and revalidates it in the background.
+        :type profile_cache: ProfileCache
+        :param power_scaling: Scale colors down to the device power limits,
+            instead of returning ``Response.PowerLimitExceeded``, when
+            setting or fading colors. Disabled by default.
+        :type power_scaling: PowerScaling
+        :param coalesce_writes: Only send one color write at a time, and
+            only the latest of any writes that arrive meanwhile. Superseded
+            writes return ``Response.Coalesced`` and are never sent, patches
+            are merged per color and applied on top of the last successful
+            write. Fades send each step the same way, and stop with
+            ``Response.Coalesced`` if any other write is made during them.
+            Disabled by default.
+        :type coalesce_writes: bool
+        :param read_cache_ttl: Reuse the result of each read of the colors
+            or schedule state for this many seconds. Concurrent reads always
+            share one request. Disabled by default.
+        :type read_cache_ttl: float
         """
         self._host = None
         self._base_path = None
@@ -222,6 +619,26 @@ class AquaIPy:
         self._firmware_version = None
         self._primary_device = None
         self._other_devices = []
+        self._power_budget = None
+        self._power_scaling = power_scaling
+        self._write_channel = None
+        self._reads = SingleFlight(read_cache_ttl)
+        self._watcher = None
+
+        if coalesce_writes:
+            self._write_channel = LatestWriteChannel(
+                self._async_set_coalesced_brightness, Response.Coalesced,
+                Response.Success)
+
+        self._colors = None
+        self._state_ttl = state_ttl
+        self._state = None
+        self._state_time = None
+        self._state_writes = 0
+        self._instrumentation = instrumentation
+        self._profile_cache = profile_cache
+        self._revalidation = None
+        self._schedule = None
 
         self._loop = loop
         self._loop_is_local = True
@@ -237,20 +654,33 @@ class AquaIPy:
         if self._loop.is_closed():
             self._create_new_event_loop()
 
+        if connection_config is None:
+            connection_config = ConnectionConfig()
+
+        self._connection_config = connection_config
+
         if session is None:
-            self._session = aiohttp.ClientSession()
+            trace_configs = None
+
+            if instrumentation is not None:
+                trace_configs = [create_trace_config()]
+
+            self._session = connection_config.create_session(trace_configs)
             self._session_is_local = True
         else:
             self._session = session
             self._session_is_local = False
 
-    def connect(self, host, check_firmware_support=True):
+    def connect(self, host, check_firmware_support=True, fast=False):
         """Connect **AquaIPy** instance to a specifed AI light, synchronously.
 
         :param host: Hostname/IP of AI light, for paired lights this should be
             the parent light.
         :param check_firmware_support: Set to False to skip the firmware check
         :type check_firmware_support: bool
+        :param fast: Request the identity and power details concurrently,
+            instead of one after the other.
+        :type fast: bool
 
         ..  note:: It is **NOT** recommended to set
             *check_firmware_support=False*. Do so at your own risk!
@@ -267,17 +697,32 @@ class AquaIPy:
 
         """
         return self._loop.run_until_complete(
-            self.async_connect(host, check_firmware_support))
+            self.async_connect(host, check_firmware_support, fast))
 
-    async def async_connect(self, host, check_firmware_support=True):
+    async def async_connect(self, host, check_firmware_support=True,
+                            fast=False):
         """Connect **AquaIPy** instance to a specified AI light.
 
         Also verifies connectivity and firmware version support.
 
+        In *fast* mode, the power details are requested at the same time as
+        the identity, which roughly halves the time to connect. The identity
+        is still checked first, so the same errors are raised.
+
+        If a *profile_cache* is being used and it has a profile for the host,
+        the connection is made from the cached profile straight away. The
+        profile is then revalidated in the background. If the serial number
+        or firmware of the light have changed, the cached profile is replaced
+        and the connection is updated, or closed if the light is no longer
+        supported.
+
         :param host: Hostname/IP of AI light, for paired lights this should be
             the parent light.
         :param check_firmware_support: Set to False to skip the firmware check
         :type check_firmware_support: bool
+        :param fast: Request the identity and power details concurrently,
+            instead of one after the other.
+        :type fast: bool
 
         ..  note:: It is **NOT** recommended to set
             *check_firmware_support=False*. Do so at your own risk!
@@ -295,22 +740,48 @@ class AquaIPy:
         """
         self._host = host
         self._base_path = 'http://' + host + '/api'
+        self._clear_state()
+        self._cancel_revalidation()
+        self._reads.invalidate()
+        self._schedule = None
+
+        cached = None
+
+        if self._profile_cache is not None:
+            cached = self._profile_cache.get(host)
+
+        if cached is not None:
+            identity, power = cached
+            self._set_identity(identity, check_firmware_support)
+            self._set_devices(power)
 
-        await self._async_setup_device_details(check_firmware_support)
+            self._revalidation = asyncio.ensure_future(
+                self._async_revalidate_profile(
+                    host, identity, power, check_firmware_support))
+            return
+
+        if fast:
+            identity, power = await self._async_setup_device_details_fast(
+                check_firmware_support)
+        else:
+            identity, power = await self._async_setup_device_details(
+                check_firmware_support)
+
+        if self._profile_cache is not None:
+            self._profile_cache.set(host, identity, power)
 
     def close(self):
         """Clean-up and close the underlying async dependancies..
 
-        .. note:: There is no async method, as it is assumed if you are using
-           async functions, you will use your own event loop and
-           aiohttp.ClientSession and pass them in. This will close the client
-           session and event loop, if they were created by this object, when
-           it was initialised.
+        .. note:: This will close the client session and event loop, if they
+           were created by this object, when it was initialised. Use
+           *async_close()* to close just the client session, from a running
+           event loop.
         """
-        self._base_path = None
-
         if self._session_is_local:
-            self._loop.run_until_complete(self._session.close())
+            self._loop.run_until_complete(self.async_close())
+        else:
+            self._stop_background_tasks()
 
         if self._loop_is_local:
             self._loop.stop()
@@ -318,6 +789,39 @@ class AquaIPy:
             self._loop.run_until_complete(asyncio.gather(*pending_tasks))
             self._loop.close()
 
+    async def async_close(self):
+        """Close the client session, if it was created by this object."""
+        self._stop_background_tasks()
+
+        if self._session_is_local:
+            await self._session.close()
+
+    @property
+    def host(self):
+        """Get the host of the connected device.
+
+        :returns: host, or *None* if not connected
+        :rtype: str
+
+        """
+        return self._host
+
+    @property
+    def watcher(self):
+        """Get the shared watcher, that polls the device for changes.
+
+        The watcher only polls while something is subscribed, see
+        ``StateWatcher``.
+
+        :returns: the watcher
+        :rtype: StateWatcher
+
+        """
+        if self._watcher is None:
+            self._watcher = StateWatcher(self)
+
+        return self._watcher
+
     @property
     def mac_addr(self):
         """Get connected devices Mac Address/Serial Number.
@@ -381,6 +885,39 @@ class AquaIPy:
         """
         return self._firmware_version
 
+    @property
+    def colors(self):
+        """Get the cached list of valid colors, for the connected device.
+
+        The list is populated on connection and refreshed every time the
+        current colors are read from the device.
+
+        :returns: list of valid colors or *None* if not yet known
+        :rtype: list( color_1..color_n ) or None
+
+        """
+        if self._colors is None:
+            return None
+
+        return list(self._colors)
+
+    @property
+    def schedule_evaluator(self):
+        """Get an evaluator for the last known schedule.
+
+        The evaluator works offline, from the schedule last read with
+        *async_get_schedule()*.
+
+        :returns: the schedule evaluator, or *None* if the schedule isn't
+            known or has no points
+        :rtype: ScheduleEvaluator or None
+
+        """
+        if not self._schedule:
+            return None
+
+        return ScheduleEvaluator(self._primary_device, self._schedule)
+
     ##################
     # Internal Methods
     ##################
@@ -389,28 +926,275 @@ class AquaIPy:
         if self._base_path is None:
             raise ConnError("Error connecting to host", self._host)
 
+    def _stop_background_tasks(self):
+        """Disconnect and stop any background work, before closing."""
+        self._base_path = None
+        self._cancel_revalidation()
+
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def _cancel_revalidation(self):
+        """Stop any background revalidation of a cached profile."""
+        if self._revalidation is not None:
+            self._revalidation.cancel()
+            self._revalidation = None
+
+    async def _async_revalidate_profile(self, host, identity, power,
+                                        check_firmware_support):
+        """Check a cached profile against the device, replacing it if stale.
+
+        Failed requests leave the cached profile in place, so the light is
+        only treated as changed if it responds with a different profile.
+        """
+        try:
+            new_identity = await self._async_request("GET", "identity")
+            new_power = await self._async_request("GET", "power")
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.debug("Unable to revalidate the profile for %s", host,
+                          exc_info=True)
+            return
+
+        if new_identity['response_code'] != 0 or \
+                new_power['response_code'] != 0:
+            return
+
+        changed = \
+            new_identity['serial_number'] != identity['serial_number'] or \
+            new_identity['firmware'] != identity['firmware']
+
+        if changed or new_power['devices'] != power['devices']:
+            _LOGGER.info("The cached profile for %s is stale", host)
+            self._profile_cache.invalidate(host)
+            self._clear_state()
+
+            try:
+                self._set_identity(new_identity, check_firmware_support)
+                self._set_devices(new_power)
+            except Error:
+                _LOGGER.warning("Disconnected from %s, it changed to an "
+                                "unsupported light", host, exc_info=True)
+                return
+
+        self._profile_cache.set(host, new_identity, new_power)
+
+    def _track_state(self, intensities):
+        """Store the last known intensities, if state tracking is enabled."""
+        if self._state_ttl is None:
+            return
+
+        self._state = dict(intensities)
+        self._state_time = time.monotonic()
+
+    def _clear_state(self):
+        """Forget the last known intensities."""
+        self._state = None
+        self._state_time = None
+
+    def _clear_target_state(self, target):
+        """Forget a failed target, unless a later write has replaced it."""
+        if target is None or self._state is target:
+            self._clear_state()
+
+    def _record_request(self, method, endpoint, start, r_data=None,
+                        error=None):
+        """Pass a request attempt to the instrumentation, if enabled."""
+        if self._instrumentation is None:
+            return
+
+        response_code = None
+
+        if isinstance(r_data, dict):
+            response_code = r_data.get("response_code")
+
+        self._instrumentation.on_request(
+            self._host, method, endpoint, time.perf_counter() - start,
+            response_code, error)
+
+    def _record_response(self, operation, response):
+        """Pass the result of an operation to the instrumentation."""
+        if self._instrumentation is not None:
+            self._instrumentation.on_response(self._host, operation, response)
+
+        return response
+
+    def _record_power_limit_exceeded(self, device, mw_value, step=None):
+        """Log, and record, intensities that exceed a device power limit."""
+        _LOGGER.warning(
+            "mWatts exceeded - device: %s max: %s specified: %s%s",
+            device.mac_address, device.max_mw, mw_value,
+            "" if step is None else " step: {}".format(step))
+
+        if self._instrumentation is not None:
+            self._instrumentation.on_power_limit_exceeded(
+                self._host, device.mac_address, device.max_mw, mw_value)
+
+    def _scale_to_limits(self, intensities):
+        """Scale intensities down to the power limits, if they exceed them."""
+        scaled = self._power_budget.scale_to_limits(
+            intensities, self._power_scaling)
+
+        if scaled is not intensities:
+            _LOGGER.debug("Scaled intensities to the power limits: %s -> %s",
+                          intensities, scaled)
+
+        return scaled
+
+    def _get_tracked_brightness(self):
+        """Get the tracked brightness percentages, if they are still fresh."""
+        if self._state is None:
+            return None
+
+        if time.monotonic() - self._state_time > self._state_ttl:
+            self._clear_state()
+            return None
+
+        brightness = {}
+
+        for color, value in self._state.items():
+            brightness[color] = self._primary_device.convert_to_percentage(
+                color, value)
+
+        return brightness
+
     def _create_new_event_loop(self):
         """Create a new asyncio event loop."""
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
         self._loop_is_local = True
 
+    async def _async_request(self, method, endpoint, body=None, **kwargs):
+        """Send a request to the AI API and return the decoded response.
+
+        Applies the configured timeout and, for GET requests, retries failed
+        attempts until the retries or the request deadline run out. The
+        *body* is encoded once, with the configured JSON codec, and the
+        response is decoded whatever its content type.
+        """
+        config = self._connection_config
+        codec = config.json_codec
+        path = "{0}/{1}".format(self._base_path, endpoint)
+
+        if body is not None:
+            kwargs["data"] = codec.dumps(body)
+            kwargs["headers"] = JSON_HEADERS
+        attempts = config.retries + 1 if method == "GET" else 1
+        deadline = None
+
+        if config.request_deadline is not None:
+            deadline = time.monotonic() + config.request_deadline
+
+        for attempt in range(attempts):
+            timeout = config.request_timeout
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                timeout = remaining if timeout is None \
+                    else min(timeout, remaining)
+
+            start = time.perf_counter()
+            timing = None
+
+            if self._instrumentation is not None:
+                timing = RequestTiming()
+
+            try:
+                async with self._session.request(
+                        method, path,
+                        timeout=aiohttp.ClientTimeout(total=timeout),
+                        trace_request_ctx=timing, **kwargs) as resp:
+
+                    data = await resp.read()
+
+                    if timing is not None:
+                        timing.mark("body_read")
+
+                    r_data = codec.loads(data) if data.strip() else None
+
+                    if timing is not None:
+                        timing.mark("json_decode")
+
+            except (aiohttp.ClientResponseError, aiohttp.InvalidURL) as error:
+                self._record_request(method, endpoint, start, error=error)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                self._record_request(method, endpoint, start, error=error)
+                delay = config.get_retry_delay(attempt)
+                out_of_time = deadline is not None and \
+                    time.monotonic() + delay >= deadline
+
+                if attempt + 1 < attempts and not out_of_time:
+                    await asyncio.sleep(delay)
+                    continue
+
+                if isinstance(error, asyncio.TimeoutError):
+                    raise RequestTimeoutError(
+                        "Timed out waiting for {}".format(endpoint),
+                        self._host)
+
+                raise
+
+            self._record_request(method, endpoint, start, r_data)
+
+            if timing is not None:
+                self._instrumentation.on_request_timing(
+                    self._host, method, endpoint, timing)
+
+            return r_data
+
     async def _async_setup_device_details(self, check_firmware_support):
-        """Verify connection to the device and populate device attributes."""
-        r_data = None
+        """Verify connection to the device and populate device attributes.
+
+        :returns: the identity and power responses
+        """
+        identity = await self._async_get_identity()
+        self._set_identity(identity, check_firmware_support)
+
+        return identity, await self._async_get_devices()
+
+    async def _async_setup_device_details_fast(self, check_firmware_support):
+        """Populate the device attributes, requesting both concurrently.
+
+        The identity is checked before the power details are used, and the
+        power request is abandoned if the identity is invalid.
+
+        :returns: the identity and power responses
+        """
+        power_task = asyncio.ensure_future(
+            self._async_request("GET", "power"))
 
         try:
-            path = "{0}/{1}".format(self._base_path, "identity")
-            async with self._session.get(path) as resp:
+            identity = await self._async_get_identity()
+            self._set_identity(identity, check_firmware_support)
+        except BaseException:
+            if power_task.done() and not power_task.cancelled():
+                # Retrieve the outcome, so a failure isn't reported as unseen
+                power_task.exception()
+            else:
+                power_task.cancel()
+
+            raise
+
+        power = await power_task
+        self._set_devices(power)
 
-                r_data = await resp.json()
+        return identity, power
+
+    async def _async_get_identity(self):
+        """Get the device identity, raising ConnError if it's unavailable."""
+        try:
+            return await self._async_request("GET", "identity")
+        except RequestTimeoutError:
+            self._base_path = None
+            raise
         except Exception:
             self._base_path = None
 
-            import traceback
-            traceback.print_exc()
+            _LOGGER.debug("Unable to connect to %s", self._host, exc_info=True)
             raise ConnError("Unable to connect to host", self._host)
 
+    def _set_identity(self, r_data, check_firmware_support):
+        """Populate the identity attributes, from an identity response."""
         if r_data['response_code'] != 0:
             self._base_path = None
             raise ConnError(
@@ -431,59 +1215,103 @@ class AquaIPy:
             raise MustBeParentError(
                 "Connected to non-parent device", r_data['parent'])
 
-        await self._async_get_devices()
-
     async def _async_get_devices(self):
-        """Populate the device attributes of the current class instance."""
-        path = "{0}/{1}".format(self._base_path, "power")
-        async with self._session.get(path) as resp:
+        """Populate the device attributes of the current class instance.
 
-            r_data = await resp.json()
-            if r_data['response_code'] != 0:
-                self._base_path = None
-                raise ConnError(
-                    "Unable to retrieve device details", self._host)
+        :returns: the power response
+        """
+        r_data = await self._async_request("GET", "power")
+        self._set_devices(r_data)
 
-            self._primary_device = None
-            self._other_devices = []
+        return r_data
 
-            for device in r_data['devices']:
-                temp = HDDevice(device, self.mac_addr)
+    def _set_devices(self, r_data):
+        """Populate the device attributes, from a power response."""
+        if r_data['response_code'] != 0:
+            self._base_path = None
+            raise ConnError(
+                "Unable to retrieve device details", self._host)
 
-                if temp.is_primary:
-                    self._primary_device = temp
-                else:
-                    self._other_devices.append(temp)
+        self._primary_device = None
+        self._other_devices = []
+
+        for device in r_data['devices']:
+            temp = HDDevice(device, self.mac_addr)
+
+            if temp.is_primary:
+                self._primary_device = temp
+            else:
+                self._other_devices.append(temp)
+
+        if self._primary_device is not None:
+            self._colors = self._primary_device.colors
+            self._power_budget = PowerBudget(
+                [self._primary_device] + self._other_devices)
 
     async def _async_get_brightness(self):
-        """Get raw intensity values back from API."""
+        """Get raw intensity values back from API, sharing concurrent reads."""
         self._validate_connection()
 
-        path = "{0}/{1}".format(self._base_path, "colors")
-        async with self._session.get(path) as resp:
+        # Failed reads are shared, but never reused
+        return await self._reads.async_call(
+            "colors", self._async_request_brightness,
+            lambda result: result[0] == Response.Success)
 
-            r_data = await resp.json()
+    async def _async_request_brightness(self):
+        """Request raw intensity values from API."""
+        writes = self._state_writes
+        r_data = await self._async_request("GET", "colors")
 
-            if r_data["response_code"] != 0:
-                return Response.Error, None
+        if r_data["response_code"] != 0:
+            return Response.Error, None
 
-            del r_data["response_code"]
+        del r_data["response_code"]
+        self._colors = list(r_data)
 
-            return Response.Success, r_data
+        # A write made while reading has replaced what was read
+        if self._state_writes == writes:
+            self._track_state(r_data)
+
+        return Response.Success, r_data
 
     async def _async_set_brightness(self, body):
         """Set raw intensity values, via AI API."""
         self._validate_connection()
 
-        path = "{0}/{1}".format(self._base_path, "colors")
-        async with self._session.post(path, json=body) as resp:
+        # Track the target straight away, so patches made while it's sent
+        # build on it, rather than reading the colors it's replacing
+        self._state_writes += 1
+        self._track_state(body)
+        target = self._state
+        self._reads.invalidate("colors")
 
-            r_data = await resp.json()
+        try:
+            r_data = await self._async_request("POST", "colors", body=body)
+        except BaseException:
+            self._clear_target_state(target)
+            raise
+        finally:
+            self._reads.invalidate("colors")
+
+        if r_data["response_code"] != 0:
+            self._clear_target_state(target)
+            return Response.Error
 
-            if r_data["response_code"] != 0:
-                return Response.Error
+        return Response.Success
 
-            return Response.Success
+    async def _async_set_coalesced_brightness(self, intensities):
+        """Send the latest coalesced write, re-checking merged patches."""
+        if self._power_scaling is not None:
+            intensities = self._scale_to_limits(intensities)
+
+        exceeded = self._power_budget.find_exceeded(intensities)
+
+        if exceeded is not None:
+            self._record_power_limit_exceeded(*exceeded)
+
+            return Response.PowerLimitExceeded
+
+        return await self._async_set_brightness(intensities)
 
     #######################################################
     # Get/Set Manual Control (ie. Not using light schedule)
@@ -511,15 +1339,19 @@ class AquaIPy:
             usually because a previous call to ``connect()`` has failed
         """
         self._validate_connection()
-        path = "{0}/{1}".format(self._base_path, "schedule/enable")
-        async with self._session.get(path) as resp:
+        r_data = await self._reads.async_call(
+            "schedule/enable", self._async_request_schedule_state,
+            lambda result: result is not None and
+            result["response_code"] == 0)
 
-            r_data = await resp.json()
+        if r_data is None or r_data["response_code"] != 0:
+            return None
 
-            if r_data is None or r_data["response_code"] != 0:
-                return None
+        return r_data["enable"]
 
-            return r_data["enable"]
+    async def _async_request_schedule_state(self):
+        """Request the schedule state from API."""
+        return await self._async_request("GET", "schedule/enable")
 
     def set_schedule_state(self, enable):
         """Enable/Disable the light schedule, synchronously.
@@ -551,18 +1383,70 @@ class AquaIPy:
         self._validate_connection()
         data = {"enable": enable}
 
-        path = "{0}/{1}".format(self._base_path, "schedule/enable")
-        async with self._session.put(path, data=json.dumps(data)) as resp:
+        # Enabling the schedule changes the colors too
+        self._reads.invalidate()
 
-            r_data = await resp.json()
+        try:
+            r_data = await self._async_request(
+                "PUT", "schedule/enable", body=data)
+        finally:
+            self._reads.invalidate()
 
-            if r_data is None:
-                return Response.Error
+        if r_data is None or r_data['response_code'] != 0:
+            return self._record_response(
+                "set_schedule_state", Response.Error)
 
-            if r_data['response_code'] != 0:
-                return Response.Error
+        return self._record_response("set_schedule_state", Response.Success)
 
-            return Response.Success
+    def get_schedule(self):
+        """Get the light schedule, synchronously.
+
+        ..  warning:: Unverified, see *async_get_schedule()*.
+
+        :returns: dictionary of minute of the day and color percentages, or
+            *None* if there's an error
+        :rtype: dict( minute_1=colors_1..minute_n=colors_n )
+
+        :raises ConnError: if there is no valid connection to a device,
+            usually because a previous call to ``connect()`` has failed
+        """
+        return self._loop.run_until_complete(self.async_get_schedule())
+
+    async def async_get_schedule(self):
+        """Get the light schedule.
+
+        ..  warning:: Unverified. The format of the ``/api/schedule``
+            response, a list of points each with a *time* and *colors*,
+            hasn't been checked against a real device, only against
+            ``SimulatedLight``.
+
+        The schedule is also kept as the last known schedule, for
+        *schedule_evaluator*.
+
+        :returns: dictionary of minute of the day and color percentages, or
+            *None* if there's an error
+        :rtype: dict( minute_1=colors_1..minute_n=colors_n )
+
+        :raises ConnError: if there is no valid connection to a device,
+            usually because a previous call to ``async_connect()`` has failed
+        """
+        self._validate_connection()
+        r_data = await self._async_request("GET", "schedule")
+
+        if r_data is None or r_data['response_code'] != 0:
+            return None
+
+        self._schedule = parse_schedule_points(r_data['points'])
+
+        schedule = {}
+
+        for minute, intensities in self._schedule.items():
+            schedule[minute] = {
+                color: self._primary_device.convert_to_percentage(
+                    color, value)
+                for color, value in intensities.items()}
+
+        return schedule
 
     ###########################
     # Color Control / Intensity
@@ -600,6 +1484,32 @@ class AquaIPy:
 
         return colors
 
+    def refresh_colors(self):
+        """Refresh the cached list of valid colors, synchronously.
+
+        :returns: list of valid colors or *None* if there's an error
+        :rtype: list( color_1..color_n ) or None
+
+        :raises ConnError: if there is no valid connection to a device,
+            usually because a previous call to ``connect()`` has failed
+        """
+        return self._loop.run_until_complete(self.async_refresh_colors())
+
+    async def async_refresh_colors(self):
+        """Refresh the cached list of valid colors, from the device.
+
+        The cache is used to validate calls to *async_set_colors_brightness()*
+        without an extra request, so this only needs to be called if the
+        device's color channels have changed since connecting.
+
+        :returns: list of valid colors or *None* if there's an error
+        :rtype: list( color_1..color_n ) or None
+
+        :raises ConnError: if there is no valid connection to a device,
+            usually because a previous call to ``async_connect()`` has failed
+        """
+        return await self.async_get_colors()
+
     def get_colors_brightness(self):
         """Get the current brightness of all color channels, synchronously.
 
@@ -666,41 +1576,48 @@ class AquaIPy:
         :raises ConnError: if there is no valid connection to a device,
             usually because a previous call to ``connect()`` has failed
         """
-        # Need to add better validation here
-        if len(colors) < len(await self.async_get_colors()):
-            return Response.AllColorsMustBeSpecified
+        return await self._async_set_colors_brightness(colors)
+
+    async def _async_set_colors_brightness(self, colors, changed=None):
+        """Set all colors, noting which colors were changed for patches."""
+        if self._colors is None and await self.async_refresh_colors() is None:
+            return self._record_response(
+                "set_colors_brightness", Response.Error)
+
+        for color in self._colors:
+            if color not in colors:
+                return self._record_response(
+                    "set_colors_brightness",
+                    Response.AllColorsMustBeSpecified)
 
         intensities = {}
-        mw_value = 0
 
         for color, value in colors.items():
             intensities[color] = self._primary_device.convert_to_intensity(
                 color, value)
 
-            mw_value += self._primary_device.convert_to_mw(
-                color, intensities[color])
+        if self._power_scaling is not None:
+            intensities = self._scale_to_limits(intensities)
 
-        if mw_value > self._primary_device.max_mw:
-            print("Primary Device: mWatts exceeded - max: {} specified: {}"
-                  .format(str(self._primary_device.max_mw), str(mw_value)))
+        # Check if planned intensities will exceed the primary, or any child
+        # devices, max_mW (children only an issue if there are two different
+        # device types paired)
+        exceeded = self._power_budget.find_exceeded(intensities)
 
-            return Response.PowerLimitExceeded
+        if exceeded is not None:
+            self._record_power_limit_exceeded(*exceeded)
 
-        # Check if planned intensities will exceed any child devices max_mW
-        # (only issue if there are two different device types paired)
-        for device in self._other_devices:
-            mw_value = 0
+            return self._record_response(
+                "set_colors_brightness", Response.PowerLimitExceeded)
 
-            for color, value in intensities.items():
-                mw_value += device.convert_to_mw(color, value)
+        if self._write_channel is not None:
+            return self._record_response(
+                "set_colors_brightness",
+                await self._write_channel.async_write(intensities, changed))
 
-            if mw_value > device.max_mw:
-                print("mWatts exceeded - device: {} max: {} specified: {}"
-                      .format(device.mac_address, str(device.max_mw),
-                              str(mw_value)))
-                return Response.PowerLimitExceeded
-
-        return await self._async_set_brightness(intensities)
+        return self._record_response(
+            "set_colors_brightness",
+            await self._async_set_brightness(intensities))
 
     def patch_colors_brightness(self, colors):
         """Set specified colors to the given percentage values, sychronously.
@@ -732,7 +1649,10 @@ class AquaIPy:
         if len(colors) < 1:
             return Response.InvalidData
 
-        brightness = await self.async_get_colors_brightness()
+        brightness = self._get_tracked_brightness()
+
+        if brightness is None:
+            brightness = await self.async_get_colors_brightness()
 
         if brightness is None:
             return Response.Error
@@ -740,6 +1660,11 @@ class AquaIPy:
         for color, value in colors.items():
             brightness[color] = value
 
+        if self._write_channel is not None:
+            # Only the patched colors are merged into a waiting write
+            return await self._async_set_colors_brightness(
+                brightness, set(colors))
+
         return await self.async_set_colors_brightness(brightness)
 
     def update_color_brightness(self, color, value):
@@ -780,11 +1705,147 @@ class AquaIPy:
         if value == 0:
             return Response.Success
 
-        brightness = await self.async_get_colors_brightness()
+        brightness = self._get_tracked_brightness()
+
+        if brightness is None:
+            brightness = await self.async_get_colors_brightness()
 
         if brightness is None:
             return Response.Error
 
         brightness[color] += value
 
+        if self._write_channel is not None:
+            # Only the updated color is merged into a waiting write
+            return await self._async_set_colors_brightness(
+                brightness, {color})
+
         return await self.async_set_colors_brightness(brightness)
+
+    def ramp_colors_brightness(self, colors, duration, rate=DEFAULT_RAMP_RATE,
+                               start=None):
+        """Fade all colors to the specified percentages, synchronously.
+
+        :param colors: dictionary of colors and final percentage values
+        :type colors: dict( color_1=percentage_1..color_n=percentage_n )
+        :param duration: seconds the fade should take
+        :type duration: float
+        :param rate: number of updates to send per second
+        :type rate: float
+        :param start: dictionary of colors and starting percentage values,
+            defaults to the current brightness
+        :type start: dict( color_1=percentage_1..color_n=percentage_n )
+        :returns: Response.Success if it works, or a value indicating the
+            error, if there is an issue.
+        :rtype: Response
+
+        :raises ConnError: if there is no valid connection to a device,
+            usually because a previous call to ``connect()`` has failed
+        """
+        return self._loop.run_until_complete(
+            self.async_ramp_colors_brightness(colors, duration, rate, start))
+
+    async def async_ramp_colors_brightness(self, colors, duration,
+                                           rate=DEFAULT_RAMP_RATE,
+                                           start=None):
+        """Fade all colors to the specified percentages, over a duration.
+
+        Every step of the fade is calculated, and checked against the power
+        limits, before anything is sent. Updates are then sent at a fixed
+        rate, if the light falls behind then the steps that are already due
+        are skipped and only the latest is sent. The fade can be stopped by
+        cancelling the task that is awaiting it. With *coalesce_writes*
+        enabled, any other write made during the fade also stops it, and
+        ``Response.Coalesced`` is returned.
+
+        ..  note:: All colors returned by *get_colors()* must be specified.
+
+        :param colors: dictionary of colors and final percentage values
+        :type colors: dict( color_1=percentage_1..color_n=percentage_n )
+        :param duration: seconds the fade should take
+        :type duration: float
+        :param rate: number of updates to send per second
+        :type rate: float
+        :param start: dictionary of colors and starting percentage values,
+            defaults to the current brightness
+        :type start: dict( color_1=percentage_1..color_n=percentage_n )
+        :returns: Response.Success if it works, or a value indicating the
+            error, if there is an issue.
+        :rtype: Response
+
+        :raises ConnError: if there is no valid connection to a device,
+            usually because a previous call to ``connect()`` has failed
+        """
+        self._validate_connection()
+
+        if self._colors is None and await self.async_refresh_colors() is None:
+            return self._record_response(
+                "ramp_colors_brightness", Response.Error)
+
+        for color in self._colors:
+            if color not in colors or \
+                    (start is not None and color not in start):
+                return self._record_response(
+                    "ramp_colors_brightness",
+                    Response.AllColorsMustBeSpecified)
+
+        # The starting brightness is already set, unless it was specified
+        send_start = start is not None
+
+        if start is None:
+            start = await self.async_get_colors_brightness()
+
+            if start is None:
+                return self._record_response(
+                    "ramp_colors_brightness", Response.Error)
+
+        plan = RampPlan(self._primary_device, start, colors, duration, rate)
+
+        if self._power_scaling is not None:
+            scaled_count = plan.scale_to_limits(
+                self._power_budget, self._power_scaling)
+
+            if scaled_count:
+                _LOGGER.debug("Scaled %s of %s steps to the power limits",
+                              scaled_count, plan.last_index + 1)
+
+        exceeded = plan.find_exceeded(self._power_budget)
+
+        if exceeded is not None:
+            step, device, mw_value = exceeded
+            self._record_power_limit_exceeded(device, mw_value, step)
+
+            return self._record_response(
+                "ramp_colors_brightness", Response.PowerLimitExceeded)
+
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        index = 0
+
+        if not send_start and plan.last_index > 0:
+            index, delay = plan.get_next_step(0, 0)
+            await asyncio.sleep(delay)
+
+        channel = self._write_channel
+        writes = None
+
+        while True:
+            if channel is None:
+                response = await self._async_set_brightness(
+                    plan.steps[index])
+            elif writes is not None and channel.writes != writes:
+                # Another write was made during the fade, so it wins
+                response = Response.Coalesced
+            else:
+                writes = channel.writes + 1
+                response = await channel.async_write(plan.steps[index])
+
+            if response != Response.Success or index == plan.last_index:
+                return self._record_response(
+                    "ramp_colors_brightness", response)
+
+            index, delay = plan.get_next_step(
+                index, loop.time() - start_time)
+
+            if delay > 0:
+                await asyncio.sleep(delay)
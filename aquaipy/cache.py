@@ -0,0 +1,130 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for caching device profiles on disk, for faster reconnects."""
+
+import json
+import os
+import tempfile
+
+CACHE_FORMAT_VERSION = 1
+
+
+class ProfileCache:
+    """A class that stores the identity and power profile of each light.
+
+    Each host is stored in its own JSON file in *directory*, along with the
+    serial number of the light, so updating one light never rewrites the
+    profiles of the others. Files are replaced atomically, so a crash while
+    writing never leaves a partial profile behind.
+    """
+
+    def __init__(self, directory):
+        """Initialise the cache, creating the directory if required.
+
+        :param directory: the directory to store the profiles in
+        :type directory: str
+        """
+        self._directory = os.path.expanduser(directory)
+        os.makedirs(self._directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        """Get the directory the profiles are stored in.
+
+        :returns: directory path
+        :rtype: str
+        """
+        return self._directory
+
+    def _get_path(self, host):
+        """Get the path of the file for a host."""
+        name = "".join(char if char.isalnum() or char in ".-" else "_"
+                       for char in host)
+
+        return os.path.join(self._directory, "{}.json".format(name))
+
+    def get(self, host, serial_number=None):
+        """Get the cached profile for a host.
+
+        :param host: the host the light was connected on
+        :type host: str
+        :param serial_number: only return the profile if it's for the light
+            with this serial number
+        :type serial_number: str
+        :returns: the identity and power responses, or *None* if there's no
+            valid profile
+        :rtype: tuple( dict, dict ) or None
+        """
+        try:
+            with open(self._get_path(host)) as cache_file:
+                entry = json.load(cache_file)
+
+            if entry['version'] != CACHE_FORMAT_VERSION or \
+                    entry['host'] != host:
+                return None
+
+            identity = entry['identity']
+            power = entry['power']
+
+            if serial_number is not None and \
+                    identity['serial_number'] != serial_number:
+                return None
+
+            return identity, power
+
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def set(self, host, identity, power):
+        """Store the profile for a host.
+
+        :param host: the host the light was connected on
+        :type host: str
+        :param identity: the ``/api/identity`` response
+        :type identity: dict
+        :param power: the ``/api/power`` response
+        :type power: dict
+        """
+        entry = {
+            'version': CACHE_FORMAT_VERSION,
+            'host': host,
+            'identity': identity,
+            'power': power,
+        }
+
+        path = self._get_path(host)
+        handle, temp_path = tempfile.mkstemp(dir=self._directory,
+                                             suffix=".tmp")
+
+        try:
+            with os.fdopen(handle, 'w') as cache_file:
+                json.dump(entry, cache_file)
+
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def invalidate(self, host):
+        """Remove the profile for a host, if there is one.
+
+        :param host: the host the light was connected on
+        :type host: str
+        """
+        try:
+            os.remove(self._get_path(host))
+        except FileNotFoundError:
+            pass
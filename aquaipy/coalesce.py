@@ -0,0 +1,262 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Module for coalescing the reads and writes sent to a light."""
+
+import asyncio
+import time
+
+# Resolves a waiting write when it's the latest, and should now be sent
+_SEND = object()
+
+
+class LatestWriteChannel:
+    """A class that sends one write at a time, with the latest value winning.
+
+    While a write is being sent, the next write waits. If another write
+    arrives before it's sent, the waiting write is superseded, so it resolves
+    with *coalesced* and is never sent. Partial writes, that only change
+    some keys, are kept as just the changed keys and merged into the waiting
+    write instead of replacing it. They're applied on top of the last value
+    that was sent successfully, when it's their turn, so they never undo a
+    write that was sent while they waited.
+
+    There's no background task, the latest waiting write is sent by its own
+    caller, once the previous write has finished.
+    """
+
+    def __init__(self, send, coalesced, success=None):
+        """Initialise the channel.
+
+        :param send: coroutine function that sends a value and returns the
+            result
+        :type send: callable
+        :param coalesced: the result for writes that were superseded
+        :param success: the result of a successful send, or *None* if every
+            send that doesn't raise an exception is successful
+        """
+        self._send = send
+        self._coalesced = coalesced
+        self._success = success
+        self._busy = False
+        self._pending = None
+        self._last_sent = None
+        self._writes = 0
+
+    @property
+    def busy(self):
+        """Check if a write is being sent.
+
+        :returns: *True* if a write is being sent
+        :rtype: bool
+        """
+        return self._busy
+
+    @property
+    def writes(self):
+        """Get the number of writes made through the channel.
+
+        :returns: number of writes, including any that were coalesced
+        :rtype: int
+        """
+        return self._writes
+
+    async def async_write(self, value, changed=None):
+        """Send a value, once any write already being sent has finished.
+
+        :param value: dictionary of every key and value to write
+        :type value: dict
+        :param changed: the keys that this write changes, or *None* if it
+            replaces every key. Only these keys are merged into a waiting
+            write, or applied on top of the last value sent.
+        :type changed: set
+        :returns: the result of *send*, or *coalesced* if a newer write
+            superseded this one before it was sent
+        """
+        self._writes += 1
+        changes = None
+
+        if changed is not None:
+            changes = {key: value[key] for key in changed}
+
+        if self._pending is not None:
+            pending_value, pending_changes, pending_future = self._pending
+            self._pending = None
+
+            # A cancelled write is dropped, rather than merged
+            if not pending_future.done():
+                if changes is not None:
+                    value = dict(pending_value)
+                    value.update(changes)
+
+                    if pending_changes is None:
+                        # Merged into a full write, so it's now full too
+                        changes = None
+                    else:
+                        merged = dict(pending_changes)
+                        merged.update(changes)
+                        changes = merged
+
+                pending_future.set_result(self._coalesced)
+
+        if not self._busy:
+            self._busy = True
+
+            return await self._async_send(value)
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending = (value, changes, future)
+
+        try:
+            result = await future
+        except asyncio.CancelledError:
+            if self._pending is not None and self._pending[2] is future:
+                self._pending = None
+            elif future.done() and not future.cancelled() and \
+                    future.result() is _SEND:
+                # It was this write's turn, so pass it on
+                self._release()
+
+            raise
+
+        if result is _SEND:
+            if changes is not None and self._last_sent is not None:
+                value = dict(self._last_sent)
+                value.update(changes)
+
+            return await self._async_send(value)
+
+        return result
+
+    async def _async_send(self, value):
+        """Send a value, then hand over to the waiting write, if any."""
+        try:
+            result = await self._send(value)
+        except BaseException:
+            # It's unknown what was applied, so patches use their own values
+            self._last_sent = None
+            self._release()
+            raise
+
+        if self._success is None or result == self._success:
+            self._last_sent = value
+
+        self._release()
+
+        return result
+
+    def _release(self):
+        """Let the waiting write send, or mark the channel as idle."""
+        if self._pending is None:
+            self._busy = False
+            return
+
+        future = self._pending[2]
+        self._pending = None
+
+        if future.done():
+            self._busy = False
+        else:
+            future.set_result(_SEND)
+
+
+class SingleFlight:
+    """A class that shares one call between concurrent callers of a key.
+
+    While a call for a key is in flight, any other caller for the same key
+    waits for, and gets, the same result instead of starting another call.
+    Results can also be reused for *ttl* seconds after the call finishes.
+
+    Keys should be invalidated whenever their data is changed, so callers
+    after a change never get a result that was read before it.
+    """
+
+    def __init__(self, ttl=None):
+        """Initialise the calls.
+
+        :param ttl: seconds to reuse each result for, or *None* to only
+            share calls that are in flight
+        :type ttl: float
+        """
+        self._ttl = ttl
+        self._in_flight = {}
+        self._results = {}
+        self._generations = {}
+
+    async def async_call(self, key, func, keep=None):
+        """Get the result for a key, joining any call already in flight.
+
+        :param key: the key that identifies the call
+        :type key: str
+        :param func: coroutine function, with no arguments, to start the
+            call if there isn't one in flight
+        :type func: callable
+        :param keep: function that takes the result and returns *True* if it
+            can be reused for *ttl* seconds, defaults to keeping every result
+        :type keep: callable
+        :returns: the result of *func*
+        """
+        if self._ttl is not None and key in self._results:
+            finished, result = self._results[key]
+
+            if time.monotonic() - finished <= self._ttl:
+                return result
+
+            del self._results[key]
+
+        task = self._in_flight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(func())
+            generation = self._generations.get(key, 0)
+            task.add_done_callback(
+                lambda done: self._finish(key, generation, keep, done))
+            self._in_flight[key] = task
+
+        # Cancelling one caller doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key, generation, keep, task):
+        """Forget a finished call, and keep its result if it's still valid."""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        if keep is not None and not keep(task.result()):
+            return
+
+        if self._ttl is not None and \
+                self._generations.get(key, 0) == generation:
+            self._results[key] = (time.monotonic(), task.result())
+
+    def invalidate(self, key=None):
+        """Forget the result, and any call in flight, for a key.
+
+        Callers already waiting on a call still get its result, but later
+        callers start a new call.
+
+        :param key: the key to invalidate, or *None* for every key
+        :type key: str
+        """
+        keys = [key] if key is not None else \
+            set(self._in_flight) | set(self._results) | set(self._generations)
+
+        for item in keys:
+            self._generations[item] = self._generations.get(item, 0) + 1
+            self._in_flight.pop(item, None)
+            self._results.pop(item, None)
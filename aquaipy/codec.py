@@ -0,0 +1,120 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Module for encoding and decoding JSON, with the fastest library installed.
+
+*orjson* is used if it's installed, then *ujson*, otherwise the standard
+library *json* module. Install the fastest with ``pip install
+aquaipy[fastjson]``.
+"""
+
+import json
+
+CODEC_NAMES = ("orjson", "ujson", "json")
+
+
+class JsonCodec:
+    """A class that encodes request bodies and decodes response bodies.
+
+    Bodies are always encoded to, and decoded from, UTF-8 bytes, so they can
+    be sent and parsed without any further conversion.
+    """
+
+    def __init__(self, name, dumps, loads):
+        """Initialise the codec.
+
+        :param name: the name of the JSON library
+        :type name: str
+        :param dumps: function that encodes an object to bytes
+        :type dumps: callable
+        :param loads: function that decodes bytes to an object
+        :type loads: callable
+        """
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        """Get a readable representation of the codec."""
+        return "<JsonCodec {}>".format(self.name)
+
+
+def _create_orjson_codec():
+    """Create the *orjson* codec, which already works with bytes."""
+    import orjson
+
+    return JsonCodec("orjson", orjson.dumps, orjson.loads)
+
+
+def _create_ujson_codec():
+    """Create the *ujson* codec."""
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(obj).encode("utf-8")
+
+    return JsonCodec("ujson", dumps, ujson.loads)
+
+
+def _create_json_codec():
+    """Create the standard library codec."""
+    encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def dumps(obj):
+        return encoder.encode(obj).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data.decode("utf-8"))
+
+    return JsonCodec("json", dumps, loads)
+
+
+_FACTORIES = {
+    "orjson": _create_orjson_codec,
+    "ujson": _create_ujson_codec,
+    "json": _create_json_codec,
+}
+
+_codecs = {}
+
+
+def get_codec(name=None):
+    """Get a JSON codec.
+
+    :param name: the JSON library to use, one of *CODEC_NAMES*, or *None*
+        for the fastest that is installed
+    :type name: str
+    :returns: the codec
+    :rtype: JsonCodec
+
+    :raises ImportError: if the named library isn't installed
+    :raises ValueError: if the name isn't a supported library
+    """
+    if name is None:
+        for candidate in CODEC_NAMES:
+            try:
+                return get_codec(candidate)
+            except ImportError:
+                continue
+
+    if name not in _FACTORIES:
+        raise ValueError("Unknown JSON codec '{}', expected one of: {}"
+                         .format(name, ", ".join(CODEC_NAMES)))
+
+    if name not in _codecs:
+        _codecs[name] = _FACTORIES[name]()
+
+    return _codecs[name]
@@ -0,0 +1,259 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for discovering AquaIllumination lights on a network."""
+
+import asyncio
+import ipaddress
+
+import aiohttp
+
+from aquaipy.codec import get_codec
+
+DEFAULT_DISCOVERY_CONCURRENCY = 256
+DEFAULT_DISCOVERY_TIMEOUT = 1
+
+
+class DiscoveredLight:
+    """A class that describes a light found by discovery.
+
+    Child lights, that are paired with a parent, are listed in the
+    *children* of their parent if the parent was also found.
+    """
+
+    def __init__(self, host, identity):
+        """Initialise the light from its identity response.
+
+        :param host: the host the light responded on
+        :type host: str
+        :param identity: the ``/api/identity`` response
+        :type identity: dict
+        """
+        self.host = host
+        self.serial_number = identity['serial_number']
+        self.product = identity['product']
+        self.firmware = identity['firmware']
+        self.parent = identity['parent']
+        self.children = []
+
+    def __repr__(self):
+        """Get a readable representation of the light."""
+        return "<DiscoveredLight {} {} {} firmware {}>".format(
+            self.host, self.serial_number, self.product, self.firmware)
+
+    @property
+    def is_parent(self):
+        """Check if this light can be connected to directly.
+
+        :returns: *True* if the light isn't paired as a child
+        :rtype: bool
+        """
+        return self.parent == ""
+
+    @property
+    def parent_serial_number(self):
+        """Get the serial number of the parent, for a child light.
+
+        The parent is reported as ``<name>-<serial number>``.
+
+        :returns: the parent serial number, or *None* for a parent light
+        :rtype: str
+        """
+        if self.is_parent:
+            return None
+
+        return self.parent.rsplit("-", 1)[-1]
+
+
+class DiscoveryResult:
+    """A class that holds the lights found by discovery, and their topology."""
+
+    def __init__(self, lights):
+        """Initialise the result, linking each child to its parent.
+
+        :param lights: the lights that responded
+        :type lights: list(DiscoveredLight)
+        """
+        self._lights = list(lights)
+        self._orphans = []
+
+        parents = {light.serial_number: light for light in self._lights
+                   if light.is_parent}
+
+        for light in self._lights:
+            if light.is_parent:
+                continue
+
+            parent = parents.get(light.parent_serial_number)
+
+            if parent is None:
+                self._orphans.append(light)
+            else:
+                parent.children.append(light)
+
+    @property
+    def lights(self):
+        """Get every light that was found.
+
+        :returns: list of lights
+        :rtype: list(DiscoveredLight)
+        """
+        return list(self._lights)
+
+    @property
+    def parents(self):
+        """Get the parent lights, with their children.
+
+        :returns: list of parent lights
+        :rtype: list(DiscoveredLight)
+        """
+        return [light for light in self._lights if light.is_parent]
+
+    @property
+    def parent_hosts(self):
+        """Get the hosts to connect to, with **AquaIPy** or **AquaIPyFleet**.
+
+        :returns: list of parent hosts
+        :rtype: list(str)
+        """
+        return [light.host for light in self.parents]
+
+    @property
+    def orphans(self):
+        """Get the child lights, whose parent wasn't found.
+
+        :returns: list of child lights
+        :rtype: list(DiscoveredLight)
+        """
+        return list(self._orphans)
+
+    def group_by(self, attribute):
+        """Group the lights by an attribute, e.g. *product* or *firmware*.
+
+        :param attribute: the name of the attribute
+        :type attribute: str
+        :returns: dictionary of attribute value and list of lights
+        :rtype: dict( value_1=lights_1..value_n=lights_n )
+        """
+        groups = {}
+
+        for light in self._lights:
+            groups.setdefault(getattr(light, attribute), []).append(light)
+
+        return groups
+
+
+def get_network_hosts(network, port=None):
+    """Get every host address in a network.
+
+    :param network: the network, in CIDR notation, e.g. ``192.168.1.0/24``
+    :type network: str
+    :param port: the port to add to each host, if not the default
+    :type port: int
+    :returns: list of hosts
+    :rtype: list(str)
+    """
+    hosts = [str(address) for address in
+             ipaddress.ip_network(network, strict=False).hosts()]
+
+    if port is not None:
+        hosts = ["{}:{}".format(host, port) for host in hosts]
+
+    return hosts
+
+
+async def _async_probe(session, semaphore, host, timeout):
+    """Get the identity of a host, or *None* if it isn't an AI light."""
+    async with semaphore:
+        try:
+            async with session.get(
+                    "http://{}/api/identity".format(host),
+                    timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+
+                identity = get_codec().loads(await resp.read())
+
+            if identity['response_code'] != 0:
+                return None
+
+            return DiscoveredLight(host, identity)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError,
+                TypeError, KeyError):
+            return None
+
+
+async def async_discover_hosts(hosts, session=None,
+                               concurrency=DEFAULT_DISCOVERY_CONCURRENCY,
+                               timeout=DEFAULT_DISCOVERY_TIMEOUT):
+    """Probe a list of hosts for AI lights.
+
+    :param hosts: the hosts to probe
+    :type hosts: list(str)
+    :param session: Optional session to send the probes with
+    :type session: aiohttp.ClientSession
+    :param concurrency: Max number of hosts to probe at once
+    :type concurrency: int
+    :param timeout: Max seconds to wait for each host
+    :type timeout: float
+    :returns: the lights found and their topology
+    :rtype: DiscoveryResult
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be greater than 0")
+
+    session_is_local = session is None
+
+    if session_is_local:
+        # Every host is only probed once, so connections aren't kept
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+            limit=concurrency, force_close=True))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    try:
+        found = await asyncio.gather(
+            *[_async_probe(session, semaphore, host, timeout)
+              for host in hosts])
+    finally:
+        if session_is_local:
+            await session.close()
+
+    return DiscoveryResult([light for light in found if light is not None])
+
+
+async def async_discover(network, port=None, session=None,
+                         concurrency=DEFAULT_DISCOVERY_CONCURRENCY,
+                         timeout=DEFAULT_DISCOVERY_TIMEOUT):
+    """Probe every host in a network for AI lights.
+
+    Every address is probed with a short timeout and many probes run at once,
+    so a /22 network takes around *timeout* x 1022 / *concurrency* seconds,
+    at most.
+
+    :param network: the network, in CIDR notation, e.g. ``192.168.1.0/24``
+    :type network: str
+    :param port: the port the lights listen on, if not the default
+    :type port: int
+    :param session: Optional session to send the probes with
+    :type session: aiohttp.ClientSession
+    :param concurrency: Max number of hosts to probe at once
+    :type concurrency: int
+    :param timeout: Max seconds to wait for each host
+    :type timeout: float
+    :returns: the lights found and their topology
+    :rtype: DiscoveryResult
+    """
+    return await async_discover_hosts(
+        get_network_hosts(network, port), session, concurrency, timeout)
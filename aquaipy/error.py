@@ -36,6 +36,16 @@ class ConnError(Error):
         self.host = host
 
 
+class RequestTimeoutError(ConnError):
+    """Raised when an AI light doesn't respond within the configured timeout.
+
+    :ivar message: error message
+    :ivar host: host
+    """
+
+    pass
+
+
 class FirmwareError(Error):
     """Raised when connecting to a device that has unsupported firmware.
 
@@ -0,0 +1,284 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for driving many AquaIllumination lights concurrently."""
+
+import asyncio
+
+from aquaipy.aquaipy import AquaIPy, ConnectionConfig
+from aquaipy.ramp import DEFAULT_RAMP_RATE
+from aquaipy.tracing import create_trace_config
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class AquaIPyFleet:
+    """A class that drives a number of **AquaIPy** instances concurrently.
+
+    Every light in the fleet shares a single ``aiohttp.ClientSession`` and
+    calls are fanned out across all hosts, with at most *max_concurrency*
+    requests outstanding at any time.
+
+    Each fleet method returns a tuple of two dictionaries, keyed by host. The
+    first contains the result from each host that completed and the second
+    contains the exception raised by each host that failed.
+
+    If a *timeout* is specified, a host that takes longer than that to
+    complete a call is reported as failed with an ``asyncio.TimeoutError``,
+    so a slow light never holds up the rest of the fleet for longer.
+    """
+
+    def __init__(self, hosts, session=None, max_concurrency=None,
+                 connection_config=None, timeout=None, instrumentation=None,
+                 profile_cache=None, power_scaling=None):
+        """Initialise the fleet, with the list of hosts to control.
+
+        :param hosts: Hostnames/IPs of the AI lights, for paired lights these
+            should be the parent lights.
+        :type hosts: list(str)
+        :param session: Optional session to share between all lights.
+        :type session: aiohttp.ClientSession
+        :param max_concurrency: Max number of hosts to call at once.
+        :type max_concurrency: int
+        :param connection_config: Configuration for the connections to the
+            lights. The timeouts and retries are always used, the connection
+            settings are only used if a *session* isn't specified.
+        :type connection_config: ConnectionConfig
+        :param timeout: Max seconds to wait for each host, per call.
+        :type timeout: float
+        :param instrumentation: Receives the events from every light, e.g. a
+            ``MetricsCollector``.
+        :type instrumentation: Instrumentation
+        :param profile_cache: Optional cache of device profiles, shared by
+            every light.
+        :type profile_cache: ProfileCache
+        :param power_scaling: Scale colors down to the power limits of each
+            light, instead of rejecting them.
+        :type power_scaling: PowerScaling
+        """
+        if max_concurrency is None:
+            max_concurrency = DEFAULT_MAX_CONCURRENCY
+
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be greater than 0")
+
+        if connection_config is None:
+            connection_config = ConnectionConfig()
+
+        if session is None:
+            trace_configs = None
+
+            if instrumentation is not None:
+                trace_configs = [create_trace_config()]
+
+            self._session = connection_config.create_session(trace_configs)
+            self._session_is_local = True
+        else:
+            self._session = session
+            self._session_is_local = False
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._timeout = timeout
+        self._lights = {}
+
+        for host in hosts:
+            if host not in self._lights:
+                self._lights[host] = AquaIPy(
+                    host, session=self._session,
+                    connection_config=connection_config,
+                    instrumentation=instrumentation,
+                    profile_cache=profile_cache,
+                    power_scaling=power_scaling)
+
+    @property
+    def hosts(self):
+        """Get the hosts that are part of this fleet.
+
+        :returns: list of hosts
+        :rtype: list(str)
+        """
+        return list(self._lights)
+
+    @property
+    def lights(self):
+        """Get the **AquaIPy** instance for each host.
+
+        :returns: dictionary of host and AquaIPy instance
+        :rtype: dict( host_1=AquaIPy_1..host_n=AquaIPy_n )
+        """
+        return dict(self._lights)
+
+    async def async_close(self):
+        """Close every light, and the session if it was created by the fleet.
+
+        The lights share the session, so closing them only stops their
+        background tasks.
+        """
+        for light in self._lights.values():
+            await light.async_close()
+
+        if self._session_is_local:
+            await self._session.close()
+
+    ##################
+    # Internal Methods
+    ##################
+    async def _async_run_all(self, call):
+        """Run *call(host, light)* for every host, collecting the outcomes."""
+        async def run(host):
+            async with self._semaphore:
+                return await asyncio.wait_for(
+                    call(host, self._lights[host]), self._timeout)
+
+        hosts = self.hosts
+        outcomes = await asyncio.gather(
+            *[run(host) for host in hosts], return_exceptions=True)
+
+        results = {}
+        errors = {}
+
+        for host, outcome in zip(hosts, outcomes):
+            # CancelledError is only a BaseException from Python 3.8
+            if isinstance(outcome, BaseException):
+                errors[host] = outcome
+            else:
+                results[host] = outcome
+
+        return results, errors
+
+    async def _async_call_all(self, method_name, *args):
+        """Call the named **AquaIPy** method on every host."""
+        return await self._async_run_all(
+            lambda host, light: getattr(light, method_name)(*args))
+
+    ############
+    # Fleet API
+    ############
+    async def async_connect(self, check_firmware_support=True, fast=False):
+        """Connect to every light in the fleet.
+
+        :param check_firmware_support: Set to False to skip the firmware check
+        :type check_firmware_support: bool
+        :param fast: Request the identity and power details concurrently
+        :type fast: bool
+        :returns: per-host results and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        async def connect(host, light):
+            await light.async_connect(host, check_firmware_support, fast)
+            return light.mac_addr
+
+        return await self._async_run_all(connect)
+
+    async def async_get_schedule_state(self):
+        """Check if the schedule is enabled/disabled on every light.
+
+        :returns: per-host schedule state and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all('async_get_schedule_state')
+
+    async def async_set_schedule_state(self, enable):
+        """Enable/disable the schedule on every light.
+
+        :param enable: Schedule Enable (*True*) / Schedule Disable (*False*)
+        :type enable: bool
+        :returns: per-host Response and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all('async_set_schedule_state', enable)
+
+    async def async_get_schedule(self):
+        """Get the schedule of every light.
+
+        ..  warning:: Unverified, see **AquaIPy.async_get_schedule()**.
+
+        :returns: per-host schedule and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all('async_get_schedule')
+
+    async def async_get_colors(self):
+        """Get the list of valid colors for every light.
+
+        :returns: per-host list of colors and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all('async_get_colors')
+
+    async def async_get_colors_brightness(self):
+        """Get the current brightness of all color channels on every light.
+
+        :returns: per-host color percentages and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all('async_get_colors_brightness')
+
+    async def async_set_colors_brightness(self, colors):
+        """Set all colors to the specified color percentage on every light.
+
+        :param colors: dictionary of colors and percentage values
+        :type colors: dict( color_1=percentage_1..color_n=percentage_n )
+        :returns: per-host Response and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all(
+            'async_set_colors_brightness', colors)
+
+    async def async_patch_colors_brightness(self, colors):
+        """Set specified colors to the given percentage on every light.
+
+        :param colors: Specify just the colors that should be updated
+        :type colors: dict( color_1=percentage_1..color_n=percentage_n )
+        :returns: per-host Response and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all(
+            'async_patch_colors_brightness', colors)
+
+    async def async_update_color_brightness(self, color, value):
+        """Update a given color by the specified percentage on every light.
+
+        :param color: color to change
+        :param value: value to change percentage by
+        :type color: str
+        :type value: float
+        :returns: per-host Response and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all(
+            'async_update_color_brightness', color, value)
+
+    async def async_ramp_colors_brightness(self, colors, duration,
+                                           rate=DEFAULT_RAMP_RATE,
+                                           start=None):
+        """Fade all colors to the specified percentages on every light.
+
+        ..  note:: The fleet *timeout* applies to the whole fade.
+
+        :param colors: dictionary of colors and final percentage values
+        :type colors: dict( color_1=percentage_1..color_n=percentage_n )
+        :param duration: seconds the fade should take
+        :type duration: float
+        :param rate: number of updates to send per second
+        :type rate: float
+        :param start: dictionary of colors and starting percentage values,
+            defaults to the current brightness of each light
+        :type start: dict( color_1=percentage_1..color_n=percentage_n )
+        :returns: per-host Response and per-host errors
+        :rtype: tuple( dict, dict )
+        """
+        return await self._async_call_all(
+            'async_ramp_colors_brightness', colors, duration, rate, start)
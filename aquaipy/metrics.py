@@ -0,0 +1,297 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for instrumenting requests and results, and exporting metrics."""
+
+import bisect
+
+from aiohttp import web
+
+from aquaipy.tracing import PHASES
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                           5, 10)
+
+OPENMETRICS_CONTENT_TYPE = \
+    "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Instrumentation:
+    """A base class for receiving events from **AquaIPy**.
+
+    Every hook does nothing by default, so subclasses only need to override
+    the events they are interested in. No events are generated, or timings
+    taken, unless an instance is passed to **AquaIPy**.
+    """
+
+    def on_request(self, host, method, endpoint, seconds, response_code,
+                   error):
+        """Handle a completed request attempt, including any retries.
+
+        :param host: the host the request was sent to
+        :type host: str
+        :param method: the HTTP method
+        :type method: str
+        :param endpoint: the API endpoint, e.g. ``colors``
+        :type endpoint: str
+        :param seconds: how long the attempt took
+        :type seconds: float
+        :param response_code: the ``response_code`` returned by the light, or
+            *None* if the request failed
+        :type response_code: int
+        :param error: the exception raised by the request, or *None*
+        :type error: Exception
+        """
+
+    def on_request_timing(self, host, method, endpoint, timing):
+        """Handle the phase timings of a successful request.
+
+        :param host: the host the request was sent to
+        :type host: str
+        :param method: the HTTP method
+        :type method: str
+        :param endpoint: the API endpoint, e.g. ``colors``
+        :type endpoint: str
+        :param timing: the time taken by each phase of the request
+        :type timing: RequestTiming
+        """
+
+    def on_response(self, host, operation, response):
+        """Handle the result of an operation.
+
+        :param host: the host the operation was run against
+        :type host: str
+        :param operation: the name of the operation, e.g.
+            ``set_colors_brightness``
+        :type operation: str
+        :param response: the result of the operation
+        :type response: Response
+        """
+
+    def on_power_limit_exceeded(self, host, device, max_mw, mw_value):
+        """Handle intensities being rejected for exceeding a power limit.
+
+        :param host: the host the intensities were for
+        :type host: str
+        :param device: the MAC address of the device that would be exceeded
+        :type device: str
+        :param max_mw: the max mWatts for the device
+        :type max_mw: int
+        :param mw_value: the mWatts the intensities would use
+        :type mw_value: float
+        """
+
+
+class MetricsCollector(Instrumentation):
+    """A class that aggregates **AquaIPy** events into metrics.
+
+    Counts requests per host, method and endpoint, keeps a latency histogram
+    and the total time spent in each request phase for each of them, and
+    counts errors, operation results and power limit rejections. The metrics
+    can be exported in the OpenMetrics text format.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """Initialise the collector.
+
+        :param buckets: the upper bounds of the latency histogram buckets,
+            in seconds
+        :type buckets: tuple(float)
+        """
+        self._buckets = tuple(sorted(buckets))
+        self.requests = {}
+        self.request_errors = {}
+        self.responses = {}
+        self.power_limit_rejections = {}
+        self.phases = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _increment(counters, key):
+        """Increment the counter for a key."""
+        counters[key] = counters.get(key, 0) + 1
+
+    def on_request(self, host, method, endpoint, seconds, response_code,
+                   error):
+        """Count the request and record its latency."""
+        key = (host, method, endpoint)
+        self._increment(self.requests, key)
+
+        histogram = self._histograms.get(key)
+
+        if histogram is None:
+            histogram = self._histograms[key] = \
+                [[0] * (len(self._buckets) + 1), 0]
+
+        histogram[0][bisect.bisect_left(self._buckets, seconds)] += 1
+        histogram[1] += seconds
+
+        if error is not None:
+            self._increment(self.request_errors,
+                            key + (type(error).__name__,))
+        elif response_code != 0:
+            self._increment(self.request_errors,
+                            key + ("response_code_{}".format(response_code),))
+
+    def on_request_timing(self, host, method, endpoint, timing):
+        """Add up the time spent in each phase of the request."""
+        for phase in PHASES:
+            seconds = getattr(timing, phase)
+
+            if seconds is None:
+                continue
+
+            key = (host, method, endpoint, phase)
+            count, total = self.phases.get(key, (0, 0))
+            self.phases[key] = (count + 1, total + seconds)
+
+    def on_response(self, host, operation, response):
+        """Count the result of the operation."""
+        self._increment(self.responses, (host, operation, response.name))
+
+    def on_power_limit_exceeded(self, host, device, max_mw, mw_value):
+        """Count the power limit rejection."""
+        self._increment(self.power_limit_rejections, (host, device))
+
+    def get_latency_histogram(self, host, method, endpoint):
+        """Get the cumulative latency histogram for requests.
+
+        :returns: list of (upper bound, count) tuples, the last bound is
+            ``inf``, and the sum of all latencies in seconds
+        :rtype: tuple( list( tuple(float, int) ), float )
+        """
+        counts, total = self._histograms.get(
+            (host, method, endpoint), [[0] * (len(self._buckets) + 1), 0])
+        cumulative = []
+        count = 0
+
+        for bound, bucket_count in zip(self._buckets + (float("inf"),),
+                                       counts):
+            count += bucket_count
+            cumulative.append((bound, count))
+
+        return cumulative, total
+
+    def export_openmetrics(self):
+        """Export all the metrics, in the OpenMetrics text format.
+
+        :returns: the metrics text, ending with ``# EOF``
+        :rtype: str
+        """
+        lines = []
+
+        lines.append("# TYPE aquaipy_requests counter")
+        lines.append("# HELP aquaipy_requests Requests sent to the lights.")
+        for key, count in sorted(self.requests.items()):
+            lines.append(_sample("aquaipy_requests_total",
+                                 ("host", "method", "endpoint"), key, count))
+
+        lines.append("# TYPE aquaipy_request_duration_seconds histogram")
+        lines.append("# HELP aquaipy_request_duration_seconds Request "
+                     "latency.")
+        for key in sorted(self._histograms):
+            histogram, total = self.get_latency_histogram(*key)
+
+            for bound, count in histogram:
+                lines.append(_sample(
+                    "aquaipy_request_duration_seconds_bucket",
+                    ("host", "method", "endpoint", "le"),
+                    key + (_format_bound(bound),), count))
+
+            labels = ("host", "method", "endpoint")
+            lines.append(_sample("aquaipy_request_duration_seconds_count",
+                                 labels, key, histogram[-1][1]))
+            lines.append(_sample("aquaipy_request_duration_seconds_sum",
+                                 labels, key, total))
+
+        lines.append("# TYPE aquaipy_request_phase_seconds summary")
+        lines.append("# HELP aquaipy_request_phase_seconds Time spent in "
+                     "each phase of a request.")
+        for key, (count, total) in sorted(self.phases.items()):
+            labels = ("host", "method", "endpoint", "phase")
+            lines.append(_sample("aquaipy_request_phase_seconds_count",
+                                 labels, key, count))
+            lines.append(_sample("aquaipy_request_phase_seconds_sum",
+                                 labels, key, total))
+
+        lines.append("# TYPE aquaipy_request_errors counter")
+        lines.append("# HELP aquaipy_request_errors Requests that failed or "
+                     "returned a non-zero response_code.")
+        for key, count in sorted(self.request_errors.items()):
+            lines.append(_sample("aquaipy_request_errors_total",
+                                 ("host", "method", "endpoint", "error"),
+                                 key, count))
+
+        lines.append("# TYPE aquaipy_responses counter")
+        lines.append("# HELP aquaipy_responses Results of operations.")
+        for key, count in sorted(self.responses.items()):
+            lines.append(_sample("aquaipy_responses_total",
+                                 ("host", "operation", "response"),
+                                 key, count))
+
+        lines.append("# TYPE aquaipy_power_limit_rejections counter")
+        lines.append("# HELP aquaipy_power_limit_rejections Intensities "
+                     "rejected for exceeding a device power limit.")
+        for key, count in sorted(self.power_limit_rejections.items()):
+            lines.append(_sample("aquaipy_power_limit_rejections_total",
+                                 ("host", "device"), key, count))
+
+        lines.append("# EOF")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+def _format_bound(bound):
+    """Format a histogram bucket bound."""
+    if bound == float("inf"):
+        return "+Inf"
+
+    return repr(float(bound))
+
+
+def _sample(name, label_names, label_values, value):
+    """Format a single sample line."""
+    labels = ",".join('{}="{}"'.format(label, _escape(label_value))
+                      for label, label_value in zip(label_names,
+                                                    label_values))
+
+    return "{}{{{}}} {}".format(name, labels, value)
+
+
+def create_metrics_app(collector):
+    """Create a web app that serves the metrics at ``/metrics``.
+
+    Run it with ``aiohttp.web.AppRunner``, or ``aiohttp.web.run_app``.
+
+    :param collector: the collector to export
+    :type collector: MetricsCollector
+    :returns: the web application
+    :rtype: aiohttp.web.Application
+    """
+    async def handle_metrics(request):
+        return web.Response(
+            body=collector.export_openmetrics().encode("utf-8"),
+            headers={"Content-Type": OPENMETRICS_CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_route('GET', '/metrics', handle_metrics)
+
+    return app
@@ -0,0 +1,321 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for checking color intensities against device power limits."""
+
+
+def _import_numpy():
+    """Import NumPy, which is only required for the array checks."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("NumPy is required for array power checks, install "
+                          "it with 'pip install aquaipy[numpy]'")
+
+    return numpy
+
+
+class PowerScaling:
+    """A class that configures scaling intensities down to the power limits.
+
+    By default every color has the same priority, so all colors are scaled
+    down by the same factor and the spectral ratio is preserved. Colors can
+    be given priorities, in which case the colors with the lowest priority
+    are scaled down first, preserving the ratio between the colors of each
+    priority, and higher priorities are only reduced if turning the lower
+    priorities off isn't enough.
+    """
+
+    def __init__(self, priorities=None):
+        """Initialise the scaling.
+
+        :param priorities: dictionary of colors and priorities, higher
+            priorities are reduced last. Colors that aren't specified have a
+            priority of 0.
+        :type priorities: dict( color_1=priority_1..color_n=priority_n )
+        """
+        self.priorities = dict(priorities or {})
+
+    def get_tiers(self, colors):
+        """Group colors by priority, lowest priority first.
+
+        :param colors: the colors to group
+        :type colors: list( color_1..color_n )
+        :returns: list of lists of colors
+        :rtype: list( list( color_1..color_n ) )
+        """
+        tiers = {}
+
+        for color in colors:
+            tiers.setdefault(self.priorities.get(color, 0), []).append(color)
+
+        return [tiers[priority] for priority in sorted(tiers)]
+
+
+class PowerBudget:
+    """A class for checking intensities against the power limit of devices.
+
+    The mWatt coefficients of every paired ``HDDevice`` are gathered once, so
+    a set of intensities can be checked against all devices without any
+    further conversions.
+    """
+
+    def __init__(self, devices):
+        """Initialise the budget from a list of devices.
+
+        :param devices: the devices to check, usually the primary device
+            followed by any child devices.
+        :type devices: list(HDDevice)
+        """
+        self._devices = list(devices)
+        self._coefficients = [device.mw_coefficients
+                              for device in self._devices]
+        self._max_mw = [device.max_mw for device in self._devices]
+        self._matrices = {}
+
+    @property
+    def devices(self):
+        """Get the devices that are checked.
+
+        :returns: list of devices
+        :rtype: list(HDDevice)
+        """
+        return list(self._devices)
+
+    def get_mw(self, intensities):
+        """Get the mWatts that each device would use, for the intensities.
+
+        :param intensities: dictionary of colors and intensities (0-2000)
+        :type intensities: dict( color_1=intensity_1..color_n=intensity_n )
+        :returns: mWatts for each device, in the same order as *devices*
+        :rtype: list(float)
+        """
+        used = []
+
+        for coefficients in self._coefficients:
+            mw_value = 0
+
+            for color, intensity in intensities.items():
+                mw_norm, hd_mw_range = coefficients[color]
+
+                if intensity <= 1000:
+                    mw_value += mw_norm * (intensity/1000)
+                else:
+                    mw_value += mw_norm + ((intensity - 1000)/1000) \
+                        * hd_mw_range
+
+            used.append(mw_value)
+
+        return used
+
+    def get_headroom(self, intensities):
+        """Get the mWatts left on each device, for the intensities.
+
+        :param intensities: dictionary of colors and intensities (0-2000)
+        :type intensities: dict( color_1=intensity_1..color_n=intensity_n )
+        :returns: dictionary of device MAC address and remaining mWatts,
+            negative if the limit would be exceeded
+        :rtype: dict( mac_1=headroom_1..mac_n=headroom_n )
+        """
+        headroom = {}
+
+        for device, max_mw, mw_value in zip(
+                self._devices, self._max_mw, self.get_mw(intensities)):
+            headroom[device.mac_address] = max_mw - mw_value
+
+        return headroom
+
+    def find_exceeded(self, intensities):
+        """Find the first device whose power limit would be exceeded.
+
+        :param intensities: dictionary of colors and intensities (0-2000)
+        :type intensities: dict( color_1=intensity_1..color_n=intensity_n )
+        :returns: the device and the mWatts it would use, or *None* if all
+            devices are within their limits
+        :rtype: tuple( HDDevice, float ) or None
+        """
+        for device, max_mw, mw_value in zip(
+                self._devices, self._max_mw, self.get_mw(intensities)):
+
+            if mw_value > max_mw:
+                return device, mw_value
+
+        return None
+
+    def _get_max_scale(self, intensities, colors):
+        """Get the largest factor that *colors* can be scaled by (0-1).
+
+        The other colors stay at their current *intensities*. The mWatts
+        used by each device are piecewise linear in the factor, with a
+        breakpoint wherever a color crosses into HD, so each device is solved
+        exactly, one segment at a time. Returns *None* if the limits are
+        exceeded, even with *colors* turned off.
+        """
+        breakpoints = sorted(1000 / intensities[color] for color in colors
+                             if intensities[color] > 1000)
+        breakpoints.append(1)
+        max_scale = 1
+
+        for coefficients, max_mw in zip(self._coefficients, self._max_mw):
+            fixed = 0
+
+            for color, intensity in intensities.items():
+                if color in colors:
+                    continue
+
+                mw_norm, hd_mw_range = coefficients[color]
+
+                if intensity <= 1000:
+                    fixed += mw_norm * (intensity/1000)
+                else:
+                    fixed += mw_norm + ((intensity - 1000)/1000) * hd_mw_range
+
+            if fixed > max_mw:
+                return None
+
+            start_scale = 0
+            start_mw = fixed
+
+            for end_scale in breakpoints:
+                end_mw = fixed
+
+                for color in colors:
+                    mw_norm, hd_mw_range = coefficients[color]
+                    intensity = intensities[color] * end_scale
+
+                    if intensity <= 1000:
+                        end_mw += mw_norm * (intensity/1000)
+                    else:
+                        end_mw += mw_norm + ((intensity - 1000)/1000) \
+                            * hd_mw_range
+
+                if end_mw > max_mw:
+                    max_scale = min(max_scale, start_scale +
+                                    (end_scale - start_scale) *
+                                    (max_mw - start_mw) / (end_mw - start_mw))
+                    break
+
+                start_scale = end_scale
+                start_mw = end_mw
+
+        return max_scale
+
+    def scale_to_limits(self, intensities, scaling=None):
+        """Scale intensities down, until every device is within its limit.
+
+        Intensities that are already within the limits are returned as they
+        are. Otherwise, the colors are scaled down by the largest factor
+        that fits, lowest priority first, see ``PowerScaling``. Scaled
+        intensities are rounded down, so they never exceed a limit.
+
+        :param intensities: dictionary of colors and intensities (0-2000)
+        :type intensities: dict( color_1=intensity_1..color_n=intensity_n )
+        :param scaling: the color priorities, defaults to scaling every color
+            by the same factor
+        :type scaling: PowerScaling
+        :returns: dictionary of colors and intensities, within the limits
+        :rtype: dict( color_1=intensity_1..color_n=intensity_n )
+        """
+        if self.find_exceeded(intensities) is None:
+            return intensities
+
+        if scaling is None:
+            scaling = PowerScaling()
+
+        scaled = dict(intensities)
+
+        for colors in scaling.get_tiers(list(intensities)):
+            # Turn this tier off and reduce the next one, if that's not enough
+            max_scale = self._get_max_scale(scaled, set(colors))
+
+            if max_scale is None:
+                for color in colors:
+                    scaled[color] = 0
+
+                continue
+
+            # Allow for floating point error at the limit
+            max_scale = max(0, max_scale - 1e-9)
+
+            for color in colors:
+                scaled[color] = int(scaled[color] * max_scale)
+
+            break
+
+        return scaled
+
+    def _get_matrices(self, numpy, colors):
+        """Get the (devices x colors) coefficient matrices for the colors."""
+        key = tuple(colors)
+
+        if key not in self._matrices:
+            mw_norm = numpy.array(
+                [[coefficients[color][0] for color in colors]
+                 for coefficients in self._coefficients], dtype=float)
+            hd_mw_range = numpy.array(
+                [[coefficients[color][1] for color in colors]
+                 for coefficients in self._coefficients], dtype=float)
+
+            self._matrices[key] = (mw_norm / 1000, hd_mw_range / 1000)
+
+        return self._matrices[key]
+
+    def get_headroom_array(self, colors, intensities):
+        """Get the mWatts left on each device, for a batch of intensities.
+
+        This requires NumPy. Every row of *intensities* is a candidate, with
+        one column for each of *colors*.
+
+        :param colors: the color for each column of intensities
+        :type colors: list( color_1..color_n )
+        :param intensities: (candidates x colors) array of intensities
+        :type intensities: array_like
+        :returns: (candidates x devices) array of remaining mWatts, negative
+            where the limit would be exceeded
+        :rtype: numpy.ndarray
+        """
+        numpy = _import_numpy()
+        intensities = numpy.atleast_2d(
+            numpy.asarray(intensities, dtype=float))
+
+        if intensities.shape[1] != len(colors):
+            raise ValueError("A color must be specified for each column")
+
+        if (intensities < 0).any() or (intensities > 2000).any():
+            raise ValueError("intensity must be between 0 and 2000")
+
+        mw_norm, hd_mw_range = self._get_matrices(numpy, colors)
+
+        normal = numpy.minimum(intensities, 1000)
+        hd_in_use = intensities - normal
+
+        used = normal.dot(mw_norm.T) + hd_in_use.dot(hd_mw_range.T)
+
+        return numpy.array(self._max_mw, dtype=float) - used
+
+    def check_array(self, colors, intensities):
+        """Check a batch of intensities against every device power limit.
+
+        This requires NumPy.
+
+        :param colors: the color for each column of intensities
+        :type colors: list( color_1..color_n )
+        :param intensities: (candidates x colors) array of intensities
+        :type intensities: array_like
+        :returns: a boolean for each candidate, *True* if it is within the
+            limits of every device
+        :rtype: numpy.ndarray
+        """
+        return (self.get_headroom_array(colors, intensities) >= 0).all(axis=1)
@@ -0,0 +1,159 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for planning timed brightness ramps/fades."""
+
+DEFAULT_RAMP_RATE = 10
+
+
+class RampPlan:
+    """A class for precomputing every step of a brightness ramp.
+
+    The percentages are linearly interpolated between *start* and *end*,
+    with one step every 1/*rate* seconds, and converted to intensities up
+    front. Step 0 is the *start* brightness and the last step is the *end*
+    brightness. A ramp that is too short for a single step only has the *end*
+    brightness, so it's applied immediately.
+    """
+
+    def __init__(self, device, start, end, duration,
+                 rate=DEFAULT_RAMP_RATE):
+        """Initialise the plan, converting every step to intensities.
+
+        :param device: the device used to convert percentages
+        :type device: HDDevice
+        :param start: dictionary of colors and starting percentages
+        :type start: dict( color_1=percentage_1..color_n=percentage_n )
+        :param end: dictionary of colors and final percentages
+        :type end: dict( color_1=percentage_1..color_n=percentage_n )
+        :param duration: seconds the ramp should take
+        :type duration: float
+        :param rate: steps per second
+        :type rate: float
+
+        :raises ValueError: if the duration or rate are invalid, *start* and
+            *end* don't have the same colors, or any step has an invalid
+            percentage.
+        """
+        if duration < 0:
+            raise ValueError("Duration must not be negative")
+
+        if rate <= 0:
+            raise ValueError("Rate must be greater than 0")
+
+        if set(start) != set(end):
+            raise ValueError("Start and end must have the same colors")
+
+        self._rate = rate
+        step_count = int(round(duration * rate))
+        self._steps = []
+
+        if step_count == 0:
+            self._steps.append({
+                color: device.convert_to_intensity(color, value)
+                for color, value in end.items()})
+            return
+
+        for step in range(step_count + 1):
+            intensities = {}
+
+            for color, end_value in end.items():
+                start_value = start[color]
+                value = start_value + \
+                    (end_value - start_value) * step / step_count
+
+                intensities[color] = device.convert_to_intensity(color, value)
+
+            self._steps.append(intensities)
+
+    @property
+    def steps(self):
+        """Get the intensities for every step.
+
+        :returns: list of dictionaries of colors and intensities
+        :rtype: list( dict( color_1=intensity_1..color_n=intensity_n ) )
+        """
+        return self._steps
+
+    @property
+    def last_index(self):
+        """Get the index of the final step.
+
+        :returns: final step index
+        :rtype: int
+        """
+        return len(self._steps) - 1
+
+    def find_exceeded(self, power_budget):
+        """Find the first step that would exceed a device power limit.
+
+        :param power_budget: the power limits to check against
+        :type power_budget: PowerBudget
+        :returns: the step index, device and the mWatts it would use, or
+            *None* if every step is within the limits
+        :rtype: tuple( int, HDDevice, float ) or None
+        """
+        for index, intensities in enumerate(self._steps):
+            exceeded = power_budget.find_exceeded(intensities)
+
+            if exceeded is not None:
+                return (index,) + exceeded
+
+        return None
+
+    def scale_to_limits(self, power_budget, scaling=None):
+        """Scale down every step that would exceed a device power limit.
+
+        :param power_budget: the power limits to scale to
+        :type power_budget: PowerBudget
+        :param scaling: the color priorities, defaults to scaling every color
+            by the same factor
+        :type scaling: PowerScaling
+        :returns: the number of steps that were scaled
+        :rtype: int
+        """
+        scaled_count = 0
+
+        for index, intensities in enumerate(self._steps):
+            scaled = power_budget.scale_to_limits(intensities, scaling)
+
+            if scaled is not intensities:
+                self._steps[index] = scaled
+                scaled_count += 1
+
+        return scaled_count
+
+    def get_next_step(self, index, elapsed):
+        """Get the step to send after *index* and how long to wait for it.
+
+        If sending has fallen behind schedule, the steps that are already due
+        are coalesced and only the latest of them is returned.
+
+        :param index: the index of the step that was last sent
+        :type index: int
+        :param elapsed: seconds since the ramp started
+        :type elapsed: float
+        :returns: the next step index and the seconds to wait before sending
+        :rtype: tuple( int, float )
+        """
+        next_index = index + 1
+        due = next_index / self._rate
+
+        if elapsed < due:
+            return next_index, due - elapsed
+
+        latest_due = int(elapsed * self._rate)
+
+        return min(self.last_index, max(next_index, latest_due)), 0
@@ -0,0 +1,242 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for working with light schedules.
+
+A schedule is a dictionary of points, keyed by the minute of the day that
+each point applies from (0-1439). Each point is a dictionary of colors and
+values, percentages when passed to or from **AquaIPy** and intensities
+(0-2000) when sent to the light.
+"""
+
+import bisect
+import datetime
+
+MINUTES_PER_DAY = 1440
+SECONDS_PER_DAY = 86400
+
+
+def _import_numpy():
+    """Import NumPy, which is only required for the array evaluation."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("NumPy is required for array schedule evaluation, "
+                          "install it with 'pip install aquaipy[numpy]'")
+
+    return numpy
+
+
+def get_minute_of_day(when):
+    """Get the minute of the day, including any fraction of a minute.
+
+    :param when: a time, or datetime, in the local time of the light, or the
+        number of minutes since midnight
+    :type when: datetime.time or datetime.datetime or float
+    :returns: minutes since midnight (0 to <1440)
+    :rtype: float
+    """
+    if isinstance(when, (datetime.datetime, datetime.time)):
+        return when.hour * 60 + when.minute + when.second / 60 + \
+            when.microsecond / 60000000
+
+    return when % MINUTES_PER_DAY
+
+
+def get_minutes_from_timestamps(timestamps, utc_offset=0):
+    """Convert an array of POSIX timestamps to minutes of the day.
+
+    Requires NumPy.
+
+    :param timestamps: seconds since the epoch, in UTC
+    :type timestamps: array_like
+    :param utc_offset: seconds to add to get the local time of the light
+    :type utc_offset: float
+    :returns: minutes since midnight, local time
+    :rtype: numpy.ndarray
+    """
+    numpy = _import_numpy()
+    timestamps = numpy.asarray(timestamps, dtype=float)
+
+    return ((timestamps + utc_offset) % SECONDS_PER_DAY) / 60
+
+
+def parse_schedule_points(points):
+    """Convert the points sent by the light to a schedule.
+
+    :param points: list of points, each with a *time* and *colors*
+    :type points: list(dict)
+    :returns: schedule
+    :rtype: dict( minute_1=colors_1..minute_n=colors_n )
+    """
+    return {point['time']: dict(point['colors']) for point in points}
+
+
+def format_schedule_points(schedule):
+    """Convert a schedule to the points sent to the light, in time order.
+
+    :param schedule: the schedule
+    :type schedule: dict( minute_1=colors_1..minute_n=colors_n )
+    :returns: list of points, each with a *time* and *colors*
+    :rtype: list(dict)
+    """
+    return [{'time': minute, 'colors': schedule[minute]}
+            for minute in sorted(schedule)]
+
+
+class ScheduleEvaluator:
+    """A class that predicts what a schedule is doing, at any time of day.
+
+    Intensities are linearly interpolated between the schedule points, so
+    they are floats rather than the whole numbers sent by the light. The
+    schedule repeats daily, so the last point fades into the first point of
+    the next day. The percentages and mWatts are converted from the
+    interpolated intensities by the ``HDDevice``.
+    """
+
+    def __init__(self, device, schedule):
+        """Initialise the evaluator.
+
+        :param device: the device used to convert intensities
+        :type device: HDDevice
+        :param schedule: dictionary of minute of the day and color
+            intensities (0-2000)
+        :type schedule: dict( minute_1=colors_1..minute_n=colors_n )
+
+        :raises ValueError: if the schedule has no points
+        """
+        if len(schedule) < 1:
+            raise ValueError("The schedule must have at least one point")
+
+        self._device = device
+        self._times = sorted(schedule)
+        self._points = [schedule[minute] for minute in self._times]
+        self._colors = list(self._points[0])
+
+    @property
+    def colors(self):
+        """Get the colors in the schedule, in the order used for arrays.
+
+        :returns: list of colors
+        :rtype: list( color_1..color_n )
+        """
+        return list(self._colors)
+
+    def _get_position(self, minute):
+        """Get the points either side of a minute, and how far between."""
+        index = bisect.bisect_right(self._times, minute)
+        previous = index - 1
+        following = index % len(self._times)
+
+        span = (self._times[following] - self._times[previous]) \
+            % MINUTES_PER_DAY or MINUTES_PER_DAY
+        fraction = ((minute - self._times[previous]) % MINUTES_PER_DAY) / span
+
+        return self._points[previous], self._points[following], fraction
+
+    def get_intensities(self, when):
+        """Get the intensity of every color, at a time of day.
+
+        :param when: a time, or datetime, in the local time of the light, or
+            the number of minutes since midnight
+        :type when: datetime.time or datetime.datetime or float
+        :returns: dictionary of colors and intensities
+        :rtype: dict( color_1=intensity_1..color_n=intensity_n )
+        """
+        previous, following, fraction = self._get_position(
+            get_minute_of_day(when))
+
+        return {color: previous[color] +
+                (following[color] - previous[color]) * fraction
+                for color in self._colors}
+
+    def get_percentages(self, when):
+        """Get the percentage of every color, at a time of day.
+
+        :param when: a time, or datetime, in the local time of the light, or
+            the number of minutes since midnight
+        :type when: datetime.time or datetime.datetime or float
+        :returns: dictionary of colors and percentages
+        :rtype: dict( color_1=percentage_1..color_n=percentage_n )
+        """
+        return {color: self._device.convert_to_percentage(color, value)
+                for color, value in self.get_intensities(when).items()}
+
+    def get_mw(self, when):
+        """Get the mWatts used by every color, at a time of day.
+
+        :param when: a time, or datetime, in the local time of the light, or
+            the number of minutes since midnight
+        :type when: datetime.time or datetime.datetime or float
+        :returns: dictionary of colors and mWatts
+        :rtype: dict( color_1=mw_1..color_n=mw_n )
+        """
+        return {color: self._device.convert_to_mw(color, value)
+                for color, value in self.get_intensities(when).items()}
+
+    def get_intensity_array(self, minutes):
+        """Get the intensity of every color, for an array of times.
+
+        This is the vectorised equivalent of *get_intensities()* and requires
+        NumPy. Use *get_minutes_from_timestamps()* to convert timestamps.
+
+        :param minutes: minutes since midnight, in the local time of the light
+        :type minutes: array_like
+        :returns: intensities, with a row for each color in *colors* and a
+            column for each time
+        :rtype: numpy.ndarray
+        """
+        numpy = _import_numpy()
+        minutes = numpy.asarray(minutes, dtype=float) % MINUTES_PER_DAY
+        times = numpy.array(self._times, dtype=float)
+        values = numpy.array([[point[color] for point in self._points]
+                              for color in self._colors], dtype=float)
+
+        index = numpy.searchsorted(times, minutes, side='right')
+        previous = index - 1
+        following = index % len(times)
+
+        span = (times[following] - times[previous]) % MINUTES_PER_DAY
+        span[span == 0] = MINUTES_PER_DAY
+        fraction = ((minutes - times[previous]) % MINUTES_PER_DAY) / span
+
+        return values[:, previous] + \
+            (values[:, following] - values[:, previous]) * fraction
+
+    def get_percentage_array(self, minutes):
+        """Get the percentage of every color, for an array of times.
+
+        Requires NumPy, see *get_intensity_array()*.
+
+        :param minutes: minutes since midnight, in the local time of the light
+        :type minutes: array_like
+        :returns: percentages, with a row for each color in *colors*
+        :rtype: numpy.ndarray
+        """
+        return self._device.convert_to_percentage_array(
+            self._colors, self.get_intensity_array(minutes))
+
+    def get_mw_array(self, minutes):
+        """Get the mWatts used by every color, for an array of times.
+
+        Requires NumPy, see *get_intensity_array()*.
+
+        :param minutes: minutes since midnight, in the local time of the light
+        :type minutes: array_like
+        :returns: mWatts, with a row for each color in *colors*
+        :rtype: numpy.ndarray
+        """
+        return self._device.convert_to_mw_array(
+            self._colors, self.get_intensity_array(minutes))
@@ -0,0 +1,413 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for simulating AquaIllumination lights, for development/testing.
+
+Each ``SimulatedLight`` runs a small HTTP server that implements the parts of
+the AI API used by **AquaIPy**, keeping the colors and schedule state between
+requests. Any number of them can run in a single process. It can also be run
+as a standalone server::
+
+    python -m aquaipy.simulator --count 10 --profile hydra26hd --latency 0.01
+"""
+
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import random
+import socket
+
+from aiohttp import web
+
+from aquaipy.aquaipy import MAX_INTENSITY, HDDevice
+from aquaipy.power import PowerBudget
+from aquaipy.schedule import format_schedule_points
+
+DEFAULT_FIRMWARE_VERSION = "2.2.0"
+
+PROFILES = {
+    "hydra52hd": {
+        "product": "Hydra FiftyTwo",
+        "serial_prefix": "D8976003",
+        "max_power": 120000,
+        "hd": {
+            "royal": 61380,
+            "cool_white": 59395,
+            "deep_red": 12791,
+            "violet": 15927,
+            "uv": 15785,
+            "blue": 42583,
+            "green": 16139
+        },
+        "normal": {
+            "royal": 30451,
+            "cool_white": 30485,
+            "deep_red": 4055,
+            "violet": 10093,
+            "uv": 10093,
+            "blue": 30773,
+            "green": 4050
+        }
+    },
+    "hydra26hd": {
+        "product": "Hydra TwentySix",
+        "serial_prefix": "D8976003",
+        "max_power": 90000,
+        "hd": {
+            "blue": 23137,
+            "cool_white": 32272,
+            "violet": 8654,
+            "green": 8769,
+            "deep_red": 6950,
+            "royal": 33350,
+            "uv": 8577
+        },
+        "normal": {
+            "blue": 19975,
+            "cool_white": 23592,
+            "violet": 7317,
+            "green": 4190,
+            "deep_red": 3768,
+            "royal": 23888,
+            "uv": 7270
+        }
+    },
+    "primehd": {
+        "product": "Prime HD",
+        "serial_prefix": "D8976004",
+        "max_power": 48000,
+        "hd": {
+            "royal": 16400,
+            "cool_white": 15400,
+            "green": 4100,
+            "violet": 4000,
+            "uv": 4630,
+            "blue": 9670,
+            "deep_red": 3380
+        },
+        "normal": {
+            "royal": 13440,
+            "cool_white": 12756,
+            "green": 3132,
+            "violet": 3458,
+            "uv": 3876,
+            "blue": 8712,
+            "deep_red": 2626
+        }
+    }
+}
+
+_SERIAL_NUMBERS = itertools.count(1)
+
+
+def _next_serial_number(profile):
+    """Get a unique serial number for a simulated device."""
+    return "{}{:04X}".format(
+        PROFILES[profile]["serial_prefix"], next(_SERIAL_NUMBERS) % 0x10000)
+
+
+class SimulatedLight:
+    """A class that simulates an AI light, and any lights paired with it.
+
+    Faults can be injected into every request. Each request is delayed by
+    *latency* seconds, plus or minus up to *jitter* seconds. A proportion of
+    requests, set by *error_rate*, return a non-zero ``response_code`` and a
+    proportion, set by *drop_rate*, have their connection closed without any
+    response.
+
+    Colors are only updated if every color is specified, with an intensity
+    between 0 and 2000, and none of the devices would exceed their max power.
+    The schedule, served in the same unverified format that **AquaIPy**
+    reads, can only be changed by setting *schedule* directly.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-arguments
+
+    def __init__(self, profile="hydra26hd", children=None,
+                 firmware=DEFAULT_FIRMWARE_VERSION, latency=0, jitter=0,
+                 error_rate=0, drop_rate=0, seed=None, host="127.0.0.1",
+                 port=0, parent=""):
+        """Initialise the simulated light.
+
+        :param profile: the model of the light, one of *PROFILES*
+        :type profile: str
+        :param children: the models of any lights paired with this one
+        :type children: list(str)
+        :param firmware: the firmware version to report
+        :type firmware: str
+        :param latency: seconds to delay each request by
+        :type latency: float
+        :param jitter: max random seconds to add/remove from the latency
+        :type jitter: float
+        :param error_rate: proportion of requests that return an error
+        :type error_rate: float
+        :param drop_rate: proportion of requests that drop the connection
+        :type drop_rate: float
+        :param seed: seed for the random faults, for repeatable runs
+        :type seed: int
+        :param host: the address to listen on
+        :type host: str
+        :param port: the port to listen on, 0 for any free port
+        :type port: int
+        :param parent: the parent to report, for simulating a light that is
+            paired as a child
+        :type parent: str
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+
+        self._random = random.Random(seed)
+        self._address = host
+        self._runner = None
+        self._port = port
+
+        self._devices = [self._create_device(profile)]
+        for child in children or []:
+            self._devices.append(self._create_device(child))
+
+        self._serial_number = self._devices[0]["serial_number"]
+        self._identity = {
+            "serial_number": self._serial_number,
+            "parent": parent,
+            "firmware": firmware,
+            "product": PROFILES[profile]["product"],
+            "product_type": "Standard",
+            "response_code": 0
+        }
+
+        hd_devices = [HDDevice(device, self._serial_number)
+                      for device in self._devices]
+        self._power_budget = PowerBudget(hd_devices)
+
+        self.colors = dict.fromkeys(self._devices[0]["normal"], 0)
+        self.schedule_enabled = True
+        self.schedule = {}
+        self.request_counts = {}
+
+    @staticmethod
+    def _create_device(profile):
+        """Create the /power details for a device of the given profile."""
+        details = PROFILES[profile]
+
+        return {
+            "serial_number": _next_serial_number(profile),
+            "type": details["product"],
+            "max_power": details["max_power"],
+            "hd": copy.deepcopy(details["hd"]),
+            "normal": copy.deepcopy(details["normal"])
+        }
+
+    async def __aenter__(self):
+        """Start the server, when used as an async context manager."""
+        await self.async_start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Stop the server."""
+        await self.async_close()
+
+    @property
+    def host(self):
+        """Get the host to pass to **AquaIPy.async_connect()**.
+
+        :returns: address and port of the server
+        :rtype: str
+        """
+        return "{}:{}".format(self._address, self._port)
+
+    @property
+    def serial_number(self):
+        """Get the serial number of the simulated parent light.
+
+        :returns: serial number
+        :rtype: str
+        """
+        return self._serial_number
+
+    async def async_start(self):
+        """Start the server."""
+        app = web.Application(middlewares=[self._fault_middleware])
+        app.router.add_route('GET', '/api/identity', self._handle_identity)
+        app.router.add_route('GET', '/api/power', self._handle_power)
+        app.router.add_route('GET', '/api/colors', self._handle_get_colors)
+        app.router.add_route('POST', '/api/colors', self._handle_set_colors)
+        app.router.add_route(
+            'GET', '/api/schedule/enable', self._handle_get_schedule)
+        app.router.add_route(
+            'PUT', '/api/schedule/enable', self._handle_set_schedule)
+        app.router.add_route(
+            'GET', '/api/schedule', self._handle_get_schedule_points)
+
+        sock = socket.socket()
+        sock.bind((self._address, self._port))
+        self._port = sock.getsockname()[1]
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.SockSite(self._runner, sock).start()
+
+    async def async_close(self):
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    ##################
+    # Internal Methods
+    ##################
+    @web.middleware
+    async def _fault_middleware(self, request, handler):
+        """Count each request and inject any configured faults."""
+        self.request_counts[request.path] = \
+            self.request_counts.get(request.path, 0) + 1
+
+        delay = self.latency
+
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            request.transport.close()
+            return web.Response()
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.json_response({"response_code": 1})
+
+        return await handler(request)
+
+    async def _handle_identity(self, request):
+        """Handle GET /api/identity."""
+        return web.json_response(self._identity)
+
+    async def _handle_power(self, request):
+        """Handle GET /api/power."""
+        return web.json_response(
+            {"devices": self._devices, "response_code": 0})
+
+    async def _handle_get_colors(self, request):
+        """Handle GET /api/colors."""
+        data = dict(self.colors)
+        data["response_code"] = 0
+
+        return web.json_response(data)
+
+    async def _handle_set_colors(self, request):
+        """Handle POST /api/colors."""
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({"response_code": 1})
+
+        if not self._is_valid_intensities(body):
+            return web.json_response({"response_code": 1})
+
+        self.colors = body
+
+        return web.json_response({"response_code": 0})
+
+    def _is_valid_intensities(self, intensities):
+        """Check if the intensities can be set on the light."""
+        if not isinstance(intensities, dict) or \
+                set(intensities) != set(self.colors):
+            return False
+
+        for value in intensities.values():
+            if not isinstance(value, int) or \
+                    value < 0 or value > MAX_INTENSITY:
+                return False
+
+        return self._power_budget.find_exceeded(intensities) is None
+
+    async def _handle_get_schedule_points(self, request):
+        """Handle GET /api/schedule."""
+        return web.json_response(
+            {"points": format_schedule_points(self.schedule),
+             "response_code": 0})
+
+    async def _handle_get_schedule(self, request):
+        """Handle GET /api/schedule/enable."""
+        return web.json_response(
+            {"enable": self.schedule_enabled, "response_code": 0})
+
+    async def _handle_set_schedule(self, request):
+        """Handle PUT /api/schedule/enable."""
+        try:
+            body = json.loads(await request.text())
+            enable = body["enable"]
+        except (ValueError, TypeError, KeyError):
+            return web.json_response({"response_code": 1})
+
+        if not isinstance(enable, bool):
+            return web.json_response({"response_code": 1})
+
+        self.schedule_enabled = enable
+
+        return web.json_response({"response_code": 0})
+
+
+async def async_run(args):
+    """Start the simulated lights and serve them until cancelled."""
+    lights = [SimulatedLight(args.profile, children=args.child,
+                             firmware=args.firmware, latency=args.latency,
+                             jitter=args.jitter, error_rate=args.error_rate,
+                             drop_rate=args.drop_rate, seed=args.seed,
+                             host=args.host)
+              for _ in range(args.count)]
+
+    await asyncio.gather(*[light.async_start() for light in lights])
+
+    for light in lights:
+        print(light.host, light.serial_number)
+
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await asyncio.gather(*[light.async_close() for light in lights])
+
+
+def main(argv=None):
+    """Run simulated lights from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--profile", choices=sorted(PROFILES),
+                        default="hydra26hd")
+    parser.add_argument("--child", choices=sorted(PROFILES), action="append",
+                        help="add a paired light, can be repeated")
+    parser.add_argument("--firmware", default=DEFAULT_FIRMWARE_VERSION)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.get_event_loop().run_until_complete(async_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark request latency, with and without connection reuse.
+
+Runs against the ``MockAIDevice`` used by the async tests, with a task that
+answers every request immediately. Run with:
+
+    python -m aquaipy.test.benchmark_connection [requests]
+"""
+
+import asyncio
+import sys
+import time
+
+from aquaipy.aquaipy import AquaIPy, ConnectionConfig
+from aquaipy.test.TestData import TestData
+from aquaipy.test.benchmark_utils import percentile
+from aquaipy.test.test_async_AquaIPy import MockAIDevice, TestHelper
+
+DEFAULT_REQUESTS = 500
+
+RESPONSES = {
+    '/api/identity': TestData.identity_hydra26hd(),
+    '/api/power': TestData.power_hydra26hd(),
+    '/api/colors': TestData.colors_3(),
+}
+
+
+async def async_respond_forever(mock_device):
+    """Answer every request received by the mock device."""
+    while True:
+        request = await mock_device.receive_request()
+        mock_device.send_response(request, data=RESPONSES[request.path_qs])
+
+
+async def async_measure(reuse_connections, requests):
+    """Measure the latency of reading the colors, in milliseconds."""
+    async with MockAIDevice() as mock_device:
+        responder = asyncio.ensure_future(async_respond_forever(mock_device))
+
+        api = AquaIPy(connection_config=ConnectionConfig(
+            reuse_connections=reuse_connections))
+        await api.async_connect(TestHelper.get_hostname(mock_device))
+
+        latencies = []
+
+        for _ in range(requests):
+            start = time.perf_counter()
+            await api.async_get_colors_brightness()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        await api._session.close()
+        responder.cancel()
+
+    return sorted(latencies)
+
+
+async def async_main(requests):
+    """Run the benchmark and print the results."""
+    print("{:<20}{:>10}{:>10}{:>10}".format("connections", "mean ms", "p50 ms",
+                                         "p95 ms"))
+
+    for reuse_connections in (True, False):
+        latencies = await async_measure(reuse_connections, requests)
+        label = "reused" if reuse_connections else "new per request"
+
+        print("{:<20}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+            label,
+            sum(latencies) / len(latencies),
+            percentile(latencies, 0.5),
+            percentile(latencies, 0.95)))
+
+
+if __name__ == '__main__':
+    REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS
+    asyncio.get_event_loop().run_until_complete(async_main(REQUESTS))
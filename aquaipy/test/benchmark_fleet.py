@@ -0,0 +1,333 @@
+"""Load test a single process driving a large fleet of simulated lights.
+
+Starts the requested number of ``SimulatedLight`` servers in this process,
+connects an **AquaIPy** instance to each of them over a shared session, then
+runs a mix of get/set/patch/schedule calls against random lights from a
+number of concurrent workers. Reports ops/sec, latency percentiles and event
+loop lag. The simulators share the event loop with the clients, so the results
+are a lower bound on what a process that only runs the clients can handle.
+
+Afterwards every light is connected again, from a new session, with
+``tracemalloc`` tracing enough frames to leave out the allocations made by the
+simulators. This is reported as the client memory per connected light, and is
+kept separate as tracing that many frames slows everything down. Run with:
+
+    python -m aquaipy.test.benchmark_fleet --lights 1000 --concurrency 200 \\
+        --ops 20000 --mix get=70,set=20,patch=10
+
+Use ``--codec`` to compare the JSON libraries, e.g. on a read-only loop with
+``--mix get=80,schedule=20 --codec json`` and ``--codec orjson``.
+
+Every light uses at least one file descriptor for its server and one for
+each client connection, so ``ulimit -n`` may need raising for large fleets.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+import aiohttp
+
+from aquaipy.aquaipy import AquaIPy, ConnectionConfig
+from aquaipy.codec import CODEC_NAMES
+from aquaipy.simulator import PROFILES, SimulatedLight
+from aquaipy.test.benchmark_utils import percentile
+
+DEFAULT_LIGHTS = 100
+DEFAULT_CONCURRENCY = 50
+DEFAULT_OPS = 5000
+DEFAULT_MIX = "get=70,set=20,patch=10"
+LAG_INTERVAL = 0.01
+
+# Frames kept for each allocation, enough to see if the simulator or aiohttp
+# server code is anywhere on the stack
+TRACE_FRAMES = 64
+
+# The simulators run in the same process, so their allocations are excluded
+SERVER_FILTERS = [
+    tracemalloc.Filter(False, "*/aquaipy/simulator.py", all_frames=True),
+    tracemalloc.Filter(False, "*/aiohttp/web*.py", all_frames=True),
+]
+
+OPERATIONS = ("get", "set", "patch", "schedule")
+
+
+def parse_mix(mix):
+    """Parse a request mix like ``get=70,set=30`` into a dict of weights."""
+    weights = {}
+
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                "Unknown operation '{}', expected one of: {}".format(
+                    name, ", ".join(OPERATIONS)))
+
+        weights[name] = float(weight)
+
+    if sum(weights.values()) <= 0:
+        raise argparse.ArgumentTypeError("Mix weights must add up to > 0")
+
+    return weights
+
+
+async def async_call(api, operation, rand):
+    """Run a single operation against a connected light."""
+    if operation == "get":
+        return await api.async_get_colors_brightness()
+
+    if operation == "set":
+        return await api.async_set_colors_brightness(
+            {color: rand.uniform(0, 100) for color in api.colors})
+
+    if operation == "patch":
+        return await api.async_patch_colors_brightness(
+            {rand.choice(api.colors): rand.uniform(0, 100)})
+
+    return await api.async_get_schedule_state()
+
+
+class LagMonitor:
+    """A class that measures how late the event loop runs scheduled work."""
+
+    def __init__(self, loop):
+        """Initialise the monitor."""
+        self._loop = loop
+        self._task = None
+        self.lags = []
+
+    async def _async_run(self):
+        """Sleep repeatedly, recording how late each wake up is."""
+        while True:
+            expected = self._loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lags.append(max(0, self._loop.time() - expected))
+
+    def start(self):
+        """Start measuring."""
+        self._task = asyncio.ensure_future(self._async_run())
+
+    async def async_stop(self):
+        """Stop measuring."""
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def async_connect_all(apis, hosts, concurrency, latencies, errors):
+    """Connect every **AquaIPy** instance, recording the latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect(api, host):
+        async with semaphore:
+            start = time.perf_counter()
+
+            try:
+                await api.async_connect(host)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors[type(exc).__name__] = \
+                    errors.get(type(exc).__name__, 0) + 1
+                return
+
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[connect(api, host)
+                           for api, host in zip(apis, hosts)])
+
+
+async def async_run_workers(apis, args, latencies, errors):
+    """Run the request mix against random lights until *ops* are done."""
+    names = sorted(args.mix)
+    weights = [args.mix[name] for name in names]
+    remaining = [args.ops]
+
+    async def worker(seed):
+        rand = random.Random(seed)
+
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            api = rand.choice(apis)
+            operation = weighted_choice(rand, names, weights)
+
+            start = time.perf_counter()
+
+            try:
+                await async_call(api, operation, rand)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors[type(exc).__name__] = \
+                    errors.get(type(exc).__name__, 0) + 1
+                continue
+
+            latencies[operation].append(time.perf_counter() - start)
+
+    await asyncio.gather(*[worker(args.seed + index)
+                           for index in range(args.concurrency)])
+
+
+def weighted_choice(rand, names, weights):
+    """Pick a name by weight, ``random.choices`` needs Python 3.6."""
+    value = rand.uniform(0, sum(weights))
+
+    for name, weight in zip(names, weights):
+        value -= weight
+
+        if value <= 0:
+            return name
+
+    return names[-1]
+
+
+def print_latencies(label, latencies):
+    """Print the count and latency percentiles, in milliseconds."""
+    if not latencies:
+        print("{:<12}{:>8}".format(label, 0))
+        return
+
+    latencies = sorted(latencies)
+
+    print("{:<12}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+        label, len(latencies),
+        percentile(latencies, 0.5) * 1000,
+        percentile(latencies, 0.95) * 1000,
+        percentile(latencies, 0.99) * 1000,
+        latencies[-1] * 1000))
+
+
+def create_session(config):
+    """Create a session without a limit on the total connections."""
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+        limit=0, limit_per_host=config.limit_per_host,
+        keepalive_timeout=config.keepalive_timeout))
+
+
+async def async_measure_client_memory(hosts, config, concurrency):
+    """Connect a new **AquaIPy** instance to every host, tracing memory.
+
+    :returns: bytes allocated by the clients, per connected light
+    :rtype: float
+    """
+    tracemalloc.start(TRACE_FRAMES)
+    snapshot_before = tracemalloc.take_snapshot().filter_traces(SERVER_FILTERS)
+
+    session = create_session(config)
+    apis = [AquaIPy(session=session, connection_config=config)
+            for _ in hosts]
+    await async_connect_all(apis, hosts, concurrency, [], {})
+
+    snapshot_after = tracemalloc.take_snapshot().filter_traces(SERVER_FILTERS)
+    tracemalloc.stop()
+
+    connected = [api for api in apis if api.mac_addr is not None]
+    await session.close()
+
+    client_memory = sum(
+        stat.size_diff
+        for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+
+    return client_memory / max(1, len(connected))
+
+
+async def async_main(args):
+    """Run the load test and print the report."""
+    loop = asyncio.get_event_loop()
+    profiles = sorted(PROFILES)
+
+    lights = [SimulatedLight(profiles[index % len(profiles)],
+                             latency=args.latency, jitter=args.jitter,
+                             seed=args.seed + index)
+              for index in range(args.lights)]
+
+    await asyncio.gather(*[light.async_start() for light in lights])
+
+    config = ConnectionConfig(json_codec=args.codec)
+    session = create_session(config)
+    apis = [AquaIPy(session=session, connection_config=config)
+            for _ in lights]
+
+    errors = {}
+    connect_latencies = []
+    latencies = {name: [] for name in args.mix}
+
+    monitor = LagMonitor(loop)
+    monitor.start()
+
+    start = time.perf_counter()
+    await async_connect_all(apis, [light.host for light in lights],
+                            args.concurrency, connect_latencies, errors)
+    connect_time = time.perf_counter() - start
+
+    connected = [api for api in apis if api.mac_addr is not None]
+
+    start = time.perf_counter()
+    if connected:
+        await async_run_workers(connected, args, latencies, errors)
+    run_time = time.perf_counter() - start
+
+    await monitor.async_stop()
+
+    await session.close()
+
+    memory_per_light = await async_measure_client_memory(
+        [light.host for light in lights], config, args.concurrency)
+
+    await asyncio.gather(*[light.async_close() for light in lights])
+
+    completed = sum(len(values) for values in latencies.values())
+    lags = sorted(monitor.lags) or [0]
+
+    print("lights: {} connected: {} concurrency: {} codec: {}".format(
+        len(lights), len(connected), args.concurrency,
+        config.json_codec.name))
+    print("connect: {:.2f}s, {:.1f} lights/sec".format(
+        connect_time, len(connected) / connect_time))
+    print("ops: {} in {:.2f}s, {:.1f} ops/sec".format(
+        completed, run_time, completed / run_time))
+    print("client memory per connected light: {:.1f} KiB".format(
+        memory_per_light / 1024))
+    print("event loop lag ms: p50 {:.2f} p99 {:.2f} max {:.2f}".format(
+        percentile(lags, 0.5) * 1000, percentile(lags, 0.99) * 1000,
+        lags[-1] * 1000))
+    print()
+    print("{:<12}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+        "operation", "count", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    print_latencies("connect", connect_latencies)
+
+    for name in sorted(latencies):
+        print_latencies(name, latencies[name])
+
+    if errors:
+        print()
+        print("errors: {}".format(", ".join(
+            "{}={}".format(name, count)
+            for name, count in sorted(errors.items()))))
+
+
+def main(argv=None):
+    """Parse the arguments and run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lights", type=int, default=DEFAULT_LIGHTS)
+    parser.add_argument("--concurrency", type=int,
+                        default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weights of: {}".format(", ".join(OPERATIONS)))
+    parser.add_argument("--latency", type=float, default=0,
+                        help="simulated light latency, in seconds")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--codec", choices=CODEC_NAMES,
+                        help="JSON library, defaults to the fastest installed")
+    args = parser.parse_args(argv)
+
+    asyncio.get_event_loop().run_until_complete(async_main(args))
+
+
+if __name__ == '__main__':
+    main()
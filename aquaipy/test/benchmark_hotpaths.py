@@ -0,0 +1,223 @@
+"""Benchmark the per-call cost of the conversion and request-building paths.
+
+Every benchmark runs offline, against the device profiles in ``TestData``.
+The best of several repeats is reported, in microseconds per call, as it's the
+least affected by other load on the machine. Run with:
+
+    python -m aquaipy.test.benchmark_hotpaths [--number N] [--check]
+
+With ``--check``, the exit code is 1 if any benchmark is slower than its
+threshold in ``THRESHOLDS``. Each threshold is ``THRESHOLD_FACTOR`` times the
+baseline recorded for that profile in ``BASELINES``, so a regression is caught
+without failing on ordinary noise. The baselines depend on the machine, so
+re-record them when checking on very different hardware.
+"""
+
+import argparse
+import asyncio
+import sys
+import timeit
+
+from aquaipy.aquaipy import AquaIPy, HDDevice
+from aquaipy.codec import get_codec
+from aquaipy.power import PowerBudget
+from aquaipy.test.TestData import TestData
+
+DEFAULT_NUMBER = 2000
+DEFAULT_REPEAT = 5
+
+PROFILES = {
+    'hydra52hd': (TestData.power_hydra52hd,
+                  TestData.primary_mac_hydra52hd,
+                  TestData.set_colors_max_hd_hydra52hd),
+    'hydra26hd': (TestData.power_hydra26hd,
+                  TestData.primary_mac_hydra26hd,
+                  TestData.set_colors_max_hd_hydra26hd),
+    'primehd': (TestData.power_primehd,
+                TestData.primary_mac_primehd,
+                TestData.set_colors_max_hd_primehd),
+}
+
+# Microseconds per call recorded for each profile, on CPython 3.11 on a
+# Linux x86_64 VM. Each call converts or checks all 7 colors at once. Re-record
+# these when the code being measured deliberately changes.
+BASELINES = {
+    'hydra26hd': {
+        'convert_to_intensity': 5.6,
+        'convert_to_percentage': 3.0,
+        'convert_to_mw': 3.3,
+        'power_limit_check': 3.2,
+        'power_limit_scale': 33.0,
+        'json_encode': 0.6,
+        'json_decode': 1.2,
+        'sync_wrapper': 17.5,
+    },
+    'hydra52hd': {
+        'convert_to_intensity': 4.2,
+        'convert_to_percentage': 2.4,
+        'convert_to_mw': 2.9,
+        'power_limit_check': 3.1,
+        'power_limit_scale': 33.0,
+        'json_encode': 0.6,
+        'json_decode': 1.2,
+        'sync_wrapper': 16.5,
+    },
+    'primehd': {
+        'convert_to_intensity': 4.1,
+        'convert_to_percentage': 2.7,
+        'convert_to_mw': 3.0,
+        'power_limit_check': 2.8,
+        'power_limit_scale': 33.0,
+        'json_encode': 0.6,
+        'json_decode': 1.1,
+        'sync_wrapper': 18.0,
+    },
+}
+
+# A benchmark has regressed if it's this many times slower than its baseline
+THRESHOLD_FACTOR = 3
+
+# Max microseconds per call, for each profile
+THRESHOLDS = {
+    profile: {name: baseline * THRESHOLD_FACTOR
+              for name, baseline in baselines.items()}
+    for profile, baselines in BASELINES.items()
+}
+
+
+def create_device(profile):
+    """Create the primary device and its test percentages, for a profile."""
+    power, mac, percentages = PROFILES[profile]
+    device = HDDevice(power()['devices'][0], mac())
+
+    return device, percentages()
+
+
+async def async_create_api(loop, device):
+    """Create an **AquaIPy** instance that is already set up for *device*."""
+    api = AquaIPy(loop=loop)
+    api._primary_device = device
+    api._colors = list(device.colors)
+    api._power_budget = PowerBudget([device])
+
+    return api
+
+
+def get_benchmarks(profile, loop):
+    """Get a dict of benchmark name and zero-arg callable, for a profile."""
+    device, percentages = create_device(profile)
+
+    intensities = {color: device.convert_to_intensity(color, value)
+                   for color, value in percentages.items()}
+    budget = PowerBudget([device])
+    exceeded = {color: 2000 for color in intensities}
+    api = loop.run_until_complete(async_create_api(loop, device))
+
+    def convert_to_intensity():
+        for color, value in percentages.items():
+            device.convert_to_intensity(color, value)
+
+    def convert_to_percentage():
+        for color, value in intensities.items():
+            device.convert_to_percentage(color, value)
+
+    def convert_to_mw():
+        for color, value in intensities.items():
+            device.convert_to_mw(color, value)
+
+    def power_limit_check():
+        budget.find_exceeded(intensities)
+
+    def power_limit_scale():
+        # Every color at max HD, which exceeds the limit of every profile
+        budget.scale_to_limits(exceeded)
+
+    codec = get_codec()
+    response = codec.dumps(dict(intensities, response_code=0))
+
+    def json_encode():
+        codec.dumps(intensities)
+
+    def json_decode():
+        codec.loads(response)
+
+    def sync_wrapper():
+        # Missing colors are rejected before any request is sent, so this
+        # measures the run_until_complete overhead plus validation
+        api.set_colors_brightness({})
+
+    return api, {
+        'convert_to_intensity': convert_to_intensity,
+        'convert_to_percentage': convert_to_percentage,
+        'convert_to_mw': convert_to_mw,
+        'power_limit_check': power_limit_check,
+        'power_limit_scale': power_limit_scale,
+        'json_encode': json_encode,
+        'json_decode': json_decode,
+        'sync_wrapper': sync_wrapper,
+    }
+
+
+def measure(func, number, repeat):
+    """Get the best time for one call of *func*, in microseconds."""
+    times = timeit.Timer(func).repeat(repeat=repeat, number=number)
+
+    return min(times) / number * 1000000
+
+
+def run(number=DEFAULT_NUMBER, repeat=DEFAULT_REPEAT):
+    """Run every benchmark, for every profile.
+
+    :returns: list of (profile, benchmark name, microseconds per call)
+    :rtype: list( tuple(str, str, float) )
+    """
+    results = []
+    loop = asyncio.new_event_loop()
+
+    try:
+        for profile in sorted(PROFILES):
+            api, benchmarks = get_benchmarks(profile, loop)
+
+            for name in sorted(benchmarks):
+                results.append(
+                    (profile, name, measure(benchmarks[name], number, repeat)))
+
+            loop.run_until_complete(api.async_close())
+    finally:
+        loop.close()
+
+    return results
+
+
+def main(argv=None):
+    """Run the benchmarks, print the results and optionally check them."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=DEFAULT_NUMBER,
+                        help='calls per repeat')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--check', action='store_true',
+                        help='exit with 1 if any threshold is exceeded')
+    args = parser.parse_args(argv)
+
+    failed = []
+
+    print("{:<12}{:<24}{:>12}{:>12}".format("profile", "benchmark",
+                                            "us/call", "max us"))
+
+    for profile, name, micros in run(args.number, args.repeat):
+        threshold = THRESHOLDS[profile][name]
+        print("{:<12}{:<24}{:>12.3f}{:>12.1f}{}".format(
+            profile, name, micros, threshold,
+            "  REGRESSED" if micros > threshold else ""))
+
+        if micros > threshold:
+            failed.append((profile, name))
+
+    if args.check and failed:
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
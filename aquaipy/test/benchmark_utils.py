@@ -0,0 +1,6 @@
+"""Helpers shared by the benchmarks, without any test dependencies."""
+
+
+def percentile(values, fraction):
+    """Get the value at the given fraction, of an already sorted list."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
@@ -18,6 +18,7 @@ def test_HDDevice_init(power_response, primary_mac, max_mw):
 
     assert device.is_primary
     assert device.max_mw == max_mw
+    assert set(device.colors) == TestData.get_colors()
 
 
 @pytest.mark.parametrize("power_response, primary_mac, percentage, result_intensities", [
@@ -110,3 +111,160 @@ def test_HDDevice_convert_to_mw_ValueError(intensity):
         device.convert_to_mw("uv", intensity)
 
 
+
+
+@pytest.mark.parametrize("power_response, primary_mac", [
+    (TestData.power_hydra52hd(), TestData.primary_mac_hydra52hd()),
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd()),
+    (TestData.power_primehd(), TestData.primary_mac_primehd())
+    ])
+def test_HDDevice_lookup_tables_match_calculation(power_response, primary_mac):
+
+    device = HDDevice(power_response["devices"][0], primary_mac)
+    table_device = HDDevice(power_response["devices"][0], primary_mac, lookup_tables=True)
+
+    for color in TestData.get_colors():
+        for intensity in range(0, 2001):
+
+            assert device.convert_to_mw(color, intensity) == table_device.convert_to_mw(color, intensity)
+            assert device.convert_to_percentage(color, intensity) == table_device.convert_to_percentage(color, intensity)
+
+        # Non-integer intensities aren't in the table, so are calculated
+        assert device.convert_to_mw(color, 1500.5) == table_device.convert_to_mw(color, 1500.5)
+        assert device.convert_to_percentage(color, 1500.5) == table_device.convert_to_percentage(color, 1500.5)
+
+
+@pytest.mark.parametrize("intensity", [-10, 2001, 2010])
+def test_HDDevice_lookup_tables_ValueError(intensity):
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd(), lookup_tables=True)
+
+    with pytest.raises(ValueError):
+        device.convert_to_mw("uv", intensity)
+
+    with pytest.raises(ValueError):
+        device.convert_to_percentage("uv", intensity)
+
+
+@pytest.mark.parametrize("power_response, primary_mac", [
+    (TestData.power_hydra52hd(), TestData.primary_mac_hydra52hd()),
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd()),
+    (TestData.power_primehd(), TestData.primary_mac_primehd())
+    ])
+def test_HDDevice_convert_arrays_match_scalar(power_response, primary_mac):
+
+    numpy = pytest.importorskip("numpy")
+
+    device = HDDevice(power_response["devices"][0], primary_mac)
+    colors = sorted(TestData.get_colors())
+
+    intensities = numpy.tile(numpy.arange(0, 2001), (len(colors), 1))
+    mw = device.convert_to_mw_array(colors, intensities)
+    percentages = device.convert_to_percentage_array(colors, intensities)
+
+    for row, color in enumerate(colors):
+        for intensity in range(0, 2001, 7):
+
+            assert mw[row, intensity] == device.convert_to_mw(color, intensity)
+            assert percentages[row, intensity] == device.convert_to_percentage(color, intensity)
+
+    max_percentages = [device._max_percentage[color] for color in colors]
+    steps = numpy.linspace(0, 1, 501)
+    requested = numpy.outer(max_percentages, steps)
+    result = device.convert_to_intensity_array(colors, requested)
+
+    for row, color in enumerate(colors):
+        for step in range(len(steps)):
+
+            assert result[row, step] == device.convert_to_intensity(color, requested[row, step])
+
+
+def test_HDDevice_convert_array_1d():
+
+    numpy = pytest.importorskip("numpy")
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+
+    result = device.convert_to_mw_array(["uv", "blue"], [0, 1000])
+
+    assert result.shape == (2,)
+    assert result[0] == 0
+    assert result[1] == device.convert_to_mw("blue", 1000)
+
+
+@pytest.mark.parametrize("intensity", [-10, 2010])
+def test_HDDevice_convert_arrays_intensity_ValueError(intensity):
+
+    pytest.importorskip("numpy")
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+
+    with pytest.raises(ValueError):
+        device.convert_to_mw_array(["uv", "blue"], [[0, 0], [0, intensity]])
+
+    with pytest.raises(ValueError):
+        device.convert_to_percentage_array(["uv", "blue"], [[0, 0], [0, intensity]])
+
+
+@pytest.mark.parametrize("percentage", [-10, 300])
+def test_HDDevice_convert_to_intensity_array_ValueError(percentage):
+
+    pytest.importorskip("numpy")
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+
+    with pytest.raises(ValueError):
+        device.convert_to_intensity_array(["uv", "blue"], [[0, 0], [0, percentage]])
+
+
+def test_HDDevice_convert_array_colors_mismatch():
+
+    pytest.importorskip("numpy")
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+
+    with pytest.raises(ValueError):
+        device.convert_to_intensity_array(["uv"], [[0, 0], [0, 0]])
+
+    with pytest.raises(ValueError):
+        device.convert_to_mw_array(["uv"], [[0, 0], [0, 0]])
+
+
+@patch.dict("sys.modules", {"numpy": None})
+def test_HDDevice_convert_array_no_numpy():
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+
+    with pytest.raises(ImportError):
+        device.convert_to_mw_array(["uv"], [0])
+
+
+def test_HDDevice_mw_coefficients():
+
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+    coefficients = device.mw_coefficients
+
+    assert set(coefficients) == TestData.get_colors()
+    assert coefficients["uv"] == (7270, 8577 - 7270)
+
+
+@pytest.mark.parametrize("lookup_tables", [False, True])
+def test_HDDevice_zero_mw_channel(lookup_tables):
+
+    raw_data = TestData.power_hydra26hd()["devices"][0]
+    raw_data["normal"]["uv"] = 0
+    raw_data["hd"]["uv"] = 0
+
+    device = HDDevice(raw_data, TestData.primary_mac_hydra26hd(), lookup_tables)
+
+    assert device.convert_to_intensity("uv", 50) == 500
+    assert device.convert_to_percentage("uv", 500) == 50
+    assert device.convert_to_percentage("uv", 1500) == 100
+    assert device.convert_to_mw("uv", 1500) == 0
+
+    with pytest.raises(ValueError):
+        device.convert_to_intensity("uv", 101)
+
+    # The other channels are unaffected
+    assert device.convert_to_intensity("blue", 105) == \
+        HDDevice(TestData.power_hydra26hd()["devices"][0]).convert_to_intensity("blue", 105)
@@ -1,12 +1,14 @@
 import pytest
 from unittest.mock import Mock, patch
 import asyncio
+import socket
 import aiohttp
 import asynctest
 from async_generator import yield_, async_generator
 
-from aquaipy.aquaipy import HDDevice, AquaIPy, Response
-from aquaipy.error import ConnError, FirmwareError, MustBeParentError
+from aquaipy.aquaipy import HDDevice, AquaIPy, ConnectionConfig, Response
+from aquaipy.error import ConnError, FirmwareError, MustBeParentError, RequestTimeoutError
+from aquaipy.power import PowerScaling
 from aquaipy.test.TestData import TestData
 
 
@@ -21,6 +23,12 @@ class TestHelper:
 
         return "{0}:{1}".format(mock_hostname, mock_device.port)
 
+    @staticmethod
+    def get_free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
     @staticmethod
     async def async_process_request(mock_device, call_method, expected_request, response_data, request_data = None, expected_method = "GET"):
         task = asyncio.ensure_future(call_method)
@@ -160,6 +168,121 @@ async def test_AquaIPy_init_with_name():
 
     await api._session.close()
 
+@pytest.mark.asyncio
+async def test_AquaIPy_init_default_connection_config():
+
+    api = AquaIPy()
+    connector = api._session.connector
+
+    assert connector.limit_per_host == ConnectionConfig().limit_per_host
+    assert not connector.force_close
+    assert connector.use_dns_cache
+
+    await api._session.close()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_init_connection_config_no_reuse():
+
+    config = ConnectionConfig(limit_per_host=1, dns_cache_ttl=None, reuse_connections=False)
+    api = AquaIPy(connection_config=config)
+    connector = api._session.connector
+
+    assert connector.limit_per_host == 1
+    assert connector.force_close
+    assert not connector.use_dns_cache
+
+    await api._session.close()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_connection_reused(device):
+
+    api = await TestHelper.async_get_connected_instance(device)
+
+    transports = set()
+
+    for _ in range(3):
+        task = asyncio.ensure_future(api.async_get_schedule_state())
+        request = await device.receive_request()
+        transports.add(id(request.transport))
+        device.send_response(request, data=TestData.schedule_enabled())
+        await task
+
+    assert len(transports) == 1
+
+    await api._session.close()
+
+def test_ConnectionConfig_retry_delay():
+
+    config = ConnectionConfig(retry_backoff=0.1, retry_backoff_max=0.3)
+
+    for _ in range(20):
+        assert 0.05 <= config.get_retry_delay(0) <= 0.1
+        assert 0.1 <= config.get_retry_delay(1) <= 0.2
+        assert 0.15 <= config.get_retry_delay(5) <= 0.3
+
+@pytest.mark.asyncio
+async def test_AquaIPy_get_request_timeout(device, api):
+
+    api._connection_config = ConnectionConfig(request_timeout=0.05, retries=0)
+
+    with pytest.raises(RequestTimeoutError):
+        await api.async_get_schedule_state()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_get_request_retried(device, api):
+
+    api._connection_config = ConnectionConfig(request_timeout=0.05, retries=1, retry_backoff=0.01)
+
+    task = asyncio.ensure_future(api.async_get_schedule_state())
+
+    # Ignore the first request, so it times out
+    await device.receive_request()
+
+    request = await device.receive_request()
+    assert request.path_qs == '/api/schedule/enable'
+    device.send_response(request, data=TestData.schedule_enabled())
+
+    assert await task == True
+
+@pytest.mark.asyncio
+async def test_AquaIPy_post_request_not_retried(device, api):
+
+    api._connection_config = ConnectionConfig(request_timeout=0.05, retries=3, retry_backoff=0.01)
+
+    data = TestData.colors_1()
+    del data['response_code']
+
+    with pytest.raises(RequestTimeoutError):
+        await api._async_set_brightness(data)
+
+    assert device._requests.qsize() == 1
+
+@pytest.mark.asyncio
+async def test_AquaIPy_request_deadline(device, api):
+
+    api._connection_config = ConnectionConfig(
+            request_timeout=None, retries=10, retry_backoff=0.01, request_deadline=0.2)
+
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+
+    with pytest.raises(RequestTimeoutError):
+        await api.async_get_schedule_state()
+
+    assert loop.time() - start < 0.5
+
+@pytest.mark.asyncio
+async def test_AquaIPy_connect_timeout(device):
+
+    api = AquaIPy(connection_config=ConnectionConfig(request_timeout=0.05, retries=0))
+
+    with pytest.raises(RequestTimeoutError):
+        await api.async_connect(TestHelper.get_hostname(device))
+
+    assert api.base_path is None
+
+    await api._session.close()
+
 @pytest.mark.asyncio
 async def test_AquaIPy_init_success(device, api):
 
@@ -227,6 +350,93 @@ async def test_AquaIPy_firmware_error(device):
 
     await api._session.close()
 
+async def async_receive_fast_connect_requests(device):
+    requests = {}
+
+    for _ in range(2):
+        request = await device.receive_request()
+        requests[request.path_qs] = request
+
+    return requests
+
+@pytest.mark.asyncio
+async def test_AquaIPy_fast_connect(device):
+
+    api = AquaIPy()
+    task = asyncio.ensure_future(
+            api.async_connect(TestHelper.get_hostname(device), fast=True))
+
+    # Both requests are sent before either response is received
+    requests = await async_receive_fast_connect_requests(device)
+    assert sorted(requests) == ['/api/identity', '/api/power']
+
+    device.send_response(requests['/api/power'], data=TestData.power_hydra26hd())
+    device.send_response(requests['/api/identity'], data=TestData.identity_hydra26hd())
+    await task
+
+    assert api.mac_addr == TestData.primary_mac_hydra26hd()
+    assert api._primary_device is not None
+    assert api._base_path is not None
+
+    await api._session.close()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("identity_response, error", [
+    (TestData.identity_hydra26hd_unsupported_firmware(), FirmwareError),
+    (TestData.identity_not_parent(), MustBeParentError),
+    (TestData.server_error(), ConnError)])
+async def test_AquaIPy_fast_connect_identity_errors(device, identity_response, error):
+
+    api = AquaIPy()
+    task = asyncio.ensure_future(
+            api.async_connect(TestHelper.get_hostname(device), fast=True))
+
+    requests = await async_receive_fast_connect_requests(device)
+    device.send_response(requests['/api/identity'], data=identity_response)
+
+    with pytest.raises(error):
+        await task
+
+    assert api._base_path is None
+    assert api._primary_device is None
+
+    await api._session.close()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_fast_connect_identity_error_after_power(device):
+
+    api = AquaIPy()
+    task = asyncio.ensure_future(
+            api.async_connect(TestHelper.get_hostname(device), fast=True))
+
+    requests = await async_receive_fast_connect_requests(device)
+    device.send_response(requests['/api/power'], data=TestData.server_error())
+    await asyncio.sleep(0.01)
+    device.send_response(requests['/api/identity'], data=TestData.identity_not_parent())
+
+    with pytest.raises(MustBeParentError):
+        await task
+
+    await api._session.close()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_fast_connect_power_error(device):
+
+    api = AquaIPy()
+    task = asyncio.ensure_future(
+            api.async_connect(TestHelper.get_hostname(device), fast=True))
+
+    requests = await async_receive_fast_connect_requests(device)
+    device.send_response(requests['/api/identity'], data=TestData.identity_hydra26hd())
+    device.send_response(requests['/api/power'], data=TestData.server_error())
+
+    with pytest.raises(ConnError):
+        await task
+
+    assert api._base_path is None
+
+    await api._session.close()
+
 @pytest.mark.asyncio
 async def test_AquaIPy_get_schedule_state_enabled(device, api):
 
@@ -559,6 +769,129 @@ async def test_AquaIPy_patch_color_error_response(api):
 
         assert result == Response.Error
 
+@pytest.mark.asyncio
+async def test_AquaIPy_state_not_tracked_by_default(device, api):
+
+    await TestHelper.async_process_request(
+            device,
+            api._async_get_brightness(),
+            '/api/colors',
+            TestData.colors_1())
+
+    assert api._get_tracked_brightness() is None
+
+@pytest.mark.asyncio
+async def test_AquaIPy_patch_color_brightness_tracked_state(device, api):
+
+    api._state_ttl = 60
+
+    await TestHelper.async_process_request(
+            device,
+            api._async_get_brightness(),
+            '/api/colors',
+            TestData.colors_1())
+
+    # Only a single POST should be sent, with no GET beforehand
+    response = await TestHelper.async_process_request(
+            device,
+            api.async_patch_colors_brightness(TestData.set_colors_3()),
+            '/api/colors',
+            TestData.server_success(),
+            TestData.set_result_colors_3_hydra26hd(),
+            "POST")
+
+    assert response == Response.Success
+    assert api._state == TestData.set_result_colors_3_hydra26hd()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_update_color_brightness_tracked_state(device, api):
+
+    api._state_ttl = 60
+    data = TestData.colors_1()
+    del data['response_code']
+
+    await TestHelper.async_process_request(
+            device,
+            api._async_set_brightness(data),
+            '/api/colors',
+            TestData.server_success(),
+            data,
+            "POST")
+
+    result = dict(data)
+    result['blue'] = 200
+
+    response = await TestHelper.async_process_request(
+            device,
+            api.async_update_color_brightness('blue', 20),
+            '/api/colors',
+            TestData.server_success(),
+            result,
+            "POST")
+
+    assert response == Response.Success
+
+@pytest.mark.asyncio
+async def test_AquaIPy_patch_color_brightness_stale_state(api):
+
+    api._state_ttl = 60
+    api._track_state({'blue': 1000})
+    api._state_time -= 61
+
+    with asynctest.patch.object(api, 'async_get_colors_brightness') as mock_get:
+        with asynctest.patch.object(api, 'async_set_colors_brightness') as mock_set:
+
+            data = TestData.colors_1()
+            del data['response_code']
+            mock_get.return_value = data
+            mock_set.return_value = Response.Success
+
+            response = await api.async_patch_colors_brightness(TestData.set_colors_2())
+
+            assert response == Response.Success
+            mock_get.assert_called_once_with()
+            assert api._state is None
+
+@pytest.mark.asyncio
+async def test_AquaIPy_set_brightness_error_clears_state(device, api):
+
+    api._state_ttl = 60
+    api._track_state({'blue': 1000})
+
+    data = TestData.colors_1()
+    del data['response_code']
+
+    response = await TestHelper.async_process_request(
+            device,
+            api._async_set_brightness(data),
+            '/api/colors',
+            TestData.server_error(),
+            data,
+            "POST")
+
+    assert response == Response.Error
+    assert api._get_tracked_brightness() is None
+
+@pytest.mark.asyncio
+async def test_AquaIPy_set_brightness_tracks_target_while_sent(device, api):
+
+    api._state_ttl = 60
+    data = TestData.colors_1()
+    del data['response_code']
+
+    task = asyncio.ensure_future(api._async_set_brightness(data))
+    request = await device.receive_request()
+
+    # Patches made now build on the target being sent
+    assert api._state == data
+
+    # A later write replaces the target, so this failure doesn't clear it
+    api._track_state(TestData.result_intensities_100p())
+    device.send_response(request, data=TestData.server_error())
+
+    assert await task == Response.Error
+    assert api._state == TestData.result_intensities_100p()
+
 @pytest.mark.asyncio
 async def test_AquaIPy_update_color_brightness(api):
 
@@ -651,6 +984,80 @@ async def test_AquaIPy_set_color_brightness_error(api):
             response = await api.async_set_colors_brightness({})
             assert response == Response.AllColorsMustBeSpecified
 
+@pytest.mark.asyncio
+async def test_AquaIPy_colors_cached_on_connect(api):
+
+    assert set(api.colors) == TestData.get_colors()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_colors_cached_on_get_brightness(device, api):
+
+    data = TestData.colors_1()
+    del data['blue']
+
+    await TestHelper.async_process_request(
+            device,
+            api._async_get_brightness(),
+            '/api/colors',
+            data)
+
+    assert set(api.colors) == TestData.get_colors() - {'blue'}
+
+@pytest.mark.asyncio
+async def test_AquaIPy_refresh_colors(device, api):
+
+    api._colors = None
+
+    response = await TestHelper.async_process_request(
+            device,
+            api.async_refresh_colors(),
+            '/api/colors',
+            TestData.colors_1())
+
+    assert set(response) == TestData.get_colors()
+    assert set(api.colors) == TestData.get_colors()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_set_color_brightness_single_request(device, api):
+
+    response = await TestHelper.async_process_request(
+            device,
+            api.async_set_colors_brightness(TestData.set_colors_3()),
+            '/api/colors',
+            TestData.server_success(),
+            TestData.set_result_colors_3_hydra26hd(),
+            "POST")
+
+    assert response == Response.Success
+
+@pytest.mark.asyncio
+async def test_AquaIPy_set_color_brightness_missing_color(api):
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        colors = TestData.set_colors_3()
+        del colors['uv']
+
+        response = await api.async_set_colors_brightness(colors)
+
+        mock_set.assert_not_called()
+        assert response == Response.AllColorsMustBeSpecified
+
+@pytest.mark.asyncio
+async def test_AquaIPy_set_color_brightness_no_cached_colors(api):
+
+    api._colors = None
+
+    with asynctest.patch.object(api, 'async_get_colors') as mock_get_colors:
+        with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+            mock_get_colors.return_value = None
+
+            response = await api.async_set_colors_brightness(TestData.set_colors_3())
+
+            mock_set.assert_not_called()
+            assert response == Response.Error
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("identity_response, power_response, result", [
     (TestData.identity_hydra26hd(), TestData.power_hydra26hd(), TestData.set_result_colors_3_hydra26hd()),
@@ -721,6 +1128,189 @@ async def test_AquaIPy_set_color_brightness_hd_exceeded(device, identity_respons
     await api._session.close()
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("identity_response, power_response, set_colors", [
+    (TestData.identity_hydra26hd(), TestData.power_hydra26hd(), TestData.set_colors_hd_exceeded_hydra26hd()),
+    (TestData.identity_primehd(), TestData.power_mixed_hd_devices(), TestData.set_colors_hd_exceeded_mixed())
+    ])
+async def test_AquaIPy_set_color_brightness_hd_exceeded_scaled(device, identity_response, power_response, set_colors):
+
+    api = await TestHelper.async_get_connected_instance(device, identity_response, power_response)
+    api._power_scaling = PowerScaling()
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        mock_set.return_value = Response.Success
+
+        result = await api.async_set_colors_brightness(set_colors)
+
+        assert result == Response.Success
+        intensities, = mock_set.call_args[0]
+        assert api._power_budget.find_exceeded(intensities) is None
+
+    await api._session.close()
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness(api):
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        mock_set.return_value = Response.Success
+
+        response = await api.async_ramp_colors_brightness(
+                TestData.set_colors_2(), 0.05, rate=100, start=TestData.set_colors_1())
+
+        assert response == Response.Success
+        assert mock_set.call_count == 6
+        assert mock_set.call_args_list[0][0][0] == TestData.result_intensities_0p()
+        mock_set.assert_called_with(TestData.result_intensities_100p())
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_from_current(api):
+
+    with asynctest.patch.object(api, 'async_get_colors_brightness') as mock_get:
+        with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+            mock_get.return_value = TestData.set_colors_1()
+            mock_set.return_value = Response.Success
+
+            response = await api.async_ramp_colors_brightness(TestData.set_colors_2(), 0.05, rate=100)
+
+            assert response == Response.Success
+            mock_get.assert_called_once_with()
+            assert mock_set.call_count == 5
+            mock_set.assert_called_with(TestData.result_intensities_100p())
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_zero_duration(api):
+
+    with asynctest.patch.object(api, 'async_get_colors_brightness') as mock_get:
+        with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+            with asynctest.patch('asyncio.sleep') as mock_sleep:
+
+                mock_get.return_value = TestData.set_colors_1()
+                mock_set.return_value = Response.Success
+
+                response = await api.async_ramp_colors_brightness(TestData.set_colors_2(), 0)
+
+                assert response == Response.Success
+                mock_set.assert_called_once_with(TestData.result_intensities_100p())
+                mock_sleep.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_coalesced(api):
+
+    calls = []
+
+    async def slow_set(intensities):
+        calls.append(intensities)
+        await asyncio.sleep(0.03)
+        return Response.Success
+
+    with asynctest.patch.object(api, '_async_set_brightness', new=slow_set):
+
+        response = await api.async_ramp_colors_brightness(
+                TestData.set_colors_2(), 0.1, rate=100, start=TestData.set_colors_1())
+
+    assert response == Response.Success
+    assert len(calls) < 11
+    assert calls[-1] == TestData.result_intensities_100p()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_cancelled(api):
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        mock_set.return_value = Response.Success
+
+        task = asyncio.ensure_future(api.async_ramp_colors_brightness(
+                TestData.set_colors_2(), 10, rate=10, start=TestData.set_colors_1()))
+        await asyncio.sleep(0.15)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert 1 <= mock_set.call_count < 5
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_error(api):
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        mock_set.return_value = Response.Error
+
+        response = await api.async_ramp_colors_brightness(
+                TestData.set_colors_2(), 1, start=TestData.set_colors_1())
+
+        assert response == Response.Error
+        mock_set.assert_called_once_with(TestData.result_intensities_0p())
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_power_exceeded(api):
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        response = await api.async_ramp_colors_brightness(
+                TestData.set_colors_hd_exceeded_hydra26hd(), 1, start=TestData.set_colors_1())
+
+        assert response == Response.PowerLimitExceeded
+        mock_set.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_power_exceeded_scaled(api):
+
+    api._power_scaling = PowerScaling()
+
+    with asynctest.patch.object(api, '_async_set_brightness') as mock_set:
+
+        mock_set.return_value = Response.Success
+
+        response = await api.async_ramp_colors_brightness(
+                TestData.set_colors_hd_exceeded_hydra26hd(), 0.2, start=TestData.set_colors_1())
+
+        assert response == Response.Success
+
+        for call in mock_set.call_args_list:
+            assert api._power_budget.find_exceeded(call[0][0]) is None
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_missing_color(api):
+
+    colors = TestData.set_colors_2()
+    del colors['uv']
+
+    response = await api.async_ramp_colors_brightness(colors, 1)
+    assert response == Response.AllColorsMustBeSpecified
+
+    response = await api.async_ramp_colors_brightness(TestData.set_colors_2(), 1, start=colors)
+    assert response == Response.AllColorsMustBeSpecified
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_get_error(api):
+
+    with asynctest.patch.object(api, 'async_get_colors_brightness') as mock_get:
+
+        mock_get.return_value = None
+
+        response = await api.async_ramp_colors_brightness(TestData.set_colors_2(), 1)
+        assert response == Response.Error
+
+@pytest.mark.asyncio
+async def test_AquaIPy_ramp_color_brightness_no_cached_colors(api):
+
+    api._colors = None
+
+    with asynctest.patch.object(api, 'async_get_colors') as mock_get_colors:
+
+        mock_get_colors.return_value = None
+
+        response = await api.async_ramp_colors_brightness(TestData.set_colors_2(), 1)
+        assert response == Response.Error
+
+
 """ These aren't async tests but they conflict with the fixtures used for the
     synchronous tests, so I'm adding them here instead.
 """
@@ -0,0 +1,239 @@
+import pytest
+import asyncio
+import os
+import aiohttp
+
+from aquaipy.aquaipy import AquaIPy, Response
+from aquaipy.cache import ProfileCache
+from aquaipy.error import ConnError
+from aquaipy.fleet import AquaIPyFleet
+from aquaipy.simulator import SimulatedLight
+from aquaipy.test.TestData import TestData
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ProfileCache(str(tmpdir.join("profiles")))
+
+
+def test_cache_set_and_get(cache):
+
+    identity = TestData.identity_hydra26hd()
+    power = TestData.power_hydra26hd()
+
+    assert cache.get("192.168.1.10") is None
+
+    cache.set("192.168.1.10", identity, power)
+
+    assert cache.get("192.168.1.10") == (identity, power)
+    assert cache.get("192.168.1.10", "D8976003AAAA") == (identity, power)
+    assert cache.get("192.168.1.10", "D8976004AAAA") is None
+    assert cache.get("192.168.1.11") is None
+    assert os.listdir(cache.directory) == ["192.168.1.10.json"]
+
+
+def test_cache_hosts_with_ports(cache):
+
+    cache.set("localhost:8080", TestData.identity_hydra26hd(),
+              TestData.power_hydra26hd())
+    cache.set("localhost:8081", TestData.identity_primehd(),
+              TestData.power_primehd())
+
+    assert cache.get("localhost:8080")[0] == TestData.identity_hydra26hd()
+    assert cache.get("localhost:8081")[0] == TestData.identity_primehd()
+
+
+def test_cache_invalidate(cache):
+
+    cache.set("192.168.1.10", TestData.identity_hydra26hd(),
+              TestData.power_hydra26hd())
+
+    cache.invalidate("192.168.1.10")
+    cache.invalidate("192.168.1.10")
+
+    assert cache.get("192.168.1.10") is None
+
+
+def test_cache_ignores_invalid_files(cache):
+
+    path = os.path.join(cache.directory, "192.168.1.10.json")
+
+    with open(path, "w") as cache_file:
+        cache_file.write("{not json")
+
+    assert cache.get("192.168.1.10") is None
+
+    with open(path, "w") as cache_file:
+        cache_file.write('{"version": 0}')
+
+    assert cache.get("192.168.1.10") is None
+
+
+def test_cache_write_failure(cache):
+
+    with pytest.raises(TypeError):
+        cache.set("192.168.1.10", {"unserializable": object()}, {})
+
+    assert os.listdir(cache.directory) == []
+
+
+@pytest.mark.asyncio
+async def test_cache_connect_stores_profile(cache):
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+
+        identity, power = cache.get(light.host)
+        assert identity["serial_number"] == light.serial_number
+        assert power["devices"][0]["serial_number"] == light.serial_number
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_cache_connect_from_cache(cache):
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+        await api.async_close()
+
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+
+        # Connected without waiting for any requests
+        assert api.mac_addr == light.serial_number
+        assert light.request_counts["/api/identity"] == 1
+        assert api.colors is not None
+
+        await api._revalidation
+
+        assert light.request_counts["/api/identity"] == 2
+        assert light.request_counts["/api/power"] == 2
+
+        colors = dict.fromkeys(api.colors, 10)
+        assert await api.async_set_colors_brightness(colors) == \
+            Response.Success
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_cache_serial_number_changed(cache):
+
+    async with SimulatedLight("primehd") as light:
+        cache.set(light.host, TestData.identity_hydra26hd(),
+                  TestData.power_hydra26hd())
+
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+
+        assert api.mac_addr == "D8976003AAAA"
+
+        await api._revalidation
+
+        assert api.mac_addr == light.serial_number
+        assert api.product_type == "Prime HD"
+        assert api._primary_device.mac_address == light.serial_number
+        assert cache.get(light.host, light.serial_number) is not None
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_cache_firmware_changed_to_unsupported(cache):
+
+    async with SimulatedLight(firmware="10.0.0") as light:
+        identity = TestData.identity_hydra26hd()
+        identity["serial_number"] = light.serial_number
+        power = TestData.power_hydra26hd()
+        power["devices"][0]["serial_number"] = light.serial_number
+        cache.set(light.host, identity, power)
+
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+        await api._revalidation
+
+        assert cache.get(light.host) is None
+        assert api.firmware_version == "10.0.0"
+
+        with pytest.raises(ConnError):
+            await api.async_get_schedule_state()
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_cache_revalidation_failure_keeps_profile(cache):
+
+    async with SimulatedLight(error_rate=1) as light:
+        cache.set(light.host, TestData.identity_hydra26hd(),
+                  TestData.power_hydra26hd())
+
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+        await api._revalidation
+
+        assert cache.get(light.host) is not None
+        assert api.mac_addr == "D8976003AAAA"
+
+        light.error_rate = 0
+        light.drop_rate = 1
+        await api.async_connect(light.host)
+        await api._revalidation
+
+        assert cache.get(light.host) is not None
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_cache_close_cancels_revalidation(cache):
+
+    async with SimulatedLight(latency=10) as light:
+        cache.set(light.host, TestData.identity_hydra26hd(),
+                  TestData.power_hydra26hd())
+
+        api = AquaIPy(profile_cache=cache)
+        await api.async_connect(light.host)
+        revalidation = api._revalidation
+
+        await api.async_close()
+
+        assert api._revalidation is None
+        with pytest.raises(asyncio.CancelledError):
+            await revalidation
+
+
+@pytest.mark.asyncio
+async def test_cache_close_shared_session_cancels_revalidation(cache):
+
+    async with SimulatedLight(latency=10) as light:
+        cache.set(light.host, TestData.identity_hydra26hd(),
+                  TestData.power_hydra26hd())
+
+        session = aiohttp.ClientSession()
+        api = AquaIPy(session=session, profile_cache=cache)
+        await api.async_connect(light.host)
+        revalidation = api._revalidation
+
+        api.close()
+
+        assert api._revalidation is None
+        with pytest.raises(asyncio.CancelledError):
+            await revalidation
+
+        assert not session.closed
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_fleet(cache):
+
+    async with SimulatedLight() as light:
+        fleet = AquaIPyFleet([light.host], profile_cache=cache)
+        results, _ = await fleet.async_connect()
+        await fleet.async_close()
+
+    assert cache.get(light.host, results[light.host]) is not None
@@ -0,0 +1,424 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+
+from aquaipy.aquaipy import AquaIPy, Response
+from aquaipy.coalesce import LatestWriteChannel, SingleFlight
+from aquaipy.simulator import SimulatedLight
+
+
+class Sender:
+
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+
+    async def send(self, value):
+        self.sent.append(value)
+        await self.release.wait()
+        return "sent"
+
+
+@pytest.mark.asyncio
+async def test_channel_latest_wins():
+
+    sender = Sender()
+    channel = LatestWriteChannel(sender.send, "coalesced")
+
+    tasks = [asyncio.ensure_future(channel.async_write({"blue": value}))
+             for value in range(5)]
+    await asyncio.sleep(0)
+
+    assert channel.busy
+    sender.release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert results == ["sent", "coalesced", "coalesced", "coalesced", "sent"]
+    assert sender.sent == [{"blue": 0}, {"blue": 4}]
+    assert not channel.busy
+
+
+@pytest.mark.asyncio
+async def test_channel_merges_partial_writes():
+
+    sender = Sender()
+    channel = LatestWriteChannel(sender.send, "coalesced")
+
+    first = asyncio.ensure_future(channel.async_write({"blue": 0, "red": 0}))
+    await asyncio.sleep(0)
+
+    # Each patch was based on the same, stale, state
+    second = asyncio.ensure_future(
+        channel.async_write({"blue": 50, "red": 0}, {"blue"}))
+    third = asyncio.ensure_future(
+        channel.async_write({"blue": 0, "red": 30}, {"red"}))
+    await asyncio.sleep(0)
+
+    sender.release.set()
+
+    assert await asyncio.gather(first, second, third) == \
+        ["sent", "coalesced", "sent"]
+    assert sender.sent[-1] == {"blue": 50, "red": 30}
+
+
+@pytest.mark.asyncio
+async def test_channel_patch_applies_to_last_sent():
+
+    sender = Sender()
+    channel = LatestWriteChannel(sender.send, "coalesced", "sent")
+
+    first = asyncio.ensure_future(
+        channel.async_write({"blue": 10, "red": 10, "green": 10}))
+    await asyncio.sleep(0)
+
+    # Based on the state from before the write that's being sent
+    second = asyncio.ensure_future(
+        channel.async_write({"blue": 50, "red": 0, "green": 0}, {"blue"}))
+    await asyncio.sleep(0)
+
+    sender.release.set()
+
+    assert await asyncio.gather(first, second) == ["sent", "sent"]
+    assert sender.sent[-1] == {"blue": 50, "red": 10, "green": 10}
+
+
+@pytest.mark.asyncio
+async def test_channel_patch_ignores_failed_send():
+
+    results = iter(["failed", "sent"])
+    sent = []
+
+    async def send(value):
+        sent.append(value)
+        await asyncio.sleep(0)
+        return next(results)
+
+    channel = LatestWriteChannel(send, "coalesced", "sent")
+
+    first = asyncio.ensure_future(channel.async_write({"blue": 10, "red": 10}))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(
+        channel.async_write({"blue": 0, "red": 30}, {"red"}))
+
+    assert await asyncio.gather(first, second) == ["failed", "sent"]
+    assert sent[-1] == {"blue": 0, "red": 30}
+
+
+@pytest.mark.asyncio
+async def test_channel_full_write_replaces_patch():
+
+    sender = Sender()
+    channel = LatestWriteChannel(sender.send, "coalesced")
+
+    first = asyncio.ensure_future(channel.async_write({"blue": 0, "red": 0}))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(
+        channel.async_write({"blue": 50, "red": 0}, {"blue"}))
+    third = asyncio.ensure_future(channel.async_write({"blue": 10, "red": 10}))
+    await asyncio.sleep(0)
+
+    sender.release.set()
+    await asyncio.gather(first, second, third)
+
+    assert sender.sent[-1] == {"blue": 10, "red": 10}
+
+
+@pytest.mark.asyncio
+async def test_channel_cancelled_write():
+
+    sender = Sender()
+    channel = LatestWriteChannel(sender.send, "coalesced")
+
+    first = asyncio.ensure_future(channel.async_write({"blue": 0}))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(channel.async_write({"blue": 1}))
+    await asyncio.sleep(0)
+
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+
+    sender.release.set()
+    assert await first == "sent"
+    assert sender.sent == [{"blue": 0}]
+    assert not channel.busy
+
+    assert await channel.async_write({"blue": 2}) == "sent"
+
+
+@pytest.mark.asyncio
+async def test_channel_send_error():
+
+    async def send(value):
+        raise ValueError(value)
+
+    channel = LatestWriteChannel(send, "coalesced")
+
+    with pytest.raises(ValueError):
+        await channel.async_write({"blue": 0})
+
+    assert not channel.busy
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_coalesce_writes():
+
+    async with SimulatedLight(latency=0.05) as light:
+        api = AquaIPy(coalesce_writes=True)
+        await api.async_connect(light.host)
+
+        colors = [dict.fromkeys(api.colors, value) for value in range(10, 60, 10)]
+        results = await asyncio.gather(
+            *[api.async_set_colors_brightness(value) for value in colors])
+
+        assert results == [Response.Success] + [Response.Coalesced] * 3 + \
+            [Response.Success]
+        assert light.request_counts["/api/colors"] == 2
+        assert await api.async_get_colors_brightness() == colors[-1]
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_coalesce_patches():
+
+    async with SimulatedLight(latency=0.05) as light:
+        api = AquaIPy(coalesce_writes=True)
+        await api.async_connect(light.host)
+
+        base = dict.fromkeys(api.colors, 0)
+        await api.async_set_colors_brightness(base)
+
+        # Both patches start from the state before the write that's in flight
+        with patch.object(api, '_get_tracked_brightness',
+                          side_effect=lambda: dict(base)):
+            results = await asyncio.gather(
+                api.async_set_colors_brightness(dict.fromkeys(api.colors, 10)),
+                api.async_patch_colors_brightness({"blue": 50}),
+                api.async_update_color_brightness("uv", 30))
+
+        assert results == [Response.Success, Response.Coalesced,
+                           Response.Success]
+        assert light.request_counts["/api/colors"] == 3
+
+        # Only the patched colors are applied, on top of the write in flight
+        expected = dict.fromkeys(api.colors, 10)
+        expected.update(blue=50, uv=30)
+        assert await api.async_get_colors_brightness() == expected
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_coalesce_write_stops_ramp():
+
+    async with SimulatedLight(latency=0.01) as light:
+        api = AquaIPy(coalesce_writes=True)
+        await api.async_connect(light.host)
+
+        ramp = asyncio.ensure_future(api.async_ramp_colors_brightness(
+            dict.fromkeys(api.colors, 100), 1, rate=20,
+            start=dict.fromkeys(api.colors, 0)))
+        await asyncio.sleep(0.1)
+
+        colors = dict.fromkeys(api.colors, 30)
+        assert await api.async_set_colors_brightness(colors) == \
+            Response.Success
+        assert await ramp == Response.Coalesced
+
+        assert await api.async_get_colors_brightness() == colors
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_calls():
+
+    calls = []
+    release = asyncio.Event()
+
+    async def read():
+        calls.append(1)
+        await release.wait()
+        return {"blue": len(calls)}
+
+    flight = SingleFlight()
+    tasks = [asyncio.ensure_future(flight.async_call("colors", read))
+             for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*tasks) == [{"blue": 1}] * 5
+    assert len(calls) == 1
+
+    # Without a ttl, the next call isn't cached
+    assert await flight.async_call("colors", read) == {"blue": 2}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cache():
+
+    calls = []
+
+    async def read():
+        calls.append(1)
+        return len(calls)
+
+    flight = SingleFlight(ttl=0.05)
+
+    assert await flight.async_call("colors", read) == 1
+    assert await flight.async_call("colors", read) == 1
+    assert await flight.async_call("schedule/enable", read) == 2
+
+    flight.invalidate("colors")
+    assert await flight.async_call("colors", read) == 3
+
+    await asyncio.sleep(0.06)
+    assert await flight.async_call("colors", read) == 4
+
+
+@pytest.mark.asyncio
+async def test_single_flight_invalidate_in_flight():
+
+    release = asyncio.Event()
+    calls = []
+
+    async def read():
+        calls.append(1)
+        count = len(calls)
+        await release.wait()
+        return count
+
+    flight = SingleFlight(ttl=10)
+
+    first = asyncio.ensure_future(flight.async_call("colors", read))
+    await asyncio.sleep(0)
+
+    # A write happened, so later reads don't join the stale read
+    flight.invalidate()
+    second = asyncio.ensure_future(flight.async_call("colors", read))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await first == 1
+    assert await second == 2
+
+    # Only the read started after the invalidation is cached
+    assert await flight.async_call("colors", read) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_errors_and_cancel():
+
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise ValueError()
+
+    flight = SingleFlight(ttl=10)
+
+    first = asyncio.ensure_future(flight.async_call("colors", fail))
+    second = asyncio.ensure_future(flight.async_call("colors", fail))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    with pytest.raises(ValueError):
+        await second
+
+    async def read():
+        return 1
+
+    assert await flight.async_call("colors", read) == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_keep():
+
+    results = iter([None, 1])
+
+    async def read():
+        return next(results)
+
+    flight = SingleFlight(ttl=10)
+    keep = lambda result: result is not None
+
+    assert await flight.async_call("colors", read, keep) is None
+    assert await flight.async_call("colors", read, keep) == 1
+    assert await flight.async_call("colors", read, keep) == 1
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_concurrent_reads():
+
+    async with SimulatedLight(latency=0.02) as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        light.request_counts.clear()
+
+        results = await asyncio.gather(
+            api.async_get_colors_brightness(),
+            api.async_get_colors_brightness(),
+            api.async_get_colors(),
+            api.async_get_schedule_state(),
+            api.async_get_schedule_state())
+
+        assert results[0] == results[1]
+        assert sorted(results[2]) == sorted(api.colors)
+        assert results[3] is results[4] is True
+        assert light.request_counts == {"/api/colors": 1,
+                                        "/api/schedule/enable": 1}
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_read_cache():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(read_cache_ttl=10)
+        await api.async_connect(light.host)
+        light.request_counts.clear()
+
+        before = await api.async_get_colors_brightness()
+        assert await api.async_get_colors_brightness() == before
+        assert light.request_counts["/api/colors"] == 1
+
+        # Writes invalidate the cache
+        colors = dict.fromkeys(api.colors, 20)
+        await api.async_set_colors_brightness(colors)
+        assert await api.async_get_colors_brightness() == colors
+        assert await api.async_get_colors_brightness() == colors
+        assert light.request_counts["/api/colors"] == 3
+
+        await api.async_set_schedule_state(False)
+        assert await api.async_get_schedule_state() is False
+        assert await api.async_get_schedule_state() is False
+        assert light.request_counts["/api/schedule/enable"] == 2
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_read_cache_skips_errors():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(read_cache_ttl=5)
+        await api.async_connect(light.host)
+
+        light.error_rate = 1
+        assert await api.async_get_colors_brightness() is None
+        assert await api.async_get_schedule_state() is None
+
+        # The light has recovered, so the failed reads aren't reused
+        light.error_rate = 0
+        assert await api.async_get_colors_brightness() == \
+            dict.fromkeys(api.colors, 0)
+        assert await api.async_get_schedule_state() is True
+
+        await api.async_close()
@@ -0,0 +1,106 @@
+import pytest
+
+from aiohttp import web
+
+from aquaipy.aquaipy import AquaIPy, ConnectionConfig, Response
+from aquaipy.codec import CODEC_NAMES, JsonCodec, get_codec
+from aquaipy.simulator import SimulatedLight
+from aquaipy.test.TestData import TestData
+from aquaipy.test.test_async_AquaIPy import TestHelper
+
+
+def get_available_codecs():
+
+    names = []
+
+    for name in CODEC_NAMES:
+        try:
+            get_codec(name)
+        except ImportError:
+            continue
+
+        names.append(name)
+
+    return names
+
+
+@pytest.mark.parametrize("name", get_available_codecs())
+def test_codec_round_trip(name):
+
+    codec = get_codec(name)
+    body = TestData.set_result_colors_3_hydra26hd()
+
+    data = codec.dumps(body)
+
+    assert isinstance(data, bytes)
+    assert codec.loads(data) == body
+    assert codec.loads('{"enable": true, "name": "é"}'.encode("utf-8")) == \
+        {"enable": True, "name": "é"}
+    assert codec.name == name
+    assert get_codec(name) is codec
+
+
+def test_codec_default():
+
+    assert get_codec().name == get_available_codecs()[0]
+    assert ConnectionConfig().json_codec is get_codec()
+    assert ConnectionConfig(json_codec="json").json_codec.name == "json"
+
+    codec = JsonCodec("custom", get_codec("json").dumps, get_codec("json").loads)
+    assert ConnectionConfig(json_codec=codec).json_codec is codec
+
+
+def test_codec_unknown():
+
+    with pytest.raises(ValueError):
+        get_codec("simplejson")
+
+
+def test_codec_not_installed():
+
+    for name in CODEC_NAMES:
+        if name not in get_available_codecs():
+            with pytest.raises(ImportError):
+                ConnectionConfig(json_codec=name)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", get_available_codecs())
+async def test_AquaIPy_codec(name):
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(connection_config=ConnectionConfig(json_codec=name))
+        await api.async_connect(light.host)
+
+        colors = dict.fromkeys(api.colors, 40)
+        assert await api.async_set_colors_brightness(colors) == Response.Success
+        assert await api.async_get_colors_brightness() == colors
+
+        assert await api.async_set_schedule_state(False) == Response.Success
+        assert await api.async_get_schedule_state() is False
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_AquaIPy_codec_ignores_content_type():
+
+    async def handler(request):
+        return web.Response(text='{"response_code": 0, "enable": true}',
+                            content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_route('GET', '/api/schedule/enable', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = TestHelper.get_free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    api = AquaIPy()
+    api._host = "127.0.0.1:{}".format(port)
+    api._base_path = "http://{}/api".format(api._host)
+
+    assert await api.async_get_schedule_state() is True
+
+    await api.async_close()
+    await runner.cleanup()
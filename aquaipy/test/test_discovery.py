@@ -0,0 +1,136 @@
+import pytest
+import time
+import aiohttp
+from aiohttp import web
+
+from aquaipy.discovery import DiscoveredLight, DiscoveryResult, \
+    async_discover, async_discover_hosts, get_network_hosts
+from aquaipy.simulator import SimulatedLight
+from aquaipy.test.TestData import TestData
+from aquaipy.test.test_async_AquaIPy import TestHelper
+
+
+def test_get_network_hosts():
+
+    assert get_network_hosts("192.168.1.0/30") == \
+        ["192.168.1.1", "192.168.1.2"]
+    assert get_network_hosts("192.168.1.5/30", port=8080) == \
+        ["192.168.1.5:8080", "192.168.1.6:8080"]
+    assert len(get_network_hosts("10.0.0.0/22")) == 1022
+
+
+def test_discovered_light():
+
+    parent = DiscoveredLight("10.0.0.1", TestData.identity_hydra26hd())
+    child = DiscoveredLight("10.0.0.2", TestData.identity_not_parent())
+
+    assert parent.is_parent
+    assert parent.parent_serial_number is None
+    assert parent.product == "Hydra TwentySix"
+    assert parent.firmware == "2.2.0"
+    assert "D8976003AAAA" in repr(parent)
+
+    assert not child.is_parent
+    assert child.parent_serial_number == "D8976003AAAA"
+
+
+def test_discovery_result_topology():
+
+    parent = DiscoveredLight("10.0.0.1", TestData.identity_hydra26hd())
+    other = DiscoveredLight("10.0.0.2", TestData.identity_primehd())
+    child = DiscoveredLight("10.0.0.3", TestData.identity_not_parent())
+    orphan_identity = TestData.identity_not_parent()
+    orphan_identity["parent"] = "hydra26-D8976003FFFF"
+    orphan = DiscoveredLight("10.0.0.4", orphan_identity)
+
+    result = DiscoveryResult([parent, other, child, orphan])
+
+    assert result.lights == [parent, other, child, orphan]
+    assert result.parents == [parent, other]
+    assert result.parent_hosts == ["10.0.0.1", "10.0.0.2"]
+    assert parent.children == [child]
+    assert other.children == []
+    assert result.orphans == [orphan]
+    assert result.group_by("product") == {
+        "Hydra TwentySix": [parent, child, orphan],
+        "Prime HD": [other]}
+    assert result.group_by("firmware") == {
+        "2.2.0": [parent, other, child, orphan]}
+
+
+@pytest.mark.asyncio
+async def test_discover_network():
+
+    port = TestHelper.get_free_port()
+    parent = SimulatedLight("hydra52hd", host="127.0.0.1", port=port)
+    child = SimulatedLight("hydra52hd", host="127.0.0.2", port=port,
+                           parent="hydra52-{}".format(parent.serial_number))
+
+    async with parent, child:
+        result = await async_discover("127.0.0.0/29", port=port,
+                                      timeout=0.5)
+
+    assert result.parent_hosts == [parent.host]
+    assert [light.host for light in result.parents[0].children] == \
+        [child.host]
+    assert result.orphans == []
+
+
+@pytest.mark.asyncio
+async def test_discover_ignores_errors():
+
+    async with SimulatedLight() as light, \
+            SimulatedLight(error_rate=1) as error_light, \
+            SimulatedLight(drop_rate=1) as drop_light, \
+            SimulatedLight(latency=1) as slow_light:
+
+        closed_host = "127.0.0.1:{}".format(TestHelper.get_free_port())
+        hosts = [light.host, error_light.host, drop_light.host,
+                 slow_light.host, closed_host]
+
+        start = time.monotonic()
+        result = await async_discover_hosts(hosts, timeout=0.2)
+
+        assert time.monotonic() - start < 1
+        assert result.parent_hosts == [light.host]
+
+
+@pytest.mark.asyncio
+async def test_discover_not_json():
+
+    async def handler(request):
+        return web.Response(text="<html></html>")
+
+    app = web.Application()
+    app.router.add_route('GET', '/api/identity', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = TestHelper.get_free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    result = await async_discover_hosts(["127.0.0.1:{}".format(port)])
+
+    assert result.lights == []
+
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_discover_with_session():
+
+    session = aiohttp.ClientSession()
+
+    async with SimulatedLight() as light:
+        result = await async_discover_hosts([light.host], session=session)
+
+    assert not session.closed
+    assert result.parent_hosts == [light.host]
+
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_discover_invalid_concurrency():
+
+    with pytest.raises(ValueError):
+        await async_discover_hosts(["127.0.0.1"], concurrency=0)
@@ -0,0 +1,212 @@
+import pytest
+import asyncio
+import aiohttp
+import asynctest
+from async_generator import yield_, async_generator
+
+from aquaipy.aquaipy import AquaIPy, Response
+from aquaipy.error import ConnError, MustBeParentError
+from aquaipy.fleet import AquaIPyFleet
+from aquaipy.simulator import SimulatedLight
+from aquaipy.test.TestData import TestData
+from aquaipy.test.test_async_AquaIPy import MockAIDevice, TestHelper
+
+
+async def async_serve(mock_device, responses):
+    """Answer requests on the mock device, from a dict of path -> response."""
+    for _ in range(len(responses)):
+        request = await mock_device.receive_request()
+        mock_device.send_response(request, data=responses[request.path_qs])
+
+
+@pytest.fixture
+@async_generator
+async def devices():
+    async with MockAIDevice() as device1:
+        async with MockAIDevice() as device2:
+            await yield_((device1, device2))
+
+
+def test_fleet_init_invalid_concurrency():
+
+    with pytest.raises(ValueError):
+        AquaIPyFleet(["localhost"], max_concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_fleet_init_shares_session():
+
+    session = aiohttp.ClientSession()
+    fleet = AquaIPyFleet(["host1", "host2", "host1"], session=session)
+
+    assert fleet.hosts == ["host1", "host2"]
+
+    for light in fleet.lights.values():
+        assert light._session is session
+
+    await fleet.async_close()
+    assert not session.closed
+
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_connect(devices):
+
+    device1, device2 = devices
+    host1 = TestHelper.get_hostname(device1)
+    host2 = TestHelper.get_hostname(device2)
+
+    fleet = AquaIPyFleet([host1, host2])
+
+    (results, errors), _, _ = await asyncio.gather(
+        fleet.async_connect(),
+        async_serve(device1, {
+            '/api/identity': TestData.identity_hydra26hd(),
+            '/api/power': TestData.power_hydra26hd()}),
+        async_serve(device2, {
+            '/api/identity': TestData.identity_not_parent()}))
+
+    assert results == {host1: TestData.primary_mac_hydra26hd()}
+    assert list(errors) == [host2]
+    assert isinstance(errors[host2], MustBeParentError)
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_get_colors_brightness_not_connected():
+
+    fleet = AquaIPyFleet(["host1", "host2"])
+
+    results, errors = await fleet.async_get_colors_brightness()
+
+    assert results == {}
+    assert set(errors) == {"host1", "host2"}
+
+    for error in errors.values():
+        assert isinstance(error, ConnError)
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_set_colors_brightness():
+
+    fleet = AquaIPyFleet(["host1", "host2"])
+    colors = TestData.set_colors_2()
+
+    with asynctest.patch.object(AquaIPy, 'async_set_colors_brightness') as mock_set:
+
+        mock_set.return_value = Response.Success
+
+        results, errors = await fleet.async_set_colors_brightness(colors)
+
+        assert results == {"host1": Response.Success, "host2": Response.Success}
+        assert errors == {}
+        assert mock_set.call_count == 2
+        mock_set.assert_called_with(colors)
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_bounded_concurrency():
+
+    fleet = AquaIPyFleet(["host{}".format(i) for i in range(10)], max_concurrency=3)
+    running = 0
+    max_running = 0
+
+    async def fake_get_schedule_state(*args):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return True
+
+    with asynctest.patch.object(AquaIPy, 'async_get_schedule_state', new=fake_get_schedule_state):
+
+        results, errors = await fleet.async_get_schedule_state()
+
+    assert len(results) == 10
+    assert errors == {}
+    assert max_running == 3
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_timeout():
+
+    fleet = AquaIPyFleet(["host1", "host2"], timeout=0.05)
+
+    async def fake_get_schedule_state(self):
+        if self.name == "host2":
+            await asyncio.sleep(10)
+        return True
+
+    with asynctest.patch.object(AquaIPy, 'async_get_schedule_state', new=fake_get_schedule_state):
+
+        results, errors = await fleet.async_get_schedule_state()
+
+    assert results == {"host1": True}
+    assert isinstance(errors["host2"], asyncio.TimeoutError)
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_ramp_colors_brightness():
+
+    fleet = AquaIPyFleet(["host1", "host2"])
+    colors = TestData.set_colors_2()
+
+    with asynctest.patch.object(AquaIPy, 'async_ramp_colors_brightness') as mock_ramp:
+
+        mock_ramp.return_value = Response.Success
+
+        results, errors = await fleet.async_ramp_colors_brightness(colors, 30, rate=5)
+
+        assert results == {"host1": Response.Success, "host2": Response.Success}
+        assert errors == {}
+        mock_ramp.assert_called_with(colors, 30, 5, None)
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_cancelled_is_error():
+
+    fleet = AquaIPyFleet(["host1", "host2"])
+
+    async def fake_get_schedule_state(self):
+        if self.name == "host2":
+            raise asyncio.CancelledError()
+        return True
+
+    with asynctest.patch.object(AquaIPy, 'async_get_schedule_state', new=fake_get_schedule_state):
+
+        results, errors = await fleet.async_get_schedule_state()
+
+    assert results == {"host1": True}
+    assert isinstance(errors["host2"], asyncio.CancelledError)
+
+    await fleet.async_close()
+
+
+@pytest.mark.asyncio
+async def test_fleet_close_stops_lights():
+
+    async with SimulatedLight() as light:
+        fleet = AquaIPyFleet([light.host])
+        await fleet.async_connect()
+
+        api = fleet.lights[light.host]
+        api.watcher.add_callback(lambda state: None)
+        assert api.watcher.running
+
+        await fleet.async_close()
+
+        assert not api.watcher.running
+        assert api._base_path is None
@@ -0,0 +1,232 @@
+import pytest
+import asyncio
+import aiohttp
+from aiohttp import web
+
+from aquaipy.aquaipy import AquaIPy, Response
+from aquaipy.error import ConnError
+from aquaipy.fleet import AquaIPyFleet
+from aquaipy.metrics import Instrumentation, MetricsCollector, \
+    create_metrics_app
+from aquaipy.simulator import SimulatedLight
+
+
+def test_instrumentation_hooks_do_nothing():
+
+    instrumentation = Instrumentation()
+
+    assert instrumentation.on_request(
+        "host", "GET", "colors", 0.1, 0, None) is None
+    assert instrumentation.on_response(
+        "host", "set_colors_brightness", Response.Success) is None
+    assert instrumentation.on_power_limit_exceeded(
+        "host", "D8976003AAAA", 90000, 95000) is None
+
+
+def test_metrics_latency_histogram():
+
+    collector = MetricsCollector(buckets=(0.1, 0.01))
+
+    collector.on_request("host", "GET", "colors", 0.005, 0, None)
+    collector.on_request("host", "GET", "colors", 0.01, 0, None)
+    collector.on_request("host", "GET", "colors", 0.05, 0, None)
+    collector.on_request("host", "GET", "colors", 1, 0, None)
+
+    histogram, total = collector.get_latency_histogram(
+        "host", "GET", "colors")
+
+    assert histogram == [(0.01, 2), (0.1, 3), (float("inf"), 4)]
+    assert total == pytest.approx(1.065)
+    assert collector.requests == {("host", "GET", "colors"): 4}
+    assert collector.request_errors == {}
+
+
+def test_metrics_empty_histogram():
+
+    collector = MetricsCollector(buckets=(0.1,))
+
+    assert collector.get_latency_histogram("host", "GET", "colors") == \
+        ([(0.1, 0), (float("inf"), 0)], 0)
+
+
+def test_metrics_errors():
+
+    collector = MetricsCollector()
+
+    collector.on_request("host", "GET", "colors", 0.1, 1, None)
+    collector.on_request("host", "GET", "colors", 0.1, None,
+                         asyncio.TimeoutError())
+    collector.on_request("host", "GET", "colors", 0.1, None,
+                         asyncio.TimeoutError())
+    collector.on_response("host", "set_colors_brightness",
+                          Response.PowerLimitExceeded)
+    collector.on_power_limit_exceeded("host", "D8976003AAAA", 90000, 95000)
+
+    assert collector.request_errors == {
+        ("host", "GET", "colors", "response_code_1"): 1,
+        ("host", "GET", "colors", "TimeoutError"): 2}
+    assert collector.responses == {
+        ("host", "set_colors_brightness", "PowerLimitExceeded"): 1}
+    assert collector.power_limit_rejections == {("host", "D8976003AAAA"): 1}
+
+
+def test_metrics_export_openmetrics():
+
+    collector = MetricsCollector(buckets=(0.5,))
+
+    collector.on_request('ho"st', "GET", "colors", 0.25, 1, None)
+    collector.on_response("host", "set_schedule_state", Response.Error)
+    collector.on_power_limit_exceeded("host", "D8976003AAAA", 90000, 95000)
+
+    assert collector.export_openmetrics().splitlines() == [
+        '# TYPE aquaipy_requests counter',
+        '# HELP aquaipy_requests Requests sent to the lights.',
+        'aquaipy_requests_total{host="ho\\"st",method="GET",'
+        'endpoint="colors"} 1',
+        '# TYPE aquaipy_request_duration_seconds histogram',
+        '# HELP aquaipy_request_duration_seconds Request latency.',
+        'aquaipy_request_duration_seconds_bucket{host="ho\\"st",method="GET",'
+        'endpoint="colors",le="0.5"} 1',
+        'aquaipy_request_duration_seconds_bucket{host="ho\\"st",method="GET",'
+        'endpoint="colors",le="+Inf"} 1',
+        'aquaipy_request_duration_seconds_count{host="ho\\"st",method="GET",'
+        'endpoint="colors"} 1',
+        'aquaipy_request_duration_seconds_sum{host="ho\\"st",method="GET",'
+        'endpoint="colors"} 0.25',
+        '# TYPE aquaipy_request_phase_seconds summary',
+        '# HELP aquaipy_request_phase_seconds Time spent in each phase of a '
+        'request.',
+        '# TYPE aquaipy_request_errors counter',
+        '# HELP aquaipy_request_errors Requests that failed or returned a '
+        'non-zero response_code.',
+        'aquaipy_request_errors_total{host="ho\\"st",method="GET",'
+        'endpoint="colors",error="response_code_1"} 1',
+        '# TYPE aquaipy_responses counter',
+        '# HELP aquaipy_responses Results of operations.',
+        'aquaipy_responses_total{host="host",operation="set_schedule_state",'
+        'response="Error"} 1',
+        '# TYPE aquaipy_power_limit_rejections counter',
+        '# HELP aquaipy_power_limit_rejections Intensities rejected for '
+        'exceeding a device power limit.',
+        'aquaipy_power_limit_rejections_total{host="host",'
+        'device="D8976003AAAA"} 1',
+        '# EOF']
+
+
+@pytest.mark.asyncio
+async def test_metrics_recorded_by_AquaIPy():
+
+    collector = MetricsCollector()
+
+    async with SimulatedLight("primehd") as light:
+        api = AquaIPy(instrumentation=collector)
+        await api.async_connect(light.host)
+        host = light.host
+
+        assert await api.async_set_colors_brightness(
+            dict.fromkeys(api.colors, 100)) == Response.Success
+        assert await api.async_set_colors_brightness(
+            dict.fromkeys(api.colors, 110)) == Response.PowerLimitExceeded
+        assert await api.async_set_colors_brightness({}) == \
+            Response.AllColorsMustBeSpecified
+        assert await api.async_set_schedule_state(False) == Response.Success
+
+        light.error_rate = 1
+        assert await api.async_set_schedule_state(True) == Response.Error
+
+        await api.async_close()
+
+    assert collector.requests == {
+        (host, "GET", "identity"): 1,
+        (host, "GET", "power"): 1,
+        (host, "POST", "colors"): 1,
+        (host, "PUT", "schedule/enable"): 2}
+    assert collector.request_errors == {
+        (host, "PUT", "schedule/enable", "response_code_1"): 1}
+    assert collector.responses == {
+        (host, "set_colors_brightness", "Success"): 1,
+        (host, "set_colors_brightness", "PowerLimitExceeded"): 1,
+        (host, "set_colors_brightness", "AllColorsMustBeSpecified"): 1,
+        (host, "set_schedule_state", "Success"): 1,
+        (host, "set_schedule_state", "Error"): 1}
+    assert collector.power_limit_rejections == {(host, light.serial_number): 1}
+
+
+@pytest.mark.asyncio
+async def test_metrics_recorded_for_ramp():
+
+    collector = MetricsCollector()
+
+    async with SimulatedLight("primehd") as light:
+        api = AquaIPy(instrumentation=collector)
+        await api.async_connect(light.host)
+
+        assert await api.async_ramp_colors_brightness(
+            dict.fromkeys(api.colors, 110), 1) == Response.PowerLimitExceeded
+        assert await api.async_ramp_colors_brightness(
+            dict.fromkeys(api.colors, 10), 0.1, rate=20) == Response.Success
+
+        await api.async_close()
+
+    assert collector.responses == {
+        (light.host, "ramp_colors_brightness", "PowerLimitExceeded"): 1,
+        (light.host, "ramp_colors_brightness", "Success"): 1}
+    assert collector.requests[(light.host, "POST", "colors")] == 2
+
+
+@pytest.mark.asyncio
+async def test_metrics_recorded_for_failed_requests():
+
+    collector = MetricsCollector()
+
+    async with SimulatedLight(drop_rate=1) as light:
+        api = AquaIPy(instrumentation=collector)
+
+        with pytest.raises(ConnError):
+            await api.async_connect(light.host)
+
+        await api.async_close()
+
+    assert collector.requests == {(light.host, "GET", "identity"): 3}
+    assert collector.request_errors == {
+        (light.host, "GET", "identity", "ServerDisconnectedError"): 3}
+
+
+@pytest.mark.asyncio
+async def test_metrics_fleet_instrumentation():
+
+    collector = MetricsCollector()
+
+    async with SimulatedLight() as light1, SimulatedLight() as light2:
+        fleet = AquaIPyFleet([light1.host, light2.host],
+                             instrumentation=collector)
+        _, errors = await fleet.async_connect()
+        assert errors == {}
+
+        await fleet.async_close()
+
+    assert collector.requests[(light1.host, "GET", "identity")] == 1
+    assert collector.requests[(light2.host, "GET", "identity")] == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_app():
+
+    collector = MetricsCollector()
+    collector.on_request("host", "GET", "colors", 0.25, 0, None)
+
+    runner = web.AppRunner(create_metrics_app(collector))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    async with aiohttp.ClientSession() as session:
+        url = "http://127.0.0.1:{}/metrics".format(port)
+
+        async with session.get(url) as resp:
+            assert resp.headers["Content-Type"].startswith(
+                "application/openmetrics-text")
+            assert await resp.text() == collector.export_openmetrics()
+
+    await runner.cleanup()
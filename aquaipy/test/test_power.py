@@ -0,0 +1,212 @@
+import pytest
+from unittest.mock import patch
+
+from aquaipy.aquaipy import HDDevice
+from aquaipy.power import PowerBudget, PowerScaling
+from aquaipy.test.TestData import TestData
+
+
+def get_devices(power_response, primary_mac):
+
+    devices = [HDDevice(device, primary_mac) for device in power_response["devices"]]
+    devices.sort(key=lambda device: not device.is_primary)
+
+    return devices
+
+
+def get_intensities(device, colors):
+
+    intensities = {}
+
+    for color, value in colors.items():
+        intensities[color] = device.convert_to_intensity(color, value)
+
+    return intensities
+
+
+@pytest.mark.parametrize("power_response, primary_mac, colors", [
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd(), TestData.set_colors_3()),
+    (TestData.power_primehd(), TestData.primary_mac_primehd(), TestData.set_colors_max_hd_primehd()),
+    (TestData.power_two_hd_devices(), TestData.primary_mac_hydra26hd(), TestData.set_colors_max_hd_hydra26hd()),
+    (TestData.power_mixed_hd_devices(), TestData.primary_mac_primehd(), TestData.set_colors_hd_exceeded_mixed())
+    ])
+def test_PowerBudget_get_mw_matches_convert_to_mw(power_response, primary_mac, colors):
+
+    devices = get_devices(power_response, primary_mac)
+    budget = PowerBudget(devices)
+    intensities = get_intensities(devices[0], colors)
+
+    used = budget.get_mw(intensities)
+    headroom = budget.get_headroom(intensities)
+
+    for device, mw_value in zip(devices, used):
+
+        expected = 0
+        for color, intensity in intensities.items():
+            expected += device.convert_to_mw(color, intensity)
+
+        assert mw_value == expected
+        assert headroom[device.mac_address] == device.max_mw - expected
+
+
+@pytest.mark.parametrize("power_response, primary_mac, colors, exceeded_mac", [
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd(), TestData.set_colors_3(), None),
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd(), TestData.set_colors_hd_exceeded_hydra26hd(), "D8976003AAAA"),
+    (TestData.power_primehd(), TestData.primary_mac_primehd(), TestData.set_colors_hd_exceeded_primehd(), "D8976004AAAA"),
+    (TestData.power_mixed_hd_devices(), TestData.primary_mac_primehd(), TestData.set_colors_hd_exceeded_mixed(), "D8976003BBBB")
+    ])
+def test_PowerBudget_find_exceeded(power_response, primary_mac, colors, exceeded_mac):
+
+    devices = get_devices(power_response, primary_mac)
+    budget = PowerBudget(devices)
+
+    exceeded = budget.find_exceeded(get_intensities(devices[0], colors))
+
+    if exceeded_mac is None:
+        assert exceeded is None
+    else:
+        device, mw_value = exceeded
+        assert device.mac_address == exceeded_mac
+        assert mw_value > device.max_mw
+
+
+@pytest.mark.parametrize("power_response, primary_mac", [
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd()),
+    (TestData.power_two_hd_devices(), TestData.primary_mac_hydra26hd()),
+    (TestData.power_mixed_hd_devices(), TestData.primary_mac_primehd())
+    ])
+def test_PowerBudget_headroom_array_matches_scalar(power_response, primary_mac):
+
+    numpy = pytest.importorskip("numpy")
+
+    devices = get_devices(power_response, primary_mac)
+    budget = PowerBudget(devices)
+    colors = sorted(TestData.get_colors())
+
+    candidates = numpy.random.RandomState(0).randint(0, 2001, size=(500, len(colors)))
+    headroom = budget.get_headroom_array(colors, candidates)
+    within = budget.check_array(colors, candidates)
+
+    assert headroom.shape == (500, len(devices))
+
+    for row, candidate in enumerate(candidates):
+
+        intensities = dict(zip(colors, candidate.tolist()))
+        expected = budget.get_headroom(intensities)
+
+        for column, device in enumerate(devices):
+            assert headroom[row, column] == pytest.approx(expected[device.mac_address])
+
+        assert within[row] == (budget.find_exceeded(intensities) is None)
+
+
+def test_PowerBudget_headroom_array_ValueError():
+
+    pytest.importorskip("numpy")
+
+    budget = PowerBudget(get_devices(TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd()))
+
+    with pytest.raises(ValueError):
+        budget.get_headroom_array(["uv", "blue"], [[0, 2010]])
+
+    with pytest.raises(ValueError):
+        budget.get_headroom_array(["uv"], [[0, 0]])
+
+
+@patch.dict("sys.modules", {"numpy": None})
+def test_PowerBudget_headroom_array_no_numpy():
+
+    budget = PowerBudget(get_devices(TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd()))
+
+    with pytest.raises(ImportError):
+        budget.check_array(["uv"], [[0]])
+
+
+def test_PowerBudget_devices():
+
+    devices = get_devices(TestData.power_two_hd_devices(), TestData.primary_mac_hydra26hd())
+    budget = PowerBudget(devices)
+
+    assert budget.devices == devices
+
+
+@pytest.mark.parametrize("power_response, primary_mac, colors", [
+    (TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd(), TestData.set_colors_hd_exceeded_hydra26hd()),
+    (TestData.power_primehd(), TestData.primary_mac_primehd(), TestData.set_colors_hd_exceeded_primehd()),
+    (TestData.power_mixed_hd_devices(), TestData.primary_mac_primehd(), TestData.set_colors_hd_exceeded_mixed())
+    ])
+def test_PowerBudget_scale_to_limits_uniform(power_response, primary_mac, colors):
+
+    devices = get_devices(power_response, primary_mac)
+    budget = PowerBudget(devices)
+    intensities = get_intensities(devices[0], colors)
+
+    scaled = budget.scale_to_limits(intensities)
+
+    assert budget.find_exceeded(scaled) is None
+    assert set(scaled) == set(intensities)
+
+    # Every color is scaled by the same factor, to within rounding
+    factors = [scaled[color] / value for color, value in intensities.items()
+               if value > 0]
+    assert max(factors) - min(factors) < 0.01
+
+    # The closest fit, one more step on each color would exceed a limit
+    bigger = {color: min(value, scaled[color] + 2)
+              for color, value in intensities.items()}
+    assert budget.find_exceeded(bigger) is not None
+
+
+def test_PowerBudget_scale_to_limits_within_limits():
+
+    devices = get_devices(TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd())
+    budget = PowerBudget(devices)
+    intensities = get_intensities(devices[0], TestData.set_colors_3())
+
+    assert budget.scale_to_limits(intensities) is intensities
+
+
+def test_PowerBudget_scale_to_limits_priorities():
+
+    devices = get_devices(TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd())
+    budget = PowerBudget(devices)
+    intensities = get_intensities(
+        devices[0], TestData.set_colors_hd_exceeded_hydra26hd())
+    scaling = PowerScaling({"uv": 1, "violet": 1, "royal": 1, "blue": 1})
+
+    scaled = budget.scale_to_limits(intensities, scaling)
+
+    assert budget.find_exceeded(scaled) is None
+
+    # The high priority colors are kept, the others are reduced
+    for color in scaling.priorities:
+        assert scaled[color] == intensities[color]
+
+    assert scaled["cool_white"] < intensities["cool_white"]
+
+
+def test_PowerBudget_scale_to_limits_turns_off_low_priorities():
+
+    devices = get_devices(TestData.power_hydra26hd(), TestData.primary_mac_hydra26hd())
+    budget = PowerBudget(devices)
+    intensities = dict.fromkeys(devices[0].mw_coefficients, 2000)
+    scaling = PowerScaling(dict.fromkeys(intensities, 1))
+    scaling.priorities["uv"] = 0
+
+    scaled = budget.scale_to_limits(intensities, scaling)
+
+    # Turning off the low priority color isn't enough, so the rest are
+    # scaled down together
+    assert budget.find_exceeded(scaled) is None
+    assert scaled["uv"] == 0
+    assert len(set(value for color, value in scaled.items()
+                   if color != "uv")) == 1
+    assert scaled["blue"] < 2000
+
+
+def test_PowerScaling_tiers():
+
+    scaling = PowerScaling({"blue": 2, "uv": -1})
+
+    assert scaling.get_tiers(["uv", "blue", "red", "green"]) == \
+        [["uv"], ["red", "green"], ["blue"]]
@@ -0,0 +1,111 @@
+import pytest
+
+from aquaipy.aquaipy import HDDevice
+from aquaipy.power import PowerBudget, PowerScaling
+from aquaipy.ramp import RampPlan
+from aquaipy.test.TestData import TestData
+
+
+@pytest.fixture
+def device():
+    return HDDevice(TestData.power_hydra26hd()["devices"][0], TestData.primary_mac_hydra26hd())
+
+
+def test_RampPlan_steps(device):
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_2(), 1, rate=10)
+
+    assert plan.last_index == 10
+    assert plan.steps[0] == TestData.result_intensities_0p()
+    assert plan.steps[-1] == TestData.result_intensities_100p()
+
+    for index, intensities in enumerate(plan.steps):
+        for value in intensities.values():
+            assert value == index * 100
+
+
+def test_RampPlan_hd_steps(device):
+
+    plan = RampPlan(device, TestData.set_colors_2(), TestData.set_colors_3(), 0.5, rate=4)
+
+    assert plan.last_index == 2
+    assert plan.steps[-1] == TestData.set_result_colors_3_hydra26hd()
+
+
+def test_RampPlan_zero_duration(device):
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_2(), 0)
+
+    assert plan.last_index == 0
+    assert plan.steps == [TestData.result_intensities_100p()]
+
+
+def test_RampPlan_different_colors(device):
+
+    end = TestData.set_colors_2()
+    del end["uv"]
+
+    with pytest.raises(ValueError):
+        RampPlan(device, TestData.set_colors_1(), end, 1)
+
+
+@pytest.mark.parametrize("duration, rate", [(-1, 10), (1, 0)])
+def test_RampPlan_invalid(device, duration, rate):
+
+    with pytest.raises(ValueError):
+        RampPlan(device, TestData.set_colors_1(), TestData.set_colors_2(), duration, rate)
+
+
+def test_RampPlan_invalid_percentage(device):
+
+    end = TestData.set_colors_2()
+    end["uv"] = 300
+
+    with pytest.raises(ValueError):
+        RampPlan(device, TestData.set_colors_1(), end, 1)
+
+
+def test_RampPlan_find_exceeded(device):
+
+    budget = PowerBudget([device])
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_2(), 1)
+    assert plan.find_exceeded(budget) is None
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_hd_exceeded_hydra26hd(), 1)
+    index, exceeded_device, mw_value = plan.find_exceeded(budget)
+
+    assert 0 < index <= plan.last_index
+    assert exceeded_device is device
+    assert mw_value > device.max_mw
+
+
+def test_RampPlan_scale_to_limits(device):
+
+    budget = PowerBudget([device])
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_2(), 1)
+    assert plan.scale_to_limits(budget) == 0
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_hd_exceeded_hydra26hd(), 1)
+    index, _, _ = plan.find_exceeded(budget)
+
+    assert plan.scale_to_limits(budget, PowerScaling()) == plan.last_index + 1 - index
+    assert plan.find_exceeded(budget) is None
+
+
+@pytest.mark.parametrize("index, elapsed, expected", [
+    (0, 0, (1, 0.1)),
+    (3, 0.35, (4, 0.05)),
+    (3, 0.4, (4, 0)),
+    (3, 0.75, (7, 0)),
+    (8, 5, (10, 0)),
+    ])
+def test_RampPlan_get_next_step(device, index, elapsed, expected):
+
+    plan = RampPlan(device, TestData.set_colors_1(), TestData.set_colors_2(), 1, rate=10)
+
+    next_index, delay = plan.get_next_step(index, elapsed)
+
+    assert next_index == expected[0]
+    assert delay == pytest.approx(expected[1])
@@ -0,0 +1,171 @@
+import pytest
+import datetime
+import numpy
+
+from aquaipy.aquaipy import AquaIPy, HDDevice
+from aquaipy.fleet import AquaIPyFleet
+from aquaipy.schedule import ScheduleEvaluator, format_schedule_points, \
+    get_minute_of_day, get_minutes_from_timestamps, parse_schedule_points
+from aquaipy.simulator import SimulatedLight
+from aquaipy.test.TestData import TestData
+
+
+def get_points(colors, *values):
+    return {minute: dict.fromkeys(colors, value) for minute, value in values}
+
+
+def test_schedule_points_round_trip():
+
+    schedule = {720: {"blue": 1000}, 60: {"blue": 0}}
+    points = format_schedule_points(schedule)
+
+    assert points == [{"time": 60, "colors": {"blue": 0}},
+                      {"time": 720, "colors": {"blue": 1000}}]
+    assert parse_schedule_points(points) == schedule
+
+
+@pytest.mark.asyncio
+async def test_schedule_download():
+
+    async with SimulatedLight() as light:
+        light.schedule = get_points(light.colors, (480, 0), (720, 500),
+                                    (1200, 0))
+
+        api = AquaIPy()
+        await api.async_connect(light.host)
+
+        assert await api.async_get_schedule() == \
+            get_points(api.colors, (480, 0), (720, 50), (1200, 0))
+        assert light.request_counts["/api/schedule"] == 1
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_schedule_download_error():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        light.error_rate = 1
+
+        assert await api.async_get_schedule() is None
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_schedule_fleet():
+
+    async with SimulatedLight() as light1, SimulatedLight() as light2:
+        light1.schedule = get_points(light1.colors, (480, 0), (720, 500))
+        light2.schedule = get_points(light2.colors, (600, 1000))
+
+        fleet = AquaIPyFleet([light1.host, light2.host])
+        await fleet.async_connect()
+
+        colors = fleet.lights[light1.host].colors
+        results, errors = await fleet.async_get_schedule()
+
+        assert errors == {}
+        assert results == {
+            light1.host: get_points(colors, (480, 0), (720, 50)),
+            light2.host: get_points(colors, (600, 100))}
+
+        await fleet.async_close()
+
+
+def get_evaluator(*values):
+    device = HDDevice(TestData.power_hydra26hd()["devices"][0],
+                      TestData.primary_mac_hydra26hd())
+    colors = list(device._max_percentage)
+
+    return ScheduleEvaluator(device, get_points(colors, *values))
+
+
+def test_get_minute_of_day():
+
+    assert get_minute_of_day(datetime.time(12, 30, 30)) == 750.5
+    assert get_minute_of_day(datetime.datetime(2018, 1, 1, 1, 0)) == 60
+    assert get_minute_of_day(1500) == 60
+
+    minutes = get_minutes_from_timestamps([0, 3600, 86400 + 90],
+                                          utc_offset=-3600)
+    assert minutes.tolist() == [1380, 0, 1381.5]
+
+
+def test_schedule_evaluator_interpolates():
+
+    evaluator = get_evaluator((480, 0), (720, 1000), (1200, 2000))
+
+    assert evaluator.get_intensities(480)["blue"] == 0
+    assert evaluator.get_intensities(600)["blue"] == 500
+    assert evaluator.get_intensities(datetime.time(12))["blue"] == 1000
+    assert evaluator.get_intensities(960)["blue"] == 1500
+
+    # The last point fades back into the first point of the next day
+    assert evaluator.get_intensities(1200 + 360)["blue"] == 1000
+    assert evaluator.get_intensities(120)["blue"] == 1000
+
+    assert evaluator.get_percentages(600)["blue"] == 50
+    assert evaluator.get_mw(600)["blue"] == \
+        evaluator._device.convert_to_mw("blue", 500)
+
+
+def test_schedule_evaluator_single_point():
+
+    evaluator = get_evaluator((720, 400))
+
+    assert evaluator.get_intensities(0)["blue"] == 400
+    assert evaluator.get_intensities(1000)["blue"] == 400
+    assert evaluator.get_intensity_array([0, 720, 1439])[0].tolist() == \
+        [400, 400, 400]
+
+
+def test_schedule_evaluator_empty():
+
+    with pytest.raises(ValueError):
+        get_evaluator()
+
+
+def test_schedule_evaluator_array_matches_scalar():
+
+    evaluator = get_evaluator((0, 100), (480, 0), (720, 1000), (1200, 2000))
+    minutes = numpy.linspace(0, 1440, 2881)
+    colors = evaluator.colors
+
+    intensities = evaluator.get_intensity_array(minutes)
+    percentages = evaluator.get_percentage_array(minutes)
+    mw = evaluator.get_mw_array(minutes)
+
+    assert intensities.shape == (len(colors), len(minutes))
+
+    for column in (0, 1, 959, 1440, 2000, 2880):
+        minute = minutes[column]
+
+        for row, color in enumerate(colors):
+            assert intensities[row, column] == pytest.approx(
+                evaluator.get_intensities(minute)[color])
+            assert percentages[row, column] == pytest.approx(
+                evaluator.get_percentages(minute)[color])
+            assert mw[row, column] == pytest.approx(
+                evaluator.get_mw(minute)[color])
+
+
+@pytest.mark.asyncio
+async def test_schedule_evaluator_from_light():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+
+        assert api.schedule_evaluator is None
+
+        light.schedule = get_points(light.colors, (480, 0), (720, 500))
+        await api.async_get_schedule()
+
+        evaluator = api.schedule_evaluator
+        assert evaluator.get_percentages(600)["blue"] == 25
+        assert evaluator.get_percentages(720)["blue"] == 50
+
+        await api.async_close()
@@ -0,0 +1,282 @@
+import pytest
+import asyncio
+import aiohttp
+
+from aquaipy.aquaipy import AquaIPy, Response
+from aquaipy.error import ConnError
+from aquaipy.simulator import PROFILES, SimulatedLight, main
+
+
+@pytest.mark.asyncio
+async def test_simulator_connect():
+
+    async with SimulatedLight("hydra52hd") as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+
+        assert api.mac_addr == light.serial_number
+        assert api.product_type == "Hydra FiftyTwo"
+        assert api.firmware_version == "2.2.0"
+        assert sorted(api.colors) == sorted(PROFILES["hydra52hd"]["normal"])
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_unique_serial_numbers():
+
+    lights = [SimulatedLight(profile) for profile in sorted(PROFILES)]
+    lights += [SimulatedLight() for _ in range(3)]
+
+    assert len(set(light.serial_number for light in lights)) == len(lights)
+
+
+@pytest.mark.asyncio
+async def test_simulator_set_and_get_brightness():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+
+        colors = dict.fromkeys(api.colors, 0)
+        colors["blue"] = 50
+        colors["royal"] = 120
+
+        assert await api.async_set_colors_brightness(colors) == \
+            Response.Success
+        assert light.colors["blue"] == 500
+        assert light.colors["royal"] > 1000
+
+        api._clear_state()
+        brightness = await api.async_get_colors_brightness()
+
+        assert brightness["blue"] == 50
+        assert brightness["royal"] == pytest.approx(120, abs=0.1)
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_rejects_invalid_colors():
+
+    async with SimulatedLight() as light:
+        session = aiohttp.ClientSession()
+        url = "http://{}/api/colors".format(light.host)
+        colors = dict.fromkeys(light.colors, 0)
+
+        for body in ({"blue": 100},
+                     dict(colors, uv=2001),
+                     dict(colors, uv=-1),
+                     dict(colors, uv=1.5),
+                     dict(colors, red=0)):
+            async with session.post(url, json=body) as resp:
+                assert (await resp.json())["response_code"] == 1
+
+        async with session.post(url, data="not json") as resp:
+            assert (await resp.json())["response_code"] == 1
+
+        assert light.colors == colors
+
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_enforces_max_power():
+
+    async with SimulatedLight("primehd") as light:
+        session = aiohttp.ClientSession()
+        url = "http://{}/api/colors".format(light.host)
+        colors = dict.fromkeys(light.colors, 2000)
+
+        async with session.post(url, json=colors) as resp:
+            assert (await resp.json())["response_code"] == 1
+
+        assert set(light.colors.values()) == {0}
+
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_children():
+
+    async with SimulatedLight("hydra52hd", children=["primehd"]) as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+
+        devices = api._power_budget.devices
+        assert len(devices) == 2
+        assert devices[1]._mac_address != light.serial_number
+
+        session = aiohttp.ClientSession()
+        url = "http://{}/api/colors".format(light.host)
+        intensities = dict.fromkeys(api.colors, 0)
+        intensities.update(cool_white=2000, royal=2000, blue=2000)
+
+        async with session.post(url, json=intensities) as resp:
+            assert (await resp.json())["response_code"] == 1
+
+        await session.close()
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_schedule_state():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+
+        assert await api.async_get_schedule_state() is True
+        assert await api.async_set_schedule_state(False) == Response.Success
+        assert await api.async_get_schedule_state() is False
+        assert light.schedule_enabled is False
+
+        session = aiohttp.ClientSession()
+        url = "http://{}/api/schedule/enable".format(light.host)
+
+        for body in ("not json", '{"other": true}', '{"enable": 1}'):
+            async with session.put(url, data=body) as resp:
+                assert (await resp.json())["response_code"] == 1
+
+        assert light.schedule_enabled is False
+
+        await session.close()
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_request_counts():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        await api.async_get_schedule_state()
+        await api.async_get_schedule_state()
+
+        assert light.request_counts["/api/identity"] == 1
+        assert light.request_counts["/api/power"] == 1
+        assert light.request_counts["/api/schedule/enable"] == 2
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_error_rate():
+
+    async with SimulatedLight(error_rate=1) as light:
+        api = AquaIPy()
+
+        with pytest.raises(ConnError):
+            await api.async_connect(light.host)
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_drop_rate():
+
+    async with SimulatedLight(drop_rate=1) as light:
+        session = aiohttp.ClientSession()
+        url = "http://{}/api/identity".format(light.host)
+
+        with pytest.raises(aiohttp.ClientError):
+            async with session.get(url) as resp:
+                await resp.json()
+
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_latency_and_jitter():
+
+    async with SimulatedLight(latency=0.05, jitter=0.02, seed=1) as light:
+        session = aiohttp.ClientSession()
+        url = "http://{}/api/identity".format(light.host)
+        loop = asyncio.get_event_loop()
+
+        start = loop.time()
+        async with session.get(url) as resp:
+            assert (await resp.json())["response_code"] == 0
+
+        assert loop.time() - start >= 0.03
+
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_many_instances():
+
+    lights = [SimulatedLight() for _ in range(20)]
+    await asyncio.gather(*[light.async_start() for light in lights])
+
+    apis = [AquaIPy() for _ in lights]
+    await asyncio.gather(*[api.async_connect(light.host)
+                           for api, light in zip(apis, lights)])
+
+    assert [api.mac_addr for api in apis] == \
+        [light.serial_number for light in lights]
+
+    for api in apis:
+        await api.async_close()
+
+    await asyncio.gather(*[light.async_close() for light in lights])
+
+
+def test_simulator_main_invalid_profile():
+
+    with pytest.raises(SystemExit):
+        main(["--profile", "unknown"])
+
+
+@pytest.mark.asyncio
+async def test_simulator_concurrent_patches_tracked_state():
+
+    async with SimulatedLight(latency=0.05) as light:
+        api = AquaIPy(state_ttl=10)
+        await api.async_connect(light.host)
+
+        await api.async_set_colors_brightness(dict.fromkeys(api.colors, 10))
+        light.request_counts.clear()
+
+        results = await asyncio.gather(
+            api.async_patch_colors_brightness({"blue": 50}),
+            api.async_patch_colors_brightness({"uv": 30}),
+            api.async_patch_colors_brightness({"royal": 20}))
+
+        assert results == [Response.Success] * 3
+
+        # Each patch builds on the one before, without reading the colors
+        assert light.request_counts == {"/api/colors": 3}
+
+        expected = dict.fromkeys(api.colors, 10)
+        expected.update(blue=50, uv=30, royal=20)
+        assert await api.async_get_colors_brightness() == expected
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_simulator_read_during_write_tracked_state():
+
+    async with SimulatedLight(latency=0.05) as light:
+        api = AquaIPy(state_ttl=60)
+        await api.async_connect(light.host)
+        await api.async_set_colors_brightness(dict.fromkeys(api.colors, 0))
+
+        # The read is answered first, with the colors from before the write
+        read = asyncio.ensure_future(api.async_get_colors_brightness())
+        await asyncio.sleep(0.01)
+        response = await api.async_set_colors_brightness(
+            dict.fromkeys(api.colors, 50))
+
+        assert response == Response.Success
+        assert await read == dict.fromkeys(api.colors, 0)
+        assert api._get_tracked_brightness() == dict.fromkeys(api.colors, 50)
+
+        assert await api.async_patch_colors_brightness({"blue": 10}) == \
+            Response.Success
+        assert light.colors["uv"] != 0
+        assert api._get_tracked_brightness() == \
+            dict(dict.fromkeys(api.colors, 50), blue=10)
+
+        await api.async_close()
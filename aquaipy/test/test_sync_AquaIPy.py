@@ -1,5 +1,8 @@
+import concurrent.futures
 from multiprocessing import Process
 import socket
+import threading
+import time
 import pytest
 from unittest.mock import Mock, patch
 import asyncio
@@ -9,6 +12,7 @@ from aiohttp import web
 from aquaipy.aquaipy import HDDevice, AquaIPy, Response
 from aquaipy.error import ConnError, FirmwareError, MustBeParentError
 from aquaipy.test.TestData import TestData
+from aquaipy.threaded import ThreadedAquaIPy
 
 
 def get_hostname():
@@ -56,6 +60,11 @@ def server_process(bound_socket):
     app.router.add_route('PUT', '/api/schedule/enable', set_schedule_state_handler)
     app.router.add_route('POST', '/api/colors', set_colors_brightness_handler)
 
+    def get_schedule_handler(request):
+        return web.json_response(data={"points": [], "response_code": 0})
+
+    app.router.add_route('GET', '/api/schedule', get_schedule_handler)
+
     def run_server():
         aiohttp.web.run_app(app, handle_signals=True, sock=bound_socket)
     
@@ -112,6 +121,11 @@ def test_sync_get_colors(ai_instance):
         assert returned_colors.index(color) >= 0
 
 
+def test_sync_refresh_colors(ai_instance):
+
+    assert set(ai_instance.refresh_colors()) == TestData.get_colors()
+
+
 def test_sync_get_colors_brightness(ai_instance):
 
     expected_result = TestData.get_colors_3()
@@ -126,6 +140,11 @@ def test_sync_set_schedule_state(ai_instance):
     assert ai_instance.set_schedule_state(True) == Response.Success
 
 
+def test_sync_get_schedule(ai_instance):
+
+    assert ai_instance.get_schedule() == {}
+
+
 def test_sync_set_colors_brightness(ai_instance):
 
     assert ai_instance.set_colors_brightness(TestData.set_colors_3()) == Response.Success
@@ -141,4 +160,141 @@ def test_sync_update_color_brightness(ai_instance):
     assert ai_instance.update_color_brightness('deep_red', 10) == Response.Success
 
 
+def test_sync_ramp_colors_brightness(ai_instance):
+
+    assert ai_instance.ramp_colors_brightness(TestData.set_colors_3(), 0.1) == Response.Success
+
+
+@pytest.fixture
+def threaded_instance(bound_socket, server_process):
+
+    host = get_hostname()
+    _, port = bound_socket.getsockname()
+
+    api = ThreadedAquaIPy(timeout=10)
+
+    # The app runner/process takes a while to startup, so wait for it.
+    for i in range(0, 10):
+
+        try:
+            api.connect("{0}:{1}".format(host, port))
+            break
+        except ConnError:
+            time.sleep(0.1)
+
+    assert api.mac_addr == TestData.primary_mac_hydra26hd()
+
+    yield api
+
+    api.close()
+
+
+def test_threaded_connect_and_close(threaded_instance):
+
+    assert threaded_instance.product_type == "Hydra TwentySix"
+    assert threaded_instance.firmware_version == "2.2.0"
+    assert set(threaded_instance.colors) == TestData.get_colors()
+    assert threaded_instance.name is None
+
+    threaded_instance.close()
+    threaded_instance.close()
+
+    assert not threaded_instance._thread.is_alive()
+
+    with pytest.raises(RuntimeError):
+        threaded_instance.get_schedule_state()
+
+
+def test_threaded_methods(threaded_instance):
+
+    assert threaded_instance.get_schedule_state()
+    assert threaded_instance.set_schedule_state(True) == Response.Success
+    assert set(threaded_instance.get_colors()) == TestData.get_colors()
+    assert set(threaded_instance.refresh_colors()) == TestData.get_colors()
+    assert threaded_instance.get_colors_brightness() == TestData.get_colors_3()
+    assert threaded_instance.set_colors_brightness(TestData.set_colors_3()) == Response.Success
+    assert threaded_instance.patch_colors_brightness(TestData.set_colors_3()) == Response.Success
+    assert threaded_instance.update_color_brightness('deep_red', 10) == Response.Success
+    assert threaded_instance.ramp_colors_brightness(TestData.set_colors_3(), 0.1) == Response.Success
+    assert threaded_instance.get_schedule() == {}
+
+
+def test_threaded_concurrent_callers(threaded_instance):
+
+    results = []
+
+    def call():
+        results.append(threaded_instance.get_colors_brightness())
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert results == [TestData.get_colors_3()] * 10
+
+
+def test_threaded_called_from_running_loop(threaded_instance):
+
+    async def call():
+        return threaded_instance.get_schedule_state()
+
+    loop = asyncio.new_event_loop()
+
+    try:
+        assert loop.run_until_complete(call())
+    finally:
+        loop.close()
+
+
+def test_threaded_called_from_own_loop(threaded_instance):
+
+    async def call():
+        return threaded_instance.get_schedule_state()
+
+    future = asyncio.run_coroutine_threadsafe(call(), threaded_instance.loop)
+
+    with pytest.raises(RuntimeError):
+        future.result(10)
+
+
+def test_threaded_context_manager():
+
+    with ThreadedAquaIPy() as api:
+        assert api.api is not None
+
+    assert api.loop.is_closed()
+
+
+def test_threaded_init_failure_stops_loop():
+
+    with patch('aquaipy.threaded.AquaIPy', side_effect=ValueError):
+        with pytest.raises(ValueError):
+            ThreadedAquaIPy(name="init_failure")
+
+    names = [thread.name for thread in threading.enumerate()]
+    assert "AquaIPy-init_failure" not in names
+
+
+def test_threaded_timeout_cancels_call():
+
+    with ThreadedAquaIPy(timeout=0.05) as api:
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        async def slow_call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with pytest.raises(concurrent.futures.TimeoutError):
+            api._run(slow_call())
 
+        assert started.is_set()
+        assert cancelled.wait(1)
@@ -0,0 +1,171 @@
+import pytest
+import aiohttp
+
+from aquaipy.aquaipy import AquaIPy, ConnectionConfig
+from aquaipy.metrics import Instrumentation, MetricsCollector
+from aquaipy.simulator import SimulatedLight
+from aquaipy.tracing import PHASES, RequestTiming, create_trace_config
+
+
+class TimingRecorder(Instrumentation):
+
+    def __init__(self):
+        self.timings = []
+
+    def on_request_timing(self, host, method, endpoint, timing):
+        self.timings.append((host, method, endpoint, timing))
+
+
+def test_request_timing_phases():
+
+    timing = RequestTiming()
+    timing._marks = {
+        "start": 0,
+        "queue_start": 0.5,
+        "queue_end": 1,
+        "connect_start": 1,
+        "dns_start": 1,
+        "dns_end": 3,
+        "connect_end": 6,
+        "request_sent": 7,
+        "response_start": 10,
+        "body_read": 14,
+        "json_decode": 19,
+    }
+
+    assert timing.as_dict() == {
+        "queued": 0.5,
+        "dns": 2,
+        "connect": 3,
+        "request_sent": 1,
+        "first_byte": 3,
+        "body_read": 4,
+        "json_decode": 5,
+        "total": 19,
+    }
+    assert not timing.reused_connection
+
+
+def test_request_timing_reused_connection():
+
+    timing = RequestTiming()
+    timing._marks = {
+        "start": 0,
+        "connection_reused": 1,
+        "request_sent": 2,
+        "response_start": 4,
+    }
+
+    assert timing.reused_connection
+    assert timing.dns is None
+    assert timing.connect is None
+    assert timing.request_sent == 1
+    assert timing.first_byte == 2
+    assert timing.body_read is None
+    assert timing.total == 4
+
+
+def test_request_timing_not_traced():
+
+    timing = RequestTiming()
+    timing.mark("body_read")
+
+    assert timing.request_sent is None
+    assert timing.first_byte is None
+    assert timing.connect is None
+    assert timing.total >= 0
+
+
+@pytest.mark.asyncio
+async def test_tracing_phases_recorded():
+
+    recorder = TimingRecorder()
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(instrumentation=recorder)
+        await api.async_connect(light.host)
+        await api.async_get_colors_brightness()
+        await api.async_close()
+
+    assert [(method, endpoint) for _, method, endpoint, _ in
+            recorder.timings] == \
+        [("GET", "identity"), ("GET", "power"), ("GET", "colors")]
+
+    first = recorder.timings[0][3]
+    assert not first.reused_connection
+    assert first.connect is not None
+
+    last = recorder.timings[-1][3]
+    assert last.reused_connection
+    assert last.connect is None
+
+    for _, _, _, timing in recorder.timings:
+        assert timing.request_sent is not None
+        assert timing.first_byte is not None
+        assert timing.body_read is not None
+        assert timing.json_decode is not None
+        assert timing.total >= timing.first_byte
+
+
+@pytest.mark.asyncio
+async def test_tracing_with_specified_session():
+
+    recorder = TimingRecorder()
+    session = ConnectionConfig().create_session([create_trace_config()])
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(session=session, instrumentation=recorder)
+        await api.async_connect(light.host)
+
+    await session.close()
+
+    assert recorder.timings[0][3].first_byte is not None
+
+
+@pytest.mark.asyncio
+async def test_tracing_session_without_trace_config():
+
+    recorder = TimingRecorder()
+    session = aiohttp.ClientSession()
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(session=session, instrumentation=recorder)
+        await api.async_connect(light.host)
+
+    await session.close()
+
+    timing = recorder.timings[0][3]
+    assert timing.first_byte is None
+    assert timing.json_decode is not None
+
+
+@pytest.mark.asyncio
+async def test_tracing_ignores_untimed_requests():
+
+    session = aiohttp.ClientSession(trace_configs=[create_trace_config()])
+
+    async with SimulatedLight() as light:
+        url = "http://{}/api/identity".format(light.host)
+
+        async with session.get(url) as resp:
+            assert (await resp.json())["response_code"] == 0
+
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_tracing_metrics_phases():
+
+    collector = MetricsCollector()
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(instrumentation=collector)
+        await api.async_connect(light.host)
+        await api.async_close()
+
+    count, total = collector.phases[
+        (light.host, "GET", "identity", "first_byte")]
+    assert count == 1
+    assert total > 0
+    assert set(phase for _, _, _, phase in collector.phases) <= set(PHASES)
+    assert 'phase="json_decode"' in collector.export_openmetrics()
@@ -0,0 +1,285 @@
+import pytest
+import asyncio
+import aiohttp
+from unittest.mock import patch
+
+from aquaipy.aquaipy import AquaIPy, ConnectionConfig, Response
+from aquaipy.simulator import SimulatedLight
+from aquaipy.watcher import LightState, StateWatcher
+
+
+async def get_next(subscription, timeout=2):
+    return await asyncio.wait_for(subscription.__anext__(), timeout)
+
+
+def test_light_state_equality():
+
+    assert LightState({"blue": 10}, True) == LightState({"blue": 10}, True)
+    assert LightState({"blue": 10}, True) != LightState({"blue": 10}, False)
+    assert LightState({"blue": 10}, True) != LightState({"blue": 20}, True)
+
+
+def test_watcher_invalid_intervals():
+
+    with pytest.raises(ValueError):
+        StateWatcher(None, min_interval=0)
+
+    with pytest.raises(ValueError):
+        StateWatcher(None, backoff=0.5)
+
+
+def test_watcher_next_interval():
+
+    watcher = StateWatcher(None, min_interval=1, max_interval=4,
+                           max_error_interval=10, backoff=2)
+
+    assert watcher._get_next_interval(False, False) == 2
+    watcher.interval = 4
+    assert watcher._get_next_interval(False, False) == 4
+    assert watcher._get_next_interval(False, True) == 8
+    watcher.interval = 8
+    assert watcher._get_next_interval(False, True) == 10
+    assert watcher._get_next_interval(True, False) == 1
+
+
+@pytest.mark.asyncio
+async def test_watcher_subscribe():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        other = AquaIPy()
+        await other.async_connect(light.host)
+
+        api._watcher = StateWatcher(api, min_interval=0.01, max_interval=0.02)
+        first = api.watcher.subscribe()
+        second = api.watcher.subscribe()
+
+        state = await get_next(first)
+        assert state.schedule_enabled is True
+        assert await get_next(second) == state
+
+        colors = dict.fromkeys(api.colors, 25)
+        assert await other.async_set_colors_brightness(colors) == Response.Success
+
+        state = await get_next(first)
+        assert state.colors == colors
+        assert await get_next(second) == state
+
+        # Late subscribers get the current state straight away
+        third = api.watcher.subscribe()
+        assert await get_next(third) == state
+
+        await other.async_set_schedule_state(False)
+        assert (await get_next(first)).schedule_enabled is False
+
+        first.close()
+        second.close()
+        assert api.watcher.running
+        third.close()
+        assert not api.watcher.running
+
+        with pytest.raises(StopAsyncIteration):
+            await get_next(first)
+
+        await api.async_close()
+        await other.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_async_for():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        api._watcher = StateWatcher(api, min_interval=0.01)
+
+        states = []
+
+        async def consume():
+            async for state in api.watcher.subscribe():
+                states.append(state)
+
+        task = asyncio.ensure_future(consume())
+
+        while not states:
+            await asyncio.sleep(0.01)
+
+        # Closing the light stops the watcher, ending the loop
+        await api.async_close()
+        await asyncio.wait_for(task, 1)
+
+        assert len(states) == 1
+
+
+@pytest.mark.asyncio
+async def test_watcher_callbacks_only_get_changes():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        api._watcher = StateWatcher(api, min_interval=0.01, max_interval=0.01)
+
+        states = []
+        api.watcher.add_callback(states.append)
+        await asyncio.sleep(0.1)
+
+        assert len(states) == 1
+        assert light.request_counts["/api/colors"] > 3
+
+        await api.async_set_colors_brightness(dict.fromkeys(api.colors, 5))
+        await asyncio.sleep(0.05)
+        assert len(states) == 2
+
+        api.watcher.remove_callback(states.append)
+        assert not api.watcher.running
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_slows_down_when_stable():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        watcher = StateWatcher(api, min_interval=0.005, max_interval=0.04)
+
+        intervals = []
+        get_next_interval = watcher._get_next_interval
+
+        def record(changed, failed):
+            intervals.append(get_next_interval(changed, failed))
+            return intervals[-1]
+
+        watcher._get_next_interval = record
+        watcher.add_callback(lambda state: None)
+        await asyncio.sleep(0.15)
+
+        assert intervals[:4] == [0.005, 0.01, 0.02, 0.04]
+        assert light.request_counts["/api/colors"] < 10
+
+        stable = len(intervals)
+        await api.async_set_colors_brightness(dict.fromkeys(api.colors, 5))
+        await asyncio.sleep(0.06)
+
+        # Speeds up after the change, then slows down again
+        changed = intervals.index(0.005, stable)
+        assert intervals[changed:changed + 2] == [0.005, 0.01]
+
+        watcher.stop()
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_backs_off_on_errors():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        watcher = StateWatcher(api, min_interval=0.005, max_interval=0.01,
+                               max_error_interval=0.04)
+
+        states = []
+        watcher.add_callback(states.append)
+        await asyncio.sleep(0.03)
+
+        light.error_rate = 1
+        await asyncio.sleep(0.15)
+
+        assert watcher.last_error is not None
+        assert watcher.interval == 0.04
+        assert len(states) == 1
+
+        light.error_rate = 0
+        await asyncio.sleep(0.08)
+
+        assert watcher.last_error is None
+        assert watcher.interval <= 0.01
+
+        watcher.stop()
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_survives_closed_port():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy(connection_config=ConnectionConfig(retries=0))
+        await api.async_connect(light.host)
+        watcher = StateWatcher(api, min_interval=0.005, max_interval=0.01,
+                               max_error_interval=0.02)
+
+        states = []
+        watcher.add_callback(states.append)
+        await asyncio.sleep(0.03)
+        assert len(states) == 1
+
+    # The light has stopped, so nothing is listening on its port
+    await asyncio.sleep(0.1)
+
+    assert watcher.running
+    assert isinstance(watcher.last_error, aiohttp.ClientError)
+    assert watcher.interval == 0.02
+
+    watcher.stop()
+    await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_survives_invalid_response():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        watcher = StateWatcher(api, min_interval=0.005)
+
+        with patch.object(api, 'async_get_schedule_state',
+                          side_effect=ValueError("Invalid JSON")):
+            watcher.add_callback(lambda state: None)
+            await asyncio.sleep(0.03)
+
+            assert watcher.running
+            assert isinstance(watcher.last_error, ValueError)
+
+        watcher.stop()
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_stops_if_poll_dies():
+
+    async with SimulatedLight() as light:
+        api = AquaIPy()
+        await api.async_connect(light.host)
+        watcher = StateWatcher(api, min_interval=0.005)
+        subscription = watcher.subscribe()
+
+        with patch.object(api, 'async_get_schedule_state',
+                          side_effect=TypeError("Unexpected")):
+            with pytest.raises(StopAsyncIteration):
+                await get_next(subscription)
+
+        assert not watcher.running
+        assert isinstance(watcher.last_error, TypeError)
+
+        await api.async_close()
+
+
+@pytest.mark.asyncio
+async def test_watcher_stopped_by_close_with_shared_session():
+
+    async with SimulatedLight() as light:
+        session = aiohttp.ClientSession()
+        api = AquaIPy(session=session)
+        await api.async_connect(light.host)
+
+        api.watcher.add_callback(lambda state: None)
+        assert api.watcher.running
+
+        api.close()
+
+        assert not api.watcher.running
+        assert not session.closed
+
+        await session.close()
@@ -0,0 +1,257 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for using AquaIPy synchronously, from any number of threads."""
+
+import asyncio
+import concurrent.futures
+import threading
+
+from aquaipy.aquaipy import AquaIPy
+from aquaipy.ramp import DEFAULT_RAMP_RATE
+
+
+class ThreadedAquaIPy:
+    """A synchronous API for the AquaIllumination lights.
+
+    Unlike the synchronous methods on **AquaIPy**, which run the event loop
+    once for every call, this runs a dedicated event loop in a background
+    thread for the lifetime of the instance. Calls are submitted to that loop
+    and share a single ``aiohttp.ClientSession``, so it can be used from
+    inside a running event loop and calls made from several threads at once
+    run concurrently.
+    """
+
+    def __init__(self, name=None, timeout=None, **kwargs):
+        """Initialise the class and start the background event loop.
+
+        :param name: Instance name, not currently used for anything.
+        :type name: str
+        :param timeout: Max seconds to wait for each call, *None* to wait
+            indefinitely.
+        :type timeout: float
+
+        Any other keyword arguments are passed to **AquaIPy**.
+        """
+        self._timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="AquaIPy-{}".format(name),
+            daemon=True)
+        self._thread.start()
+
+        # The session must be created from within the loop that uses it
+        try:
+            self._api = self._run(self._async_create_api(name, kwargs))
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    def _run_loop(self):
+        """Run the event loop, in the background thread."""
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _stop_loop(self):
+        """Stop the event loop, wait for the background thread and close it."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _async_create_api(self, name, kwargs):
+        """Create the **AquaIPy** instance, in the background thread."""
+        return AquaIPy(name, loop=self._loop, **kwargs)
+
+    def _run(self, coro):
+        """Run a coroutine in the background thread and wait for the result."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("ThreadedAquaIPy methods can't be called from "
+                               "its own event loop, use the async API")
+
+        if self._loop.is_closed():
+            coro.close()
+            raise RuntimeError("ThreadedAquaIPy has been closed")
+
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+        try:
+            return future.result(self._timeout)
+        except concurrent.futures.TimeoutError:
+            # Don't leave the call running on the loop after giving up on it
+            future.cancel()
+            raise
+
+    def __enter__(self):
+        """Use the instance as a context manager, closing it on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the instance."""
+        self.close()
+
+    @property
+    def api(self):
+        """Get the underlying **AquaIPy** instance.
+
+        Its async methods must only be run on the background event loop.
+
+        :returns: the AquaIPy instance
+        :rtype: AquaIPy
+        """
+        return self._api
+
+    @property
+    def loop(self):
+        """Get the background event loop.
+
+        :returns: the event loop
+        :rtype: asyncio.AbstractEventLoop
+        """
+        return self._loop
+
+    @property
+    def mac_addr(self):
+        """Get connected devices Mac Address/Serial Number.
+
+        :returns: device mac address/serial number
+        :rtype: str
+        """
+        return self._api.mac_addr
+
+    @property
+    def name(self):
+        """Get device name.
+
+        :returns: device name
+        :rtype: str
+        """
+        return self._api.name
+
+    @property
+    def product_type(self):
+        """Get product type.
+
+        :returns: product type
+        :rtype: str
+        """
+        return self._api.product_type
+
+    @property
+    def firmware_version(self):
+        """Get firmware version.
+
+        :returns: firmware version
+        :rtype: str
+        """
+        return self._api.firmware_version
+
+    @property
+    def colors(self):
+        """Get the cached list of valid colors, for the connected device.
+
+        :returns: list of valid colors or *None* if not yet known
+        :rtype: list( color_1..color_n ) or None
+        """
+        return self._api.colors
+
+    def connect(self, host, check_firmware_support=True, fast=False):
+        """Connect to a specified AI light.
+
+        See **AquaIPy.async_connect()**.
+        """
+        return self._run(
+            self._api.async_connect(host, check_firmware_support, fast))
+
+    def close(self):
+        """Close the session and stop the background event loop."""
+        if self._loop.is_closed():
+            return
+
+        self._run(self._api.async_close())
+        self._stop_loop()
+
+    def get_schedule_state(self):
+        """Check if light schedule is enabled/disabled.
+
+        See **AquaIPy.async_get_schedule_state()**.
+        """
+        return self._run(self._api.async_get_schedule_state())
+
+    def set_schedule_state(self, enable):
+        """Enable/disable the light schedule.
+
+        See **AquaIPy.async_set_schedule_state()**.
+        """
+        return self._run(self._api.async_set_schedule_state(enable))
+
+    def get_schedule(self):
+        """Get the light schedule, unverified.
+
+        See **AquaIPy.async_get_schedule()**.
+        """
+        return self._run(self._api.async_get_schedule())
+
+    def get_colors(self):
+        """Get the list of valid colors.
+
+        See **AquaIPy.async_get_colors()**.
+        """
+        return self._run(self._api.async_get_colors())
+
+    def refresh_colors(self):
+        """Refresh the cached list of valid colors.
+
+        See **AquaIPy.async_refresh_colors()**.
+        """
+        return self._run(self._api.async_refresh_colors())
+
+    def get_colors_brightness(self):
+        """Get the current brightness of all color channels.
+
+        See **AquaIPy.async_get_colors_brightness()**.
+        """
+        return self._run(self._api.async_get_colors_brightness())
+
+    def set_colors_brightness(self, colors):
+        """Set all colors to the specified color percentage.
+
+        See **AquaIPy.async_set_colors_brightness()**.
+        """
+        return self._run(self._api.async_set_colors_brightness(colors))
+
+    def patch_colors_brightness(self, colors):
+        """Set specified colors to the given percentage brightness.
+
+        See **AquaIPy.async_patch_colors_brightness()**.
+        """
+        return self._run(self._api.async_patch_colors_brightness(colors))
+
+    def update_color_brightness(self, color, value):
+        """Update a given color by the specified brightness percentage.
+
+        See **AquaIPy.async_update_color_brightness()**.
+        """
+        return self._run(
+            self._api.async_update_color_brightness(color, value))
+
+    def ramp_colors_brightness(self, colors, duration, rate=DEFAULT_RAMP_RATE,
+                               start=None):
+        """Fade all colors to the specified percentages, over a duration.
+
+        See **AquaIPy.async_ramp_colors_brightness()**.
+        """
+        return self._run(self._api.async_ramp_colors_brightness(
+            colors, duration, rate, start))
@@ -0,0 +1,176 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Module for timing the phases of each request, with aiohttp tracing."""
+
+import time
+
+import aiohttp
+
+PHASES = ("queued", "dns", "connect", "request_sent", "first_byte",
+          "body_read", "json_decode")
+
+
+class RequestTiming:
+    """A class that records when each phase of a request finished.
+
+    Every phase is reported as the seconds it took, or *None* if it didn't
+    happen. For example, there's no *dns* or *connect* phase when an existing
+    connection is reused.
+
+    The *queued*, *dns*, *connect*, *request_sent* and *first_byte* phases
+    are only recorded if the session was created with the trace config from
+    **create_trace_config()**.
+    """
+
+    def __init__(self):
+        """Initialise the timing, starting the clock."""
+        self._marks = {"start": time.perf_counter()}
+
+    def mark(self, name):
+        """Record that the named event has just happened.
+
+        :param name: the name of the event
+        :type name: str
+        """
+        self._marks[name] = time.perf_counter()
+
+    def _between(self, start, end):
+        """Get the seconds between two events, if both happened."""
+        if start not in self._marks or end not in self._marks:
+            return None
+
+        return self._marks[end] - self._marks[start]
+
+    @property
+    def reused_connection(self):
+        """Check if an existing connection was used for the request.
+
+        :returns: *True* if a pooled connection was reused
+        :rtype: bool
+        """
+        return "connection_reused" in self._marks
+
+    @property
+    def queued(self):
+        """Get the seconds spent waiting for a free connection slot."""
+        return self._between("queue_start", "queue_end")
+
+    @property
+    def dns(self):
+        """Get the seconds spent resolving the host."""
+        return self._between("dns_start", "dns_end")
+
+    @property
+    def connect(self):
+        """Get the seconds spent opening the connection, excluding DNS."""
+        connect = self._between("connect_start", "connect_end")
+
+        if connect is None or self.dns is None:
+            return connect
+
+        return connect - self.dns
+
+    @property
+    def request_sent(self):
+        """Get the seconds spent sending the request, once connected."""
+        for connected in ("connect_end", "connection_reused"):
+            if connected in self._marks:
+                return self._between(connected, "request_sent")
+
+        return None
+
+    @property
+    def first_byte(self):
+        """Get the seconds waiting for the response, after it was sent."""
+        return self._between("request_sent", "response_start")
+
+    @property
+    def body_read(self):
+        """Get the seconds spent reading the response body."""
+        return self._between("response_start", "body_read")
+
+    @property
+    def json_decode(self):
+        """Get the seconds spent decoding the response body."""
+        return self._between("body_read", "json_decode")
+
+    @property
+    def total(self):
+        """Get the seconds the whole request took, so far."""
+        last = max(self._marks.values())
+
+        return last - self._marks["start"]
+
+    def as_dict(self):
+        """Get every phase, and the total.
+
+        :returns: dictionary of phase name and seconds, or *None*
+        :rtype: dict( phase_1=seconds_1..phase_n=seconds_n, total=seconds )
+        """
+        phases = {phase: getattr(self, phase) for phase in PHASES}
+        phases["total"] = self.total
+
+        return phases
+
+
+def _create_handler(name):
+    """Create a trace signal handler, that marks the named event."""
+    async def handler(session, trace_config_ctx, params):
+        timing = trace_config_ctx.trace_request_ctx
+
+        if isinstance(timing, RequestTiming):
+            timing.mark(name)
+
+    return handler
+
+
+def create_trace_config():
+    """Create a trace config, for sessions used to time requests.
+
+    Pass it to ``aiohttp.ClientSession(trace_configs=[...])``. Requests that
+    aren't being timed are ignored by the handlers.
+
+    :returns: the trace config
+    :rtype: aiohttp.TraceConfig
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    signals = [
+        (trace_config.on_connection_queued_start, "queue_start"),
+        (trace_config.on_connection_queued_end, "queue_end"),
+        (trace_config.on_dns_resolvehost_start, "dns_start"),
+        (trace_config.on_dns_resolvehost_end, "dns_end"),
+        (trace_config.on_connection_create_start, "connect_start"),
+        (trace_config.on_connection_create_end, "connect_end"),
+        (trace_config.on_connection_reuseconn, "connection_reused"),
+        (trace_config.on_request_chunk_sent, "request_sent"),
+        (trace_config.on_request_end, "response_start"),
+    ]
+
+    # Only available from aiohttp 3.8, otherwise a request without a body
+    # is treated as sent once it has a connection
+    if hasattr(trace_config, "on_request_headers_sent"):
+        signals.append((trace_config.on_request_headers_sent, "request_sent"))
+    else:
+        signals.append((trace_config.on_connection_create_end,
+                        "request_sent"))
+        signals.append((trace_config.on_connection_reuseconn,
+                        "request_sent"))
+
+    for signal, name in signals:
+        signal.append(_create_handler(name))
+
+    return trace_config
@@ -0,0 +1,337 @@
+#
+#   Copyright 2018 Stephen Mc Gowan <mcclown@gmail.com>
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Module for watching a light for changes, with a shared background poll."""
+
+import asyncio
+import logging
+
+import aiohttp
+
+from aquaipy.error import ConnError, Error
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 1
+DEFAULT_MAX_INTERVAL = 30
+DEFAULT_MAX_ERROR_INTERVAL = 60
+DEFAULT_BACKOFF = 2
+
+# Ends the iteration of a subscription
+_STOP = object()
+
+
+class LightState:
+    """A class that holds the state of a light, at one poll."""
+
+    def __init__(self, colors, schedule_enabled):
+        """Initialise the state.
+
+        :param colors: dictionary of colors and brightness percentages
+        :type colors: dict( color_1=percentage_1..color_n=percentage_n )
+        :param schedule_enabled: *True* if the schedule is enabled
+        :type schedule_enabled: bool
+        """
+        self.colors = colors
+        self.schedule_enabled = schedule_enabled
+
+    def __eq__(self, other):
+        """Check if two states are the same."""
+        if not isinstance(other, LightState):
+            return NotImplemented
+
+        return self.colors == other.colors and \
+            self.schedule_enabled == other.schedule_enabled
+
+    def __repr__(self):
+        """Get a readable representation of the state."""
+        return "<LightState schedule_enabled={} colors={}>".format(
+            self.schedule_enabled, self.colors)
+
+
+class StateSubscription:
+    """A class that receives every state change, with ``async for``.
+
+    Only the latest *max_queued* states are kept, so a slow subscriber skips
+    older changes rather than falling further and further behind. Iteration
+    ends when the subscription is closed, or the watcher is stopped.
+    """
+
+    def __init__(self, watcher, max_queued=1):
+        """Initialise the subscription, use *StateWatcher.subscribe()*."""
+        self._watcher = watcher
+        self._queue = asyncio.Queue(maxsize=max_queued)
+        self._closed = False
+
+    def _publish(self, state):
+        """Queue a state, dropping the oldest if the queue is full."""
+        if self._queue.full():
+            self._queue.get_nowait()
+
+        self._queue.put_nowait(state)
+
+    def close(self):
+        """Stop receiving states, ending any ``async for`` loop."""
+        if self._closed:
+            return
+
+        self._end()
+        self._watcher._unsubscribe(self)
+
+    def _end(self):
+        """End the iteration, once the queued states are received."""
+        self._closed = True
+
+        if self._queue.full():
+            self._queue.get_nowait()
+
+        self._queue.put_nowait(_STOP)
+
+    def __aiter__(self):
+        """Get the iterator, which is the subscription itself."""
+        return self
+
+    async def __anext__(self):
+        """Wait for the next state change.
+
+        :returns: the new state
+        :rtype: LightState
+        """
+        state = await self._queue.get()
+
+        if state is _STOP:
+            # Keep ending the iteration, if it's restarted
+            self._queue.put_nowait(_STOP)
+            raise StopAsyncIteration
+
+        return state
+
+
+class StateWatcher:
+    """A class that polls a light in the background, and publishes changes.
+
+    The colors and schedule state are polled together, and subscribers are
+    only told about real changes. The poll is shared by every subscriber and
+    only runs while there is at least one.
+
+    The interval adapts to the light: it drops to *min_interval* as soon as
+    anything changes, and grows by *backoff* each time nothing has, up to
+    *max_interval*. If a poll fails it also grows by *backoff*, up to
+    *max_error_interval*.
+    """
+
+    def __init__(self, api, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL,
+                 max_error_interval=DEFAULT_MAX_ERROR_INTERVAL,
+                 backoff=DEFAULT_BACKOFF):
+        """Initialise the watcher.
+
+        :param api: the connected light to poll
+        :type api: AquaIPy
+        :param min_interval: seconds between polls, while the light changes
+        :type min_interval: float
+        :param max_interval: max seconds between polls, while it's stable
+        :type max_interval: float
+        :param max_error_interval: max seconds between polls, while they fail
+        :type max_error_interval: float
+        :param backoff: factor to grow the interval by
+        :type backoff: float
+        """
+        if min_interval <= 0:
+            raise ValueError("min_interval must be greater than 0")
+
+        if backoff < 1:
+            raise ValueError("backoff must be at least 1")
+
+        self._api = api
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._max_error_interval = max(min_interval, max_error_interval)
+        self._backoff = backoff
+        self._subscriptions = []
+        self._callbacks = []
+        self._task = None
+        self.state = None
+        self.interval = min_interval
+        self.last_error = None
+
+    @property
+    def running(self):
+        """Check if the background poll is running.
+
+        :returns: *True* if it's running
+        :rtype: bool
+        """
+        return self._task is not None
+
+    def subscribe(self, max_queued=1):
+        """Subscribe to the state changes, starting the poll if required.
+
+        The current state, if known, is received first.
+
+        :Example:
+            >>> async for state in ai.watcher.subscribe():
+            ...     print(state.colors)
+
+        :param max_queued: max number of changes to keep, while the
+            subscriber is busy
+        :type max_queued: int
+        :returns: the subscription, for use with ``async for``
+        :rtype: StateSubscription
+        """
+        subscription = StateSubscription(self, max_queued)
+        self._subscriptions.append(subscription)
+
+        if self.state is not None:
+            subscription._publish(self.state)
+
+        self._start()
+
+        return subscription
+
+    def add_callback(self, callback):
+        """Call a function with every state change, starting the poll.
+
+        :param callback: function that takes the new *LightState*
+        :type callback: callable
+        """
+        self._callbacks.append(callback)
+        self._start()
+
+    def remove_callback(self, callback):
+        """Stop calling a function, stopping the poll if it was the last.
+
+        :param callback: the function passed to *add_callback()*
+        :type callback: callable
+        """
+        self._callbacks.remove(callback)
+        self._stop_if_unused()
+
+    def _unsubscribe(self, subscription):
+        """Remove a closed subscription."""
+        self._subscriptions.remove(subscription)
+        self._stop_if_unused()
+
+    def _start(self):
+        """Start the poll, if it isn't running."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._async_poll_loop())
+            self._task.add_done_callback(self._poll_loop_done)
+
+    def _poll_loop_done(self, task):
+        """Stop the watcher, if the poll ended without being stopped."""
+        if task is not self._task:
+            return
+
+        if not task.cancelled() and task.exception() is not None:
+            self.last_error = task.exception()
+            _LOGGER.error("Stopped polling %s", self._api.host,
+                          exc_info=self.last_error)
+
+        self.stop()
+
+    def _stop_if_unused(self):
+        """Stop the poll, if nothing is subscribed."""
+        if not self._subscriptions and not self._callbacks:
+            self.stop()
+
+    def stop(self):
+        """Stop the poll and close every subscription.
+
+        Subscribing, or adding a callback, starts it again.
+        """
+        task = self._task
+        self._task = None
+
+        if task is not None:
+            task.cancel()
+
+        subscriptions = self._subscriptions
+        self._subscriptions = []
+        self._callbacks = []
+
+        for subscription in subscriptions:
+            subscription._end()
+
+    def _publish(self, state):
+        """Send a new state to every subscriber."""
+        self.state = state
+
+        for subscription in self._subscriptions:
+            subscription._publish(state)
+
+        for callback in list(self._callbacks):
+            try:
+                callback(state)
+            except Exception:
+                _LOGGER.exception("Error in state callback")
+
+    async def async_poll(self):
+        """Poll the light once, publishing the state if it has changed.
+
+        :returns: *True* if the state changed
+        :rtype: bool
+
+        :raises ConnError: if the light couldn't be polled
+        """
+        colors, schedule_enabled = await asyncio.gather(
+            self._api.async_get_colors_brightness(),
+            self._api.async_get_schedule_state())
+
+        if colors is None or schedule_enabled is None:
+            raise ConnError("Unable to poll host", self._api.host)
+
+        state = LightState(colors, schedule_enabled)
+
+        if state == self.state:
+            return False
+
+        self._publish(state)
+
+        return True
+
+    def _get_next_interval(self, changed, failed):
+        """Get the seconds to wait until the next poll."""
+        if failed:
+            return min(self.interval * self._backoff,
+                       self._max_error_interval)
+
+        if changed:
+            return self._min_interval
+
+        return min(self.interval * self._backoff, self._max_interval)
+
+    async def _async_poll_loop(self):
+        """Poll the light, until the watcher is stopped."""
+        while True:
+            changed = False
+
+            try:
+                changed = await self.async_poll()
+                self.last_error = None
+            except (Error, aiohttp.ClientError, ValueError) as err:
+                # Connection errors that outlast the retries, and invalid
+                # responses, are retried at the next poll
+                self.last_error = err
+
+            self.interval = self._get_next_interval(
+                changed, self.last_error is not None)
+
+            if self.last_error is not None:
+                _LOGGER.debug("Poll failed for %s, retrying in %ss",
+                              self._api.host, self.interval)
+
+            await asyncio.sleep(self.interval)
@@ -73,6 +73,8 @@ setup(
         ],
     extras_require={
         'testing': ['pytest'],
+        'numpy': ['numpy'],
+        'fastjson': ['orjson'],
     }
 )
 